@@ -0,0 +1,31 @@
+import argparse
+import os
+from resource_tracker import *
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="2つのスナップショットの差分を表示し、追加・変更されたリソースだけを出力する"
+    )
+    parser.add_argument("old", help="前回のスナップショット(RESOURCE_TRACKER_SNAPSHOTの出力)")
+    parser.add_argument("new", help="今回のスナップショット")
+    parser.add_argument(
+        "--output-dir",
+        default="outputs/drift",
+        help="差分レポート(drift.jsonl)と変更されたリソースの.tfを書き出すディレクトリ",
+    )
+    parser.add_argument("--no-render", action="store_true", help="変更されたリソースの.tfを書き出さない")
+    args = parser.parse_args()
+
+    changes = diff_snapshots(load_snapshot(args.old), load_snapshot(args.new))
+    write_drift_summary(changes)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    with open(f"{args.output_dir}/drift.jsonl", mode="w", encoding="utf-8") as w:
+        write_drift_report(w, changes)
+    if not args.no_render:
+        write_changed_resources(args.output_dir, changes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import argparse
+from resource_tracker import *
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="スナップショットから、オブジェクトに対して権限を持つロール(とユーザー)を調べる"
+    )
+    parser.add_argument("snapshot", help="RESOURCE_TRACKER_SNAPSHOTの出力")
+    parser.add_argument("object_type", help="オブジェクト種別(例: table, schema, warehouse)")
+    parser.add_argument("object_name", help='オブジェクト名(例: "DB.SCHEMA.TABLE")')
+    parser.add_argument("privilege", help="権限(例: SELECT)")
+    parser.add_argument("--no-future", action="store_true", help="on_futureのgrantを含めない")
+    parser.add_argument(
+        "--direct",
+        action="store_true",
+        help="ロールの継承をたどらず、直接grantされたロールだけを表示する",
+    )
+    parser.add_argument("--users", action="store_true", help="ロールを最終的に持つユーザーを表示する")
+    args = parser.parse_args()
+
+    snapshot = load_snapshot(args.snapshot)
+    index = PrivilegeIndex.from_resources(snapshot)
+    role_graph = RoleGraph.from_role_grants(snapshot.get("role_grants", []))
+
+    roles = index.get_roles(
+        args.object_type,
+        args.object_name,
+        args.privilege,
+        include_future=not args.no_future,
+        role_graph=None if args.direct else role_graph,
+    )
+    if not args.users:
+        for role_name in roles:
+            print(role_name)
+        return
+
+    users = set()
+    for role_name in roles:
+        users.update(role_graph.get_users_inheriting(role_name))
+    for user_name in sorted(users):
+        print(user_name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, List, Optional
+import pandas as pd
+from resource_tracker import (
+    ColumnarResources,
+    QueryRecording,
+    ReplayConnection,
+    build_resources,
+    category_max_ratio,
+    fetcher_specs,
+    get_resource_names,
+    merge_resources_by_roles,
+    render_resource,
+    to_dataframe,
+    to_tf_resource_name,
+    write_import_commands,
+    write_columnar_resources,
+    write_resources,
+    write_tf_json_resources,
+)
+from synthetic import (
+    generate_account,
+    generate_table_grants,
+    merge_grants_by_key,
+    to_result_rows,
+)
+
+default_baseline_path = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+
+@dataclass
+class BenchmarkResult:
+    case: str
+    scale: int
+    seconds: Optional[float] = None
+    peak_bytes: Optional[int] = None
+    # fnの戻り値が保持しているメモリ(tracemallocの計測終了時点の使用量)
+    retained_bytes: Optional[int] = None
+    error: Optional[str] = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.case}@{self.scale}"
+
+
+def measure(fn: Callable[[], object], with_memory: bool) -> tuple:
+    """fnの実行時間と(with_memoryが真なら)tracemallocによるピーク・戻り値のメモリを計測する"""
+    start = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - start
+
+    peak_bytes = None
+    retained_bytes = None
+    if with_memory:
+        # tracemallocは実行時間を大きく歪めるので、時間とは別の回で計測する
+        tracemalloc.start()
+        result = fn()
+        [retained_bytes, peak_bytes] = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+    return (seconds, peak_bytes, retained_bytes)
+
+
+def make_cases(
+    scale: int, seed: int, output_dir: str
+) -> Dict[str, Callable[[], object]]:
+    """計測対象の処理を、入力を準備した状態のクロージャとして返す"""
+    account = generate_account(scale, seed=seed)
+    grants = generate_table_grants(account, scale, seed=seed)
+    merged = merge_grants_by_key(grants)
+    resource_type_name = "table_grant"
+    tf_resource_type_name = to_tf_resource_name(resource_type_name)
+    resource_names = get_resource_names(resource_type_name, merged)
+
+    def run_merge():
+        return merge_resources_by_roles(grants)
+
+    def run_render():
+        for [resource_name, resource] in zip(resource_names, merged):
+            render_resource(tf_resource_type_name, resource_name, resource)
+
+    def run_write_resources():
+        path = os.path.join(output_dir, f"{resource_type_name}.tf")
+        with open(path, mode="w", encoding="utf-8") as w:
+            write_resources(w, resource_type_name, resource_names, merged)
+
+    def run_write_tf_json_resources():
+        path = os.path.join(output_dir, f"{resource_type_name}.tf.json")
+        with open(path, mode="w", encoding="utf-8") as w:
+            write_tf_json_resources(w, resource_type_name, resource_names, merged)
+
+    def run_write_import_commands():
+        write_import_commands(io.StringIO(), resource_type_name, resource_names, merged)
+
+    store = ColumnarResources.from_resources(resource_type_name, merged)
+
+    def run_columnar_merge():
+        return ColumnarResources.from_resources(resource_type_name, grants).merge(
+            "roles"
+        )
+
+    def run_columnar_write_resources():
+        path = os.path.join(output_dir, f"{resource_type_name}.columnar.tf")
+        with open(path, mode="w", encoding="utf-8") as w:
+            write_columnar_resources(w, resource_names, store)
+
+    # Snowflakeから届く結果と同じく、値が行ごとに別の文字列になっている行
+    fetch_spec = fetcher_specs[resource_type_name]
+    fetch_columns = list(fetch_spec.columns.values())
+    fetch_payload = json.dumps(to_result_rows(fetch_spec, grants))
+
+    def fetch_rows():
+        rows = json.loads(fetch_payload)
+        conn = ReplayConnection([QueryRecording(fetch_spec.query, fetch_columns, rows)])
+        cursor = conn.cursor()
+        cursor.execute(fetch_spec.query)
+        return (cursor, cursor.fetchall())
+
+    def run_fetch():
+        [cursor, data] = fetch_rows()
+        df = to_dataframe(cursor, data, category_max_ratio)
+        del data
+        return build_resources(fetch_spec, df)
+
+    def run_fetch_without_interning():
+        # internとcategoricalを使わない(以前のto_dataframeと同じ)DataFrameから作る
+        [_, data] = fetch_rows()
+        df = pd.DataFrame(data, columns=fetch_columns, dtype=str)
+        del data
+        return build_resources(fetch_spec, df)
+
+    return {
+        "merge_resources_by_roles": run_merge,
+        "render_resource": run_render,
+        "write_resources": run_write_resources,
+        "write_tf_json_resources": run_write_tf_json_resources,
+        "write_import_commands": run_write_import_commands,
+        "columnar_merge": run_columnar_merge,
+        "columnar_write_resources": run_columnar_write_resources,
+        "fetch_table_grants": run_fetch,
+        "fetch_table_grants_without_interning": run_fetch_without_interning,
+    }
+
+
+def run_benchmarks(
+    scales: List[int], case_names: Optional[List[str]], seed: int, with_memory: bool
+) -> List[BenchmarkResult]:
+    results = []
+    for scale in scales:
+        with tempfile.TemporaryDirectory(prefix="resource_tracker_bench_") as d:
+            cases = make_cases(scale, seed, d)
+            for [case, fn] in cases.items():
+                if case_names is not None and case not in case_names:
+                    continue
+                result = BenchmarkResult(case=case, scale=scale)
+                try:
+                    [
+                        result.seconds,
+                        result.peak_bytes,
+                        result.retained_bytes,
+                    ] = measure(fn, with_memory)
+                except Exception as e:
+                    result.error = f"{type(e).__name__}: {e}"
+                results.append(result)
+                print(format_result(result), file=sys.stderr)
+    return results
+
+
+def format_result(result: BenchmarkResult) -> str:
+    if result.error is not None:
+        return f"{result.key:<48} ERROR {result.error}"
+    peak = (
+        f"{result.peak_bytes / 1024 / 1024:10.1f} MiB"
+        if result.peak_bytes is not None
+        else "           - MiB"
+    )
+    retained = (
+        f"{result.retained_bytes / 1024 / 1024:10.1f} MiB"
+        if result.retained_bytes is not None
+        else "           - MiB"
+    )
+    return f"{result.key:<48} {result.seconds:10.3f} s {peak} {retained}"
+
+
+def load_baselines(path: str) -> Dict[str, dict]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as r:
+        return json.load(r)
+
+
+def save_baselines(path: str, results: List[BenchmarkResult]) -> None:
+    baselines = load_baselines(path)
+    for result in results:
+        if result.error is None:
+            baselines[result.key] = asdict(result)
+    with open(path, mode="w", encoding="utf-8") as w:
+        json.dump(baselines, w, indent=2, sort_keys=True)
+
+
+def find_regressions(
+    results: List[BenchmarkResult], baselines: Dict[str, dict], threshold: float
+) -> List[str]:
+    """ベースラインよりthreshold倍以上遅い(またはメモリを使う)ケースを返す"""
+    regressions = []
+    for result in results:
+        baseline = baselines.get(result.key)
+        if baseline is None or result.error is not None:
+            continue
+        if result.seconds > baseline["seconds"] * threshold:
+            regressions.append(
+                f"{result.key}: time {baseline['seconds']:.3f}s -> {result.seconds:.3f}s"
+            )
+        if (
+            result.peak_bytes is not None
+            and baseline.get("peak_bytes") is not None
+            and result.peak_bytes > baseline["peak_bytes"] * threshold
+        ):
+            regressions.append(
+                f"{result.key}: peak {baseline['peak_bytes']} -> {result.peak_bytes} bytes"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合成アカウントでのベンチマーク")
+    parser.add_argument(
+        "--scales",
+        default="10000",
+        help="権限数のカンマ区切りリスト(例: 10000,100000,5000000)",
+    )
+    parser.add_argument("--cases", default=None, help="実行するケースのカンマ区切り")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="メモリを計測しない")
+    parser.add_argument("--baseline", default=default_baseline_path)
+    parser.add_argument("--save-baseline", action="store_true", help="結果をベースラインとして保存する")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.2,
+        help="ベースラインの何倍を超えたら劣化とみなすか",
+    )
+    args = parser.parse_args()
+
+    scales = [int(scale) for scale in args.scales.split(",")]
+    case_names = args.cases.split(",") if args.cases is not None else None
+    results = run_benchmarks(scales, case_names, args.seed, not args.no_memory)
+
+    if args.save_baseline:
+        save_baselines(args.baseline, results)
+        return
+
+    regressions = find_regressions(
+        results, load_baselines(args.baseline), args.threshold
+    )
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    if len(regressions) > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
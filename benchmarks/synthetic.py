@@ -0,0 +1,173 @@
+import random
+from dataclasses import dataclass
+from typing import List, Tuple
+from faker import Faker
+from resource_tracker import FetcherSpec, SnowflakeSchemaGrant, SnowflakeTableGrant
+
+# 実際のアカウントに近い権限の偏り(SELECTが大半を占める)
+privilege_weights = {
+    "SELECT": 60,
+    "REFERENCES": 10,
+    "INSERT": 10,
+    "UPDATE": 6,
+    "DELETE": 6,
+    "TRUNCATE": 4,
+    "OWNERSHIP": 4,
+}
+schema_privilege_weights = {
+    "USAGE": 70,
+    "CREATE TABLE": 10,
+    "CREATE VIEW": 10,
+    "MONITOR": 5,
+    "OWNERSHIP": 5,
+}
+
+
+@dataclass
+class SyntheticAccount:
+    """ベンチマーク用の架空のSnowflakeアカウント"""
+
+    databases: List[str]
+    schemata: List[Tuple[str, str]]
+    tables: List[Tuple[str, str, str]]
+    roles: List[str]
+    role_weights: List[float]
+
+
+def make_names(faker: Faker, prefix: str, n: int) -> List[str]:
+    """fakerの単語に連番を付けて重複しない識別子をn個作る"""
+    words = [faker.word().upper() for _ in range(min(n, 1000))]
+    return [f"{prefix}_{words[i % len(words)]}_{i}" for i in range(n)]
+
+
+def zipf_weights(n: int, s: float = 1.1) -> List[float]:
+    """上位のロールほど多くの権限を持つようなZipf分布の重み"""
+    return [1.0 / (k**s) for k in range(1, n + 1)]
+
+
+def generate_account(
+    n_grants: int, roles_per_grant: float = 3.0, seed: int = 0
+) -> SyntheticAccount:
+    """n_grants件程度のテーブル権限が作れる規模のアカウントを作る"""
+    faker = Faker()
+    Faker.seed(seed)
+
+    n_tables = max(1, int(n_grants / roles_per_grant))
+    n_schemata = max(1, n_tables // 50)
+    n_databases = max(1, n_schemata // 20)
+    n_roles = max(10, min(5000, int(n_grants**0.5)))
+
+    databases = make_names(faker, "DB", n_databases)
+    schemata = [
+        (databases[i % n_databases], name)
+        for [i, name] in enumerate(make_names(faker, "SCHEMA", n_schemata))
+    ]
+    tables = [
+        (*schemata[i % n_schemata], name)
+        for [i, name] in enumerate(make_names(faker, "TABLE", n_tables))
+    ]
+    roles = make_names(faker, "ROLE", n_roles)
+    return SyntheticAccount(
+        databases=databases,
+        schemata=schemata,
+        tables=tables,
+        roles=roles,
+        role_weights=zipf_weights(n_roles),
+    )
+
+
+def generate_table_grants(
+    account: SyntheticAccount, n_grants: int, seed: int = 0
+) -> List[SnowflakeTableGrant]:
+    """fetch_table_grantsがマージ前に作るのと同じ形(1ロール1件)のテーブル権限を作る"""
+    rng = random.Random(seed)
+    privileges = list(privilege_weights.keys())
+    weights = list(privilege_weights.values())
+    roles = rng.choices(account.roles, weights=account.role_weights, k=n_grants)
+    granted_privileges = rng.choices(privileges, weights=weights, k=n_grants)
+    return [
+        SnowflakeTableGrant(
+            database_name=database_name,
+            schema_name=schema_name,
+            table_name=table_name,
+            privilege=privilege,
+            roles=[role],
+            with_grant_option=rng.random() < 0.02,
+        )
+        for [role, privilege] in zip(roles, granted_privileges)
+        for [database_name, schema_name, table_name] in (
+            account.tables[rng.randrange(len(account.tables))],
+        )
+    ]
+
+
+def generate_schema_grants(
+    account: SyntheticAccount, n_grants: int, seed: int = 0
+) -> List[SnowflakeSchemaGrant]:
+    """fetch_schema_grantsがマージ前に作るのと同じ形(1ロール1件)のスキーマ権限を作る"""
+    rng = random.Random(seed)
+    privileges = list(schema_privilege_weights.keys())
+    weights = list(schema_privilege_weights.values())
+    roles = rng.choices(account.roles, weights=account.role_weights, k=n_grants)
+    granted_privileges = rng.choices(privileges, weights=weights, k=n_grants)
+    return [
+        SnowflakeSchemaGrant(
+            database_name=database_name,
+            schema_name=schema_name,
+            privilege=privilege,
+            roles=[role],
+            with_grant_option=False,
+        )
+        for [role, privilege] in zip(roles, granted_privileges)
+        for [database_name, schema_name] in (
+            account.schemata[rng.randrange(len(account.schemata))],
+        )
+    ]
+
+
+def merge_grants_by_key(grants: List[SnowflakeTableGrant]) -> List[SnowflakeTableGrant]:
+    """merge_resources_by_rolesと同じ結果になるマージ済み権限を作る
+
+    マージ処理自体を計測しないケース(レンダリング・書き出し)の入力を用意するために使う。
+    """
+    merged = {}
+    for grant in grants:
+        key = (
+            grant.database_name,
+            grant.schema_name,
+            grant.table_name,
+            grant.privilege,
+            grant.with_grant_option,
+        )
+        if key in merged:
+            merged[key].roles.append(grant.roles[0])
+        else:
+            merged[key] = SnowflakeTableGrant(
+                database_name=grant.database_name,
+                schema_name=grant.schema_name,
+                table_name=grant.table_name,
+                privilege=grant.privilege,
+                roles=list(grant.roles),
+                with_grant_option=grant.with_grant_option,
+            )
+    for grant in merged.values():
+        grant.roles.sort()
+    return list(merged.values())
+
+
+def to_result_rows(spec: FetcherSpec, grants: List[SnowflakeTableGrant]) -> List[list]:
+    """マージ前の権限を、specのクエリの結果(列はspec.columnsの順)の行にする
+
+    Snowflakeの結果と同じく、値はすべて行ごとに別の文字列オブジェクトにする。
+    """
+    rows = []
+    for grant in grants:
+        row = []
+        for field_name in spec.columns:
+            value = getattr(grant, field_name)
+            if isinstance(value, list):
+                [value] = value
+            # 同じ値でも別のオブジェクトになるように作り直す
+            row.append("".join(list(str(value))))
+        rows.append(row)
+    return rows
@@ -1,3 +1,22 @@
 from .utils import *
 from .types import *
 from .sql import *
+from .scope import *
+from .pagination import *
+from .fetch_engine import *
+from .interning import *
+from .replay import *
+from .role_graph import *
+from .privilege_index import *
+from .trace import *
+from .errors import *
+from .profiling import *
+from .metrics import *
+from .tfstate import *
+from .terraform import *
+from .drift import *
+from .validation import *
+from .columnar import *
+from .streaming import *
+from .export import *
+from .daemon import *
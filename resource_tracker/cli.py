@@ -0,0 +1,236 @@
+import argparse
+import json
+import os
+import sys
+from typing import List, Optional
+
+# scrapeが使うrequests/bs4(開発用の依存)やエクスポートの処理は、
+# 他のサブコマンドで読み込まなくて済むよう、各コマンドの中でimportする
+
+
+def parse_types(value: str) -> List[str]:
+    """--typesの値(カンマ区切りのリソース種別)をリストにする"""
+    return [t.strip() for t in value.split(",") if t.strip() != ""]
+
+
+def positive_int(value: str) -> int:
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1: {value}")
+    return n
+
+
+def run_scrape(args: argparse.Namespace) -> None:
+    from .provider_docs import write_resource_schemas
+
+    if args.output is None:
+        write_resource_schemas(sys.stdout, args.types, args.jobs)
+        return
+    with open(args.output, mode="w", encoding="utf-8") as w:
+        write_resource_schemas(w, args.types, args.jobs)
+
+
+def run_generate(args: argparse.Namespace) -> None:
+    from .codegen import load_provider_resources, write_resource_classes
+
+    write_resource_classes(sys.stdout, load_provider_resources(args.input), args.types)
+
+
+def make_export_config(args: argparse.Namespace):
+    """環境変数から作ったExportConfigを、add_export_argumentsの引数で上書きする"""
+    from .export import ExportConfig, get_fetcher
+
+    config = ExportConfig.from_env()
+    if args.types is not None:
+        for resource_type_name in args.types:
+            try:
+                get_fetcher(resource_type_name)
+            except ValueError as e:
+                args.parser.error(str(e))
+        config.resource_types = args.types
+    if args.output_dir is not None:
+        config.output_dir = args.output_dir
+    if args.jobs is not None:
+        config.fetch_jobs = args.jobs
+    if args.render_jobs is not None:
+        config.render_jobs = args.render_jobs
+    if args.format is not None:
+        config.output_format = args.format
+    if args.snapshot is not None:
+        config.snapshot_path = args.snapshot
+    if args.profile:
+        config.profile = True
+    return config
+
+
+def run_export_command(args: argparse.Namespace) -> None:
+    from .export import connect, run_export
+
+    config = make_export_config(args)
+    if args.incremental:
+        if config.snapshot_path is None:
+            args.parser.error("--incremental requires --snapshot")
+        config.incremental = True
+
+    run_export(connect(config), config)
+
+
+def run_serve(args: argparse.Namespace) -> None:
+    from .daemon import serve
+
+    serve(make_export_config(args), args.socket)
+
+
+def run_request(args: argparse.Namespace) -> None:
+    from .daemon import get_socket_path, send_request
+
+    request = {"command": args.request_command}
+    if args.types is not None:
+        request["types"] = args.types
+    if args.output_dir is not None:
+        # デーモンの作業ディレクトリではなく、呼び出した場所からのパスにする
+        request["output_dir"] = os.path.abspath(args.output_dir)
+    if args.format is not None:
+        request["format"] = args.format
+    if args.incremental:
+        request["incremental"] = True
+    if args.update:
+        request["update"] = True
+
+    socket_path = args.socket or get_socket_path()
+    try:
+        response = send_request(request, socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        sys.exit(f"Daemon is not running: {socket_path}")
+    print(json.dumps(response, ensure_ascii=False, indent=2))
+    if not response["ok"]:
+        sys.exit(1)
+
+
+def add_export_arguments(parser: argparse.ArgumentParser) -> None:
+    """exportとserveに共通の引数"""
+    parser.add_argument(
+        "--types",
+        type=parse_types,
+        default=None,
+        help="エクスポートするリソース種別のカンマ区切り(例: role,role_grants,table_grant)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=positive_int,
+        default=None,
+        help="同時に取得するリソース種別の数(RESOURCE_TRACKER_FETCH_JOBS)",
+    )
+    parser.add_argument(
+        "--render-jobs",
+        type=positive_int,
+        default=None,
+        help="レンダリングに使うプロセス数(RESOURCE_TRACKER_RENDER_JOBS)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["hcl", "json"],
+        default=None,
+        help="hcl: <type>.tf / json: <type>.tf.json(RESOURCE_TRACKER_OUTPUT_FORMAT)",
+    )
+    parser.add_argument(
+        "--output-dir", default=None, help=".tfとimport.shの出力先(既定はoutputs)"
+    )
+    parser.add_argument(
+        "--snapshot",
+        default=None,
+        help="スナップショットの出力先(RESOURCE_TRACKER_SNAPSHOT)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="stageごとの時間・メモリとクエリごとの集計を表示する",
+    )
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="resource-tracker",
+        description="SnowflakeのオブジェクトをTerraformのコードにする",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    scrape = subparsers.add_parser("scrape", help="① providerのドキュメントからリソースのスキーマを取得する")
+    scrape.add_argument(
+        "--types",
+        type=parse_types,
+        default=None,
+        help="取得するリソース種別のカンマ区切り(snowflake_を除いた名前)。既定はすべて",
+    )
+    scrape.add_argument("--jobs", type=positive_int, default=1, help="並列に取得するドキュメントの数")
+    scrape.add_argument(
+        "--output", default=None, help="出力先(例: data/resources.jsonl)。既定は標準出力"
+    )
+    scrape.set_defaults(run=run_scrape)
+
+    generate = subparsers.add_parser("generate", help="② スキーマからリソースのdataclassのコードを生成する")
+    generate.add_argument("--input", default="data/resources.jsonl", help="scrapeの出力")
+    generate.add_argument(
+        "--types",
+        type=parse_types,
+        default=None,
+        help="生成するリソース種別のカンマ区切り。既定はすべて",
+    )
+    generate.set_defaults(run=run_generate)
+
+    export = subparsers.add_parser(
+        "export",
+        help="③ Snowflakeから取得したリソースを.tfとimportコマンドに書き出す",
+        description="設定の既定値は環境変数(RESOURCE_TRACKER_*, SNOWFLAKE_*)から読み、引数で上書きする",
+    )
+    add_export_arguments(export)
+    export.add_argument(
+        "--incremental",
+        action="store_true",
+        help="--snapshotの前回のスナップショットと比べ、前回の名前を再利用して追加分だけimportする",
+    )
+    export.set_defaults(run=run_export_command, parser=export)
+
+    serve = subparsers.add_parser(
+        "serve",
+        help="接続を保ったままUnixソケットでexport/diffの要求を待ち受ける",
+        description="引数と環境変数の設定が、要求で上書きされない項目の既定値になる",
+    )
+    add_export_arguments(serve)
+    serve.add_argument(
+        "--socket", default=None, help="ソケットのパス(RESOURCE_TRACKER_SOCKET)"
+    )
+    serve.set_defaults(run=run_serve, parser=serve)
+
+    request = subparsers.add_parser("request", help="serveで起動したデーモンに要求を送る")
+    request.add_argument(
+        "request_command", choices=["status", "export", "diff", "shutdown"]
+    )
+    request.add_argument("--types", type=parse_types, default=None)
+    request.add_argument("--output-dir", default=None)
+    request.add_argument("--format", choices=["hcl", "json"], default=None)
+    request.add_argument(
+        "--incremental",
+        action="store_true",
+        help="export: デーモンが保持するスナップショットと比べ、追加分だけimportする",
+    )
+    request.add_argument(
+        "--update",
+        action="store_true",
+        help="diff: 取得したリソースを新しいスナップショットにする",
+    )
+    request.add_argument(
+        "--socket", default=None, help="ソケットのパス(RESOURCE_TRACKER_SOCKET)"
+    )
+    request.set_defaults(run=run_request)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = make_parser().parse_args(argv)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
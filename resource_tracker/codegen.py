@@ -0,0 +1,77 @@
+import json
+from typing import List, Optional, TextIO
+from .utils import snake_case_to_camel_case, get_template
+from .validation import resource_schemas_path
+
+
+def load_provider_resources(path: str = resource_schemas_path) -> List[dict]:
+    """provider_docs.write_resource_schemasの出力を読む"""
+    with open(path) as f:
+        return list(map(json.loads, f.readlines()))
+
+
+def map_type(typ: str) -> str:
+    if typ == "List of String":
+        return "list[str]"
+    elif typ == "Set of String":
+        return "set[str]"
+    elif typ == "Map of String":
+        return "list[dict[str, str]]"
+    elif typ == "Set of Number":
+        return "set[Num]"
+    elif typ == "Block List":
+        return "BlockList"
+    elif typ == "Block Set":
+        return "BlockSet"
+    elif typ == "String":
+        return "str"
+    elif typ == "Number":
+        return "Number"
+    elif typ == "Boolean":
+        return "bool"
+    elif typ == "Block":
+        return "Block"
+    else:
+        raise ValueError("Unknown typ: {}".format(typ))
+
+
+def gen_read_only_attribute(name: str, type: str) -> str:
+    return f"{name}: ReadOnly[{type}] = None"
+
+
+def gen_optional_attribute(name: str, type: str) -> str:
+    return f"{name}: Optional[{type}] = None"
+
+
+def gen_required_attribute(name: str, type: str) -> str:
+    return f"{name}: {type}"
+
+
+def gen_resource_schema(resource: dict) -> str:
+    resource_name = "snowflake_{}".format(resource["name"])
+    resource_attributes = resource["attributes"]
+
+    attr_exprs = []
+    for attr in resource_attributes:
+        if attr["required"]:
+            a = gen_required_attribute(attr["name"], map_type(attr["type"]))
+        elif attr["optional"]:
+            a = gen_optional_attribute(attr["name"], map_type(attr["type"]))
+        else:
+            a = None
+
+        attr_exprs.append(a)
+
+    attr_exprs = [a for a in attr_exprs if a is not None]
+    template = get_template("snowflake_resource.py.jinja")
+    class_name = snake_case_to_camel_case(resource_name)
+    return template.render(class_name=class_name, attrs=attr_exprs)
+
+
+def write_resource_classes(
+    w: TextIO, resources: List[dict], resource_names: Optional[List[str]] = None
+) -> None:
+    """スキーマからresource_tracker/types.pyに入れるdataclassのコードを書き出す"""
+    for resource in resources:
+        if resource_names is None or resource["name"] in resource_names:
+            print(gen_resource_schema(resource), file=w)
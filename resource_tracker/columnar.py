@@ -0,0 +1,483 @@
+import sys
+from array import array
+from dataclasses import fields
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+    Union,
+    get_args,
+    get_origin,
+)
+from .drift import get_resource_class, merged_attr_names
+from .errors import capture_error
+from .profiling import has_stage_observers, observe_count, stage
+from .tfstate import TerraformStateIndex
+from .terraform import (
+    get_import_ids,
+    render_import_block,
+    resource_id_attr_names_map,
+    to_tf_resource_name,
+)
+from .types import SnowflakeResourceT, to_hashable
+from .utils import render_attrs
+
+
+class Dictionary:
+    """値 <-> 連番(コード)の対応。コード0はNone
+
+    文字列以外の値は型もキーに含める(Trueと1を区別するため)。
+    """
+
+    def __init__(self):
+        self.values: List[Any] = [None]
+        self.codes: Dict[Any, int] = {}
+
+    @staticmethod
+    def to_key(value: Any) -> Any:
+        if type(value) is str:
+            return value
+        return (type(value), to_hashable(value))
+
+    def encode(self, value: Any) -> int:
+        if value is None:
+            return 0
+        key = self.to_key(value)
+        code = self.codes.get(key)
+        if code is None:
+            code = len(self.values)
+            self.codes[key] = code
+            self.values.append(value)
+        return code
+
+    def find(self, value: Any) -> Optional[int]:
+        """値のコード。辞書に無ければNone"""
+        if value is None:
+            return 0
+        return self.codes.get(self.to_key(value))
+
+    def memory_usage(self) -> int:
+        return (
+            sys.getsizeof(self.values)
+            + sys.getsizeof(self.codes)
+            + sum(sys.getsizeof(v) for v in self.values)
+        )
+
+
+class ScalarColumn:
+    """1つの属性の値を、辞書のコードの配列として持つ"""
+
+    def __init__(self, dictionary: Optional[Dictionary] = None):
+        self.dictionary = dictionary if dictionary is not None else Dictionary()
+        self.codes = array("I")
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def append(self, value: Any) -> None:
+        self.codes.append(self.dictionary.encode(value))
+
+    def get(self, i: int) -> Any:
+        return self.dictionary.values[self.codes[i]]
+
+    def get_key(self, i: int) -> int:
+        return self.codes[i]
+
+    def take(self, indices: Iterable[int]) -> "ScalarColumn":
+        column = ScalarColumn(self.dictionary)
+        codes = self.codes
+        column.codes = array("I", (codes[i] for i in indices))
+        return column
+
+    def mask(self, predicate: Callable[[Any], bool]) -> List[int]:
+        """predicateを満たす行の位置。predicateは辞書の値ごとに1回だけ呼ぶ"""
+        allowed = bytes(bool(predicate(v)) for v in self.dictionary.values)
+        return [i for [i, code] in enumerate(self.codes) if allowed[code]]
+
+    def memory_usage(self) -> int:
+        return self.codes.itemsize * len(self.codes)
+
+
+class ListColumn:
+    """文字列のリストの属性(roles等)を、要素のコードを連結した配列と各行の開始位置で持つ
+
+    Noneと空のリストを区別するため、Noneの行をnullsに記録する。
+    """
+
+    def __init__(self, dictionary: Optional[Dictionary] = None):
+        self.dictionary = dictionary if dictionary is not None else Dictionary()
+        self.offsets = array("Q", [0])
+        self.items = array("I")
+        self.nulls = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.nulls)
+
+    def append(self, value: Optional[Iterable[Any]]) -> None:
+        if value is None:
+            self.nulls.append(1)
+        else:
+            self.nulls.append(0)
+            encode = self.dictionary.encode
+            self.items.extend(encode(v) for v in value)
+        self.offsets.append(len(self.items))
+
+    def get_codes(self, i: int) -> array:
+        return self.items[self.offsets[i] : self.offsets[i + 1]]
+
+    def get(self, i: int) -> Optional[list]:
+        if self.nulls[i]:
+            return None
+        values = self.dictionary.values
+        return [values[code] for code in self.get_codes(i)]
+
+    def get_key(self, i: int) -> Optional[tuple]:
+        return None if self.nulls[i] else tuple(self.get_codes(i))
+
+    def take(self, indices: Iterable[int]) -> "ListColumn":
+        column = ListColumn(self.dictionary)
+        for i in indices:
+            column.nulls.append(self.nulls[i])
+            column.items.extend(self.get_codes(i))
+            column.offsets.append(len(column.items))
+        return column
+
+    def mask(self, predicate: Callable[[Any], bool]) -> List[int]:
+        return [i for i in range(len(self)) if predicate(self.get(i))]
+
+    def memory_usage(self) -> int:
+        return (
+            self.offsets.itemsize * len(self.offsets)
+            + self.items.itemsize * len(self.items)
+            + len(self.nulls)
+        )
+
+
+Column = Union[ScalarColumn, ListColumn]
+
+
+def is_list_field(field_type: Any) -> bool:
+    """list[str]/set[str](Optionalを含む)の属性か"""
+    for t in (field_type, *get_args(field_type)):
+        if get_origin(t) in (list, set) and get_args(t) == (str,):
+            return True
+    return False
+
+
+class RowView:
+    """ColumnarResourcesの1行を、dataclassを作らずに属性として読む"""
+
+    __slots__ = ("store", "index")
+
+    def __init__(self, store: "ColumnarResources", index: int):
+        self.store = store
+        self.index = index
+
+    def __getattr__(self, name: str) -> Any:
+        column = self.store.columns.get(name)
+        if column is None:
+            raise AttributeError(name)
+        return column.get(self.index)
+
+
+class ColumnarRows:
+    """ColumnarResourcesの行(RowView)の列。get_resource_names等にリストの代わりに渡せる"""
+
+    def __init__(self, store: "ColumnarResources"):
+        self.store = store
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __getitem__(self, i: int) -> RowView:
+        return RowView(self.store, i)
+
+    def __iter__(self) -> Iterator[RowView]:
+        store = self.store
+        return (RowView(store, i) for i in range(len(store)))
+
+
+class ColumnarResources:
+    """1つのリソース種別のリソースを属性ごとの配列で持つ
+
+    文字列などの値は属性ごとの辞書で連番(コード)にし、行はコードの配列(array("I"))で持つ。
+    roles等の文字列のリストは要素のコードを連結して持つ。
+    dataclassは行を取り出したとき(store[i]、iter(store))に初めて作る。
+    """
+
+    def __init__(self, resource_type_name: str):
+        self.resource_type_name = resource_type_name
+        self.resource_class = get_resource_class(resource_type_name)
+        self.field_names: List[str] = []
+        self.columns: Dict[str, Column] = {}
+        for f in fields(self.resource_class):
+            self.field_names.append(f.name)
+            self.columns[f.name] = (
+                ListColumn() if is_list_field(f.type) else ScalarColumn()
+            )
+        self.length = 0
+        self._identity_index: Optional[Dict[tuple, int]] = None
+
+    @staticmethod
+    def from_resources(
+        resource_type_name: str, resources: Iterable[SnowflakeResourceT]
+    ) -> "ColumnarResources":
+        store = ColumnarResources(resource_type_name)
+        store.extend(resources)
+        return store
+
+    @staticmethod
+    def from_columns(
+        resource_type_name: str, values: Dict[str, list]
+    ) -> "ColumnarResources":
+        """属性名 -> 値のリスト(convert_columnsの結果など)から作る。無い属性はNone"""
+        store = ColumnarResources(resource_type_name)
+        length = len(next(iter(values.values()))) if len(values) > 0 else 0
+        for [name, column] in store.columns.items():
+            column_values = values.get(name)
+            if column_values is None:
+                column_values = [None] * length
+            for value in column_values:
+                column.append(value)
+        store.length = length
+        return store
+
+    def derive(self, columns: Dict[str, Column]) -> "ColumnarResources":
+        """同じ種別で列だけが異なるストア"""
+        store = ColumnarResources.__new__(ColumnarResources)
+        store.resource_type_name = self.resource_type_name
+        store.resource_class = self.resource_class
+        store.field_names = self.field_names
+        store.columns = columns
+        store.length = len(next(iter(columns.values()))) if len(columns) > 0 else 0
+        store._identity_index = None
+        return store
+
+    def __len__(self) -> int:
+        return self.length
+
+    def append(self, resource: SnowflakeResourceT) -> None:
+        for [name, column] in self.columns.items():
+            column.append(getattr(resource, name))
+        self.length += 1
+        self._identity_index = None
+
+    def extend(self, resources: Iterable[SnowflakeResourceT]) -> None:
+        for resource in resources:
+            self.append(resource)
+
+    def get_value(self, i: int, name: str) -> Any:
+        return self.columns[name].get(i)
+
+    def get_attrs(self, i: int) -> dict:
+        """i行目の 属性名 -> 値。値がNoneの属性は含めない(render_attrsに渡せる)"""
+        attrs = {}
+        for [name, column] in self.columns.items():
+            value = column.get(i)
+            if value is not None:
+                attrs[name] = value
+        return attrs
+
+    def materialize(self, i: int) -> SnowflakeResourceT:
+        return self.resource_class(
+            **{name: column.get(i) for [name, column] in self.columns.items()}
+        )
+
+    def __getitem__(self, i: Union[int, slice]) -> Any:
+        if isinstance(i, slice):
+            return self.take(range(*i.indices(self.length)))
+        if i < 0:
+            i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError(i)
+        return self.materialize(i)
+
+    def __iter__(self) -> Iterator[SnowflakeResourceT]:
+        return (self.materialize(i) for i in range(self.length))
+
+    def rows(self) -> ColumnarRows:
+        return ColumnarRows(self)
+
+    def to_resources(self) -> List[SnowflakeResourceT]:
+        return list(self)
+
+    def take(self, indices: Iterable[int]) -> "ColumnarResources":
+        """指定した位置の行だけのストア(辞書は共有する)"""
+        indices = list(indices)
+        return self.derive(
+            {name: column.take(indices) for [name, column] in self.columns.items()}
+        )
+
+    def filter(
+        self, name: str, predicate: Callable[[Any], bool]
+    ) -> "ColumnarResources":
+        """属性nameの値がpredicateを満たす行だけのストア
+
+        文字列などの属性ではpredicateを行ごとではなく辞書の値ごとに1回だけ呼ぶ。
+        """
+        return self.take(self.columns[name].mask(predicate))
+
+    def merge(self, key: str) -> "ColumnarResources":
+        """key以外の属性が等しい行をまとめ、keyのリストを連結する
+
+        merge_resources_by_roles/merge_resources_by_usersと同じ結果を、
+        値ではなくコードの組でグループ分けして求める。グループの順序は出現順で、
+        まとめたリストはsort_merged_valuesと同じくNoneを除いて値の昇順に並べる。
+        """
+        key_column = self.columns[key]
+        other_columns = [c for [n, c] in self.columns.items() if n != key]
+        scalar_codes = [c.codes for c in other_columns if isinstance(c, ScalarColumn)]
+        list_columns = [c for c in other_columns if isinstance(c, ListColumn)]
+        if len(list_columns) == 0:
+            group_keys: Iterable[tuple] = zip(*scalar_codes)
+        else:
+            group_keys = (
+                codes + tuple(c.get_key(i) for c in list_columns)
+                for [i, codes] in enumerate(zip(*scalar_codes))
+            )
+
+        groups: Dict[tuple, List[int]] = {}
+        for [i, group_key] in enumerate(group_keys):
+            members = groups.get(group_key)
+            if members is None:
+                groups[group_key] = [i]
+            else:
+                members.append(i)
+
+        first_indices = [members[0] for members in groups.values()]
+        columns = {
+            name: column.take(first_indices)
+            for [name, column] in self.columns.items()
+            if name != key
+        }
+        merged = ListColumn(key_column.dictionary)
+        values = key_column.dictionary.values
+        for members in groups.values():
+            codes = []
+            for i in members:
+                if isinstance(key_column, ListColumn):
+                    codes.extend(key_column.get_codes(i))
+                else:
+                    codes.append(key_column.get_key(i))
+            # コード0はNone
+            merged.items.extend(
+                sorted((code for code in codes if code != 0), key=values.__getitem__)
+            )
+            merged.nulls.append(0)
+            merged.offsets.append(len(merged.items))
+        columns[key] = merged
+        return self.derive({name: columns[name] for name in self.field_names})
+
+    def get_identity_attr_names(self) -> Tuple[List[str], List[str]]:
+        """(同一性のキーになる属性, 値の有無だけをキーにする集約属性)"""
+        attr_names = [
+            a
+            for a in resource_id_attr_names_map[self.resource_type_name]
+            if a in self.columns
+        ]
+        return (
+            [a for a in attr_names if a not in merged_attr_names],
+            [a for a in attr_names if a in merged_attr_names],
+        )
+
+    def get_identity_key(self, i: int) -> tuple:
+        [scalar_attr_names, list_attr_names] = self.get_identity_attr_names()
+        return tuple(self.columns[a].get_key(i) for a in scalar_attr_names) + tuple(
+            a for a in list_attr_names if self.columns[a].get_key(i) is not None
+        )
+
+    def find(self, identity: tuple) -> Optional[int]:
+        """drift.get_resource_identityと同じ形の同一性のキーに一致する行の位置"""
+        if self._identity_index is None:
+            self._identity_index = {}
+            for i in range(self.length):
+                self._identity_index.setdefault(self.get_identity_key(i), i)
+
+        [scalar_attr_names, _] = self.get_identity_attr_names()
+        codes = []
+        for [attr_name, value] in zip(scalar_attr_names, identity):
+            code = self.columns[attr_name].dictionary.find(value)
+            if code is None:
+                return None
+            codes.append(code)
+        key = tuple(codes) + tuple(identity[len(scalar_attr_names) :])
+        return self._identity_index.get(key)
+
+    def lookup(self, identity: tuple) -> Optional[SnowflakeResourceT]:
+        i = self.find(identity)
+        return self.materialize(i) if i is not None else None
+
+    def memory_usage(self) -> int:
+        """列と辞書が使うおおよそのバイト数(共有している辞書は1回だけ数える)"""
+        dictionaries = {id(c.dictionary): c.dictionary for c in self.columns.values()}
+        return sum(c.memory_usage() for c in self.columns.values()) + sum(
+            d.memory_usage() for d in dictionaries.values()
+        )
+
+
+def render_columnar_chunk(
+    store: ColumnarResources,
+    resource_names: List[str],
+    indices: range,
+    import_ids: List[Optional[str]],
+) -> str:
+    """dataclassを作らずに、ストアの行を.tfの文字列にする"""
+    tf_resource_type_name = to_tf_resource_name(store.resource_type_name)
+    texts = []
+    for [resource_name, i, import_id] in zip(resource_names, indices, import_ids):
+        try:
+            text = render_attrs(
+                tf_resource_type_name,
+                resource_name,
+                store.resource_class,
+                store.get_attrs(i),
+            )
+        except TypeError as e:
+            capture_error("render", e, store.materialize(i))
+            continue
+
+        texts.append(text + "\n")
+        if import_id is not None:
+            texts.append(
+                render_import_block(tf_resource_type_name, resource_name, import_id)
+                + "\n"
+            )
+        texts.append("\n")
+    return "".join(texts)
+
+
+def write_columnar_resources(
+    file: TextIO,
+    resource_names: List[str],
+    store: ColumnarResources,
+    with_import_blocks: bool = False,
+    state: Optional[TerraformStateIndex] = None,
+    chunk_size: int = 1000,
+) -> None:
+    """write_resourcesのColumnarResources版。出力はwrite_resourcesと同一"""
+    import_ids = get_import_ids(
+        store.resource_type_name,
+        resource_names,
+        store.rows(),
+        with_import_blocks,
+        state,
+    )
+    for start in range(0, len(store), chunk_size):
+        stop = min(start + chunk_size, len(store))
+        with stage("render"):
+            text = render_columnar_chunk(
+                store,
+                resource_names[start:stop],
+                range(start, stop),
+                import_ids[start:stop],
+            )
+        with stage("write"):
+            file.write(text)
+        if has_stage_observers():
+            observe_count("bytes_written", len(text.encode("utf-8")))
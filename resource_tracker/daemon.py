@@ -0,0 +1,358 @@
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import replace
+from typing import Dict, List, Mapping, Optional
+from .drift import (
+    ResourceChange,
+    SnapshotNames,
+    diff_resources,
+    get_identity_getter,
+    read_snapshot,
+    to_drift_record,
+    write_snapshot,
+)
+from .errors import ErrorCollector, get_error_collector, set_error_collector
+from .export import (
+    ExportConfig,
+    connect,
+    get_fetcher,
+    iter_fetched_resources,
+    run_export,
+)
+from .terraform import output_formats
+from .types import SnowflakeResourceT
+from .utils import get_template
+from .validation import get_validator
+
+# 要求で上書きできる設定
+request_option_names = ["types", "output_dir", "format", "incremental", "update"]
+
+
+def get_socket_path(environ: Mapping[str, str] = os.environ) -> str:
+    """デーモンのソケットのパス。既定はユーザーごとに一時ディレクトリに作る"""
+    default_path = os.path.join(
+        tempfile.gettempdir(), f"resource-tracker-{os.getuid()}.sock"
+    )
+    return environ.get("RESOURCE_TRACKER_SOCKET", default_path)
+
+
+def is_closed(conn) -> bool:
+    """接続が閉じているか。is_closedを持たない接続(ReplayConnection)は閉じないものとする"""
+    check = getattr(conn, "is_closed", None)
+    return check is not None and check()
+
+
+def count_changes(changes: List[ResourceChange]) -> Dict[str, Dict[str, int]]:
+    """リソース種別 -> 変更の種類 -> 件数"""
+    counts: Dict[str, Dict[str, int]] = {}
+    for change in changes:
+        by_kind = counts.setdefault(change.resource_type, {})
+        by_kind[change.kind] = by_kind.get(change.kind, 0) + 1
+    return counts
+
+
+class ExportDaemon:
+    """接続・テンプレート・前回のスナップショットを保持し、エクスポートと差分の要求に答える
+
+    ErrorCollector等はプロセス全体の状態なので、export/diffはロックで1つずつ処理する。
+    connが与えられればconnectの代わりにそれを使う(ReplayConnectionでの確認用)。
+    """
+
+    def __init__(
+        self,
+        config: ExportConfig,
+        environ: Mapping[str, str] = os.environ,
+        conn=None,
+    ):
+        self.config = config
+        self.environ = environ
+        self.conn = conn
+        # リソース種別 -> 最後に取得したリソース
+        self.snapshot: Dict[str, List[SnowflakeResourceT]] = {}
+        # リソース種別 -> 同一性のキー -> 最後に出力したリソース名
+        self.snapshot_names: SnapshotNames = {}
+        self.render_executor: Optional[Executor] = None
+        self.started_at = time.time()
+        self.request_count = 0
+        self.stopping = False
+        self._lock = threading.Lock()
+
+    def warm_up(self) -> None:
+        """接続・テンプレート・スキーマ・前回のスナップショット・プロセスプールを用意しておく"""
+        self.get_connection()
+        get_template("snowflake_resource.tf.jinja")
+        if self.config.validate:
+            for resource_type_name in self.config.get_resource_types():
+                get_validator(resource_type_name)
+        snapshot_path = self.config.snapshot_path
+        if snapshot_path is not None and os.path.exists(snapshot_path):
+            [self.snapshot, self.snapshot_names] = read_snapshot(snapshot_path)
+        if self.config.render_jobs > 1:
+            self.render_executor = ProcessPoolExecutor(
+                max_workers=self.config.render_jobs
+            )
+
+    def get_connection(self):
+        """保持している接続を返す。閉じていれば接続し直す"""
+        if self.conn is None or is_closed(self.conn):
+            self.conn = connect(self.config, self.environ)
+        return self.conn
+
+    def close(self) -> None:
+        if self.render_executor is not None:
+            self.render_executor.shutdown()
+        if self.conn is not None:
+            self.conn.close()
+
+    def make_config(self, request: dict) -> ExportConfig:
+        """サーバの設定を、要求で指定された項目(types, output_dir, format, incremental)で上書きする"""
+        unknown = [
+            k for k in request if k != "command" and k not in request_option_names
+        ]
+        if len(unknown) > 0:
+            raise ValueError(f"Unknown options: {', '.join(unknown)}")
+
+        config = replace(self.config, incremental=bool(request.get("incremental")))
+        if request.get("types") is not None:
+            for resource_type_name in request["types"]:
+                get_fetcher(resource_type_name)
+            config.resource_types = list(request["types"])
+        if request.get("output_dir") is not None:
+            config.output_dir = request["output_dir"]
+        if request.get("format") is not None:
+            if request["format"] not in output_formats:
+                raise ValueError(f"Unknown format: '{request['format']}'")
+            config.output_format = request["format"]
+        return config
+
+    def handle(self, request: dict) -> dict:
+        """要求を処理して応答を返す。失敗した場合は{"ok": false, "error": ...}を返す"""
+        command = request.get("command")
+        start = time.perf_counter()
+        try:
+            if command == "status":
+                response = self.status()
+            elif command == "shutdown":
+                self.stopping = True
+                response = {}
+            elif command in ("export", "diff"):
+                with self._lock:
+                    self.request_count += 1
+                    if command == "export":
+                        response = self.export(self.make_config(request))
+                    else:
+                        response = self.diff(
+                            self.make_config(request), bool(request.get("update"))
+                        )
+            else:
+                raise ValueError(f"Unknown command: '{command}'")
+        except Exception as e:
+            # セッションが切れていれば、次の要求で接続し直す
+            if self.conn is not None and is_closed(self.conn):
+                self.conn = None
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        return {"ok": True, **response, "seconds": time.perf_counter() - start}
+
+    def status(self) -> dict:
+        return {
+            "uptime": time.time() - self.started_at,
+            "requests": self.request_count,
+            "snapshot": {t: len(rs) for [t, rs] in self.snapshot.items()},
+        }
+
+    def save_snapshot(self) -> None:
+        """保持しているスナップショットを、すべての種別の分まとめてsnapshot_pathに書き出す
+
+        要求で指定された種別だけを書くと、ほかの種別の前回の分がファイルから消えてしまう。
+        書き出しの途中で止まっても前のファイルが残るよう、一時ファイルに書いてから置き換える。
+        """
+        snapshot_path = self.config.snapshot_path
+        if snapshot_path is None:
+            return
+        tmp_path = f"{snapshot_path}.tmp"
+        with open(tmp_path, mode="w", encoding="utf-8") as w:
+            for [resource_type_name, resources] in self.snapshot.items():
+                get_identity = get_identity_getter(resource_type_name)
+                names = self.snapshot_names.get(resource_type_name, {})
+                write_snapshot(
+                    w,
+                    resource_type_name,
+                    resources,
+                    [names.get(get_identity(r)) for r in resources],
+                )
+        os.replace(tmp_path, snapshot_path)
+
+    def export(self, config: ExportConfig) -> dict:
+        """run_exportを実行する。incrementalなら保持しているスナップショットと名前を使う
+
+        スナップショットのファイルはrun_exportではなくsave_snapshotで書き出す。
+        """
+        result = run_export(
+            self.get_connection(),
+            replace(config, snapshot_path=None),
+            self.environ,
+            previous=self.snapshot if len(self.snapshot) > 0 else None,
+            keep_resources=True,
+            render_executor=self.render_executor,
+            previous_names=self.snapshot_names,
+        )
+        self.snapshot.update(result.resources)
+        self.snapshot_names.update(result.resource_names)
+        self.save_snapshot()
+        return {
+            "output_dir": os.path.abspath(config.output_dir),
+            "counts": result.counts,
+            "changes": count_changes(result.changes),
+            "errors": len(result.errors),
+            "violations": result.violation_count,
+        }
+
+    def diff(self, config: ExportConfig, update: bool = False) -> dict:
+        """取得したリソースを保持しているスナップショットと比べる。ファイルは書き出さない
+
+        updateが真なら、取得したリソースを新しいスナップショットにする。
+        リソース名はまだ付けないので、前回からあるリソースの名前だけを残す。
+        """
+        errors = ErrorCollector(config.error_policy)
+        previous_errors = get_error_collector()
+        set_error_collector(errors)
+        resource_types = config.get_resource_types()
+        fetch_executor = (
+            ThreadPoolExecutor(max_workers=config.fetch_jobs)
+            if config.fetch_jobs > 1
+            else None
+        )
+        counts = {}
+        changes: List[ResourceChange] = []
+        try:
+            fetched = iter_fetched_resources(
+                self.get_connection(),
+                resource_types,
+                config.fetch_options,
+                executor=fetch_executor,
+                jobs=config.fetch_jobs,
+            )
+            for [resource_type_name, resources] in zip(resource_types, fetched):
+                counts[resource_type_name] = len(resources)
+                changes.extend(
+                    diff_resources(
+                        resource_type_name,
+                        self.snapshot.get(resource_type_name, []),
+                        resources,
+                    )
+                )
+                if update:
+                    self.snapshot[resource_type_name] = resources
+                    names = self.snapshot_names.get(resource_type_name, {})
+                    get_identity = get_identity_getter(resource_type_name)
+                    self.snapshot_names[resource_type_name] = {
+                        identity: names[identity]
+                        for identity in map(get_identity, resources)
+                        if identity in names
+                    }
+            if update:
+                self.save_snapshot()
+        finally:
+            if fetch_executor is not None:
+                fetch_executor.shutdown()
+            set_error_collector(previous_errors)
+        return {
+            "counts": counts,
+            "summary": count_changes(changes),
+            "changes": [to_drift_record(change) for change in changes],
+            "errors": len(errors.errors),
+        }
+
+
+class ExportRequestHandler(socketserver.StreamRequestHandler):
+    """1行に1つのJSONの要求を読み、1行のJSONで応答する。接続が閉じられるまで繰り返す"""
+
+    def handle(self) -> None:
+        export_daemon: ExportDaemon = self.server.export_daemon
+        for line in self.rfile:
+            if line.strip() == b"":
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("Request must be a JSON object")
+            except ValueError as e:
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            else:
+                response = export_daemon.handle(request)
+            self.wfile.write(
+                json.dumps(response, ensure_ascii=False, default=list).encode("utf-8")
+                + b"\n"
+            )
+            if export_daemon.stopping:
+                # serve_foreverのループを止める。shutdownはループの終了を待つので別スレッドで呼ぶ
+                threading.Thread(target=self.server.shutdown).start()
+                return
+
+
+class ExportServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, export_daemon: ExportDaemon):
+        self.export_daemon = export_daemon
+        super().__init__(socket_path, ExportRequestHandler)
+
+
+def remove_stale_socket(socket_path: str) -> None:
+    """前回のデーモンが残したソケットを消す。まだ応答するデーモンがいればエラーにする"""
+    if not os.path.exists(socket_path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(socket_path)
+            return
+    raise RuntimeError(f"Daemon is already running: {socket_path}")
+
+
+def serve(
+    config: ExportConfig,
+    socket_path: Optional[str] = None,
+    environ: Mapping[str, str] = os.environ,
+    conn=None,
+) -> None:
+    """接続などを用意してからUnixソケットで待ち受け、shutdownの要求かCtrl-Cで終了する"""
+    socket_path = socket_path or get_socket_path(environ)
+    remove_stale_socket(socket_path)
+    export_daemon = ExportDaemon(config, environ, conn=conn)
+    export_daemon.warm_up()
+    try:
+        with ExportServer(socket_path, export_daemon) as server:
+            os.chmod(socket_path, 0o600)
+            print(f"Listening on {socket_path}", file=sys.stderr)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+    finally:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        export_daemon.close()
+
+
+def send_request(
+    request: dict, socket_path: Optional[str] = None, timeout: Optional[float] = None
+) -> dict:
+    """デーモンに1つの要求を送り、応答を返す"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(socket_path or get_socket_path())
+        s.sendall(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+        with s.makefile("rb") as r:
+            line = r.readline()
+    if line == b"":
+        raise ConnectionError("Daemon closed the connection without a response")
+    return json.loads(line)
@@ -0,0 +1,284 @@
+import json
+import os
+import sys
+from dataclasses import dataclass, field, fields
+from functools import lru_cache
+from itertools import repeat
+from operator import attrgetter
+from typing import Any, Callable, Dict, Iterable, List, Optional, TextIO, Tuple, Type
+from . import types
+from .terraform import (
+    get_resource_id,
+    get_resource_names,
+    merged_attr_names,
+    resource_id_attr_names_map,
+    to_tf_resource_name,
+    write_resources,
+)
+from .tfstate import TerraformStateIndex
+from .types import SnowflakeResource, SnowflakeResourceT
+from .utils import dict_factory_without_none, snake_case_to_camel_case
+
+# リソース種別 -> 同一性のキー(get_resource_identity) -> .tfでのリソース名
+SnapshotNames = Dict[str, Dict[tuple, str]]
+
+
+def get_resource_class(resource_type_name: str) -> Type[SnowflakeResource]:
+    """ "schema_grant" -> SnowflakeSchemaGrant"""
+    return getattr(types, snake_case_to_camel_case(f"snowflake_{resource_type_name}"))
+
+
+def write_snapshot(
+    w: TextIO,
+    resource_type_name: str,
+    resources: Iterable[SnowflakeResourceT],
+    resource_names: Optional[List[str]] = None,
+) -> None:
+    """fetchしたリソースをスナップショット(JSON Lines)に追記する
+
+    resource_namesを与えると.tfでのリソース名も記録し、次のincrementalで再利用する。
+    """
+    names = resource_names if resource_names is not None else repeat(None)
+    for [resource, resource_name] in zip(resources, names):
+        attrs = dict_factory_without_none(
+            [(f.name, getattr(resource, f.name)) for f in get_fields(type(resource))]
+        )
+        record = {"type": resource_type_name, "attrs": attrs}
+        if resource_name is not None:
+            record["name"] = resource_name
+        print(json.dumps(record, ensure_ascii=False), file=w)
+
+
+def read_snapshot(
+    path: str,
+) -> Tuple[Dict[str, List[SnowflakeResourceT]], SnapshotNames]:
+    """スナップショットを読み込み、(リソース種別ごとのリスト, 記録したリソース名)にする"""
+    snapshot: Dict[str, List[SnowflakeResourceT]] = {}
+    names: SnapshotNames = {}
+    with open(path, encoding="utf-8") as r:
+        for line in r:
+            record = json.loads(line)
+            resource_type_name = record["type"]
+            cls = get_resource_class(resource_type_name)
+            resource = cls(**record["attrs"])
+            snapshot.setdefault(resource_type_name, []).append(resource)
+            if record.get("name") is not None:
+                identity = get_resource_identity(resource_type_name, resource)
+                names.setdefault(resource_type_name, {})[identity] = record["name"]
+    return (snapshot, names)
+
+
+def load_snapshot(path: str) -> Dict[str, List[SnowflakeResourceT]]:
+    """スナップショットを読み込み、リソース種別ごとのリストにする"""
+    return read_snapshot(path)[0]
+
+
+@lru_cache(maxsize=None)
+def get_fields(cls: type) -> tuple:
+    return fields(cls)
+
+
+def normalize_value(value: Any) -> Any:
+    """比較用の値。リストや集合は順序を無視する(ブロックのリストは順序も比較する)"""
+    if isinstance(value, list) and any(isinstance(v, dict) for v in value):
+        return tuple(json.dumps(v, sort_keys=True) for v in value)
+    if isinstance(value, (list, set, tuple)):
+        return tuple(sorted(value))
+    return value
+
+
+@lru_cache(maxsize=None)
+def get_identity_getter(resource_type_name: str) -> Callable[[Any], tuple]:
+    """リソースの同一性を表すキーを取り出す関数
+
+    resource_id_attr_names_mapの属性のうちマージで集約される属性(roles等)を除いたもの。
+    role_grantsのようにroles用とusers用で別リソースになるものを区別するため、
+    値がある集約属性の名前もキーに含める。
+    """
+    attr_names = resource_id_attr_names_map[resource_type_name]
+    scalar_attr_names = [a for a in attr_names if a not in merged_attr_names]
+    list_attr_names = [a for a in attr_names if a in merged_attr_names]
+    get_scalars = (
+        attrgetter(*scalar_attr_names)
+        if len(scalar_attr_names) > 1
+        else lambda r: (getattr(r, scalar_attr_names[0]),)
+    )
+
+    def get_identity(resource) -> tuple:
+        return get_scalars(resource) + tuple(
+            a for a in list_attr_names if getattr(resource, a) is not None
+        )
+
+    return get_identity
+
+
+def get_resource_identity(
+    resource_type_name: str, resource: SnowflakeResourceT
+) -> tuple:
+    return get_identity_getter(resource_type_name)(resource)
+
+
+def to_names_by_identity(
+    resource_type_name: str,
+    resources: List[SnowflakeResourceT],
+    resource_names: List[str],
+) -> Dict[tuple, str]:
+    get_identity = get_identity_getter(resource_type_name)
+    return {get_identity(r): n for [r, n] in zip(resources, resource_names)}
+
+
+def to_previous_state(
+    resource_type_name: str,
+    resources: List[SnowflakeResourceT],
+    previous_names: Dict[tuple, str],
+) -> TerraformStateIndex:
+    """前回のスナップショットにあったリソースを、前回の名前でstateにあるものとして扱うTerraformStateIndex
+
+    incrementalでは前回の出力を適用済みとみなす。これをstateに加えると、前回からあるリソースは
+    (変更されたものも)同じ名前のままになり、importの対象は追加されたリソースだけになる。
+    """
+    tf_resource_type_name = to_tf_resource_name(resource_type_name)
+    get_identity = get_identity_getter(resource_type_name)
+    index = TerraformStateIndex()
+    for resource in resources:
+        resource_name = previous_names.get(get_identity(resource))
+        if resource_name is not None:
+            index.add(
+                f"{tf_resource_type_name}.{resource_name}",
+                tf_resource_type_name,
+                get_resource_id(resource_type_name, resource),
+            )
+    return index
+
+
+@dataclass
+class ResourceChange:
+    resource_type: str
+    kind: str  # "added" | "removed" | "modified"
+    identity: tuple
+    old: Optional[SnowflakeResourceT] = None
+    new: Optional[SnowflakeResourceT] = None
+    # 属性名 -> (変更前, 変更後)
+    changes: Dict[str, Tuple[Any, Any]] = field(default_factory=dict)
+
+
+def diff_fields(
+    old: SnowflakeResourceT, new: SnowflakeResourceT
+) -> Dict[str, Tuple[Any, Any]]:
+    changes = {}
+    for f in get_fields(type(new)):
+        old_value = getattr(old, f.name)
+        new_value = getattr(new, f.name)
+        if normalize_value(old_value) != normalize_value(new_value):
+            changes[f.name] = (old_value, new_value)
+    return changes
+
+
+def diff_resources(
+    resource_type_name: str,
+    old_resources: List[SnowflakeResourceT],
+    new_resources: List[SnowflakeResourceT],
+) -> List[ResourceChange]:
+    """同一性のキーでハッシュ結合し、追加・削除・変更されたリソースを返す
+
+    同じキーのリソースが複数ある場合は後のものを使う。
+    大半のリソースは変わらない前提で、まずdataclassの==で比較し、
+    異なるものだけリストの順序を無視して属性ごとに比較する。
+    """
+    get_identity = get_identity_getter(resource_type_name)
+    old_index = {get_identity(r): r for r in old_resources}
+    changes = []
+    seen = set()
+    for new in new_resources:
+        identity = get_identity(new)
+        seen.add(identity)
+        old = old_index.get(identity)
+        if old is None:
+            changes.append(
+                ResourceChange(resource_type_name, "added", identity, new=new)
+            )
+        elif old != new:
+            field_changes = diff_fields(old, new)
+            if len(field_changes) > 0:
+                changes.append(
+                    ResourceChange(
+                        resource_type_name,
+                        "modified",
+                        identity,
+                        old=old,
+                        new=new,
+                        changes=field_changes,
+                    )
+                )
+
+    for [identity, old] in old_index.items():
+        if identity not in seen:
+            changes.append(
+                ResourceChange(resource_type_name, "removed", identity, old=old)
+            )
+    return changes
+
+
+def diff_snapshots(
+    old: Dict[str, List[SnowflakeResourceT]], new: Dict[str, List[SnowflakeResourceT]]
+) -> List[ResourceChange]:
+    changes = []
+    for resource_type_name in sorted(set(old) | set(new)):
+        changes.extend(
+            diff_resources(
+                resource_type_name,
+                old.get(resource_type_name, []),
+                new.get(resource_type_name, []),
+            )
+        )
+    return changes
+
+
+def to_drift_record(change: ResourceChange) -> dict:
+    """変更を差分レポートの1行分の辞書にする"""
+    return {
+        "type": change.resource_type,
+        "kind": change.kind,
+        "identity": list(change.identity),
+        "changes": {
+            k: {"old": old, "new": new} for [k, [old, new]] in change.changes.items()
+        },
+    }
+
+
+def write_drift_report(w: TextIO, changes: List[ResourceChange]) -> None:
+    """変更の一覧をJSON Linesで書き出す"""
+    for change in changes:
+        print(
+            json.dumps(to_drift_record(change), ensure_ascii=False, default=list),
+            file=w,
+        )
+
+
+def write_drift_summary(
+    changes: List[ResourceChange], file: TextIO = sys.stderr
+) -> None:
+    counts: Dict[Tuple[str, str], int] = {}
+    for change in changes:
+        key = (change.resource_type, change.kind)
+        counts[key] = counts.get(key, 0) + 1
+    for [[resource_type_name, kind], n] in sorted(counts.items()):
+        print(f"{resource_type_name:<28} {kind:<10} {n:>8}", file=file)
+
+
+def write_changed_resources(output_dir: str, changes: List[ResourceChange]) -> None:
+    """追加・変更されたリソースだけを<output_dir>/<type>.tfにレンダリングする"""
+    by_type: Dict[str, List[SnowflakeResourceT]] = {}
+    for change in changes:
+        if change.new is not None:
+            by_type.setdefault(change.resource_type, []).append(change.new)
+
+    os.makedirs(output_dir, exist_ok=True)
+    for [resource_type_name, resources] in by_type.items():
+        resource_names = get_resource_names(resource_type_name, resources)
+        with open(
+            os.path.join(output_dir, f"{resource_type_name}.tf"),
+            mode="w",
+            encoding="utf-8",
+        ) as w:
+            write_resources(w, resource_type_name, resource_names, resources)
@@ -0,0 +1,98 @@
+import json
+import sys
+import threading
+import traceback
+from dataclasses import dataclass, asdict, is_dataclass
+from enum import Enum
+from typing import Any, List, Optional, TextIO
+from .profiling import current_resource_type
+
+
+class ErrorPolicy(str, Enum):
+    """エラー発生時の方針"""
+
+    # 例外をそのまま送出して処理を止める
+    FAIL_FAST = "fail_fast"
+    # エラーを記録して該当行(リソース)を飛ばし、処理を続ける
+    SKIP = "skip"
+
+
+@dataclass
+class CapturedError:
+    resource_type: Optional[str]
+    stage: str
+    error_type: str
+    message: str
+    row: Any
+    traceback: str
+
+
+def to_jsonable_row(row: Any) -> Any:
+    if is_dataclass(row) and not isinstance(row, type):
+        return asdict(row)
+    if isinstance(row, tuple):
+        return list(row)
+    return row
+
+
+class ErrorCollector:
+    """失敗した行・リソース種別・例外をまとめ、エラーレポートとして書き出す"""
+
+    def __init__(self, policy: ErrorPolicy = ErrorPolicy.FAIL_FAST):
+        self.policy = ErrorPolicy(policy)
+        self.errors: List[CapturedError] = []
+        self._lock = threading.Lock()
+
+    def capture(self, stage: str, exception: BaseException, row: Any = None) -> None:
+        """方針がFAIL_FASTなら例外を送出し、SKIPなら記録して戻る"""
+        if self.policy == ErrorPolicy.FAIL_FAST:
+            raise exception
+
+        error = CapturedError(
+            resource_type=current_resource_type.get(),
+            stage=stage,
+            error_type=type(exception).__name__,
+            message=str(exception),
+            row=to_jsonable_row(row),
+            traceback="".join(traceback.format_exception(exception)),
+        )
+        with self._lock:
+            self.errors.append(error)
+
+    def write_report(self, path: str) -> None:
+        """エラーをJSON Linesで書き出す"""
+        with open(path, mode="w", encoding="utf-8") as w:
+            for error in self.errors:
+                print(
+                    json.dumps(asdict(error), ensure_ascii=False, default=str), file=w
+                )
+
+    def write_summary(self, file: TextIO = sys.stderr) -> None:
+        if len(self.errors) == 0:
+            return
+        counts = {}
+        for error in self.errors:
+            key = (error.resource_type or "-", error.stage, error.error_type)
+            counts[key] = counts.get(key, 0) + 1
+        print(f"{len(self.errors)} errors were skipped:", file=file)
+        for [[typ, stage_name, error_type], n] in sorted(counts.items()):
+            print(f"  {typ:<28} {stage_name:<10} {error_type:<20} {n:>8}", file=file)
+
+
+error_collector: Optional[ErrorCollector] = None
+
+
+def set_error_collector(collector: Optional[ErrorCollector]) -> None:
+    global error_collector
+    error_collector = collector
+
+
+def get_error_collector() -> Optional[ErrorCollector]:
+    return error_collector
+
+
+def capture_error(stage: str, exception: BaseException, row: Any = None) -> None:
+    """エラーを現在のErrorCollectorに渡す。未設定ならFAIL_FASTとして例外を送出する"""
+    if error_collector is None:
+        raise exception
+    error_collector.capture(stage, exception, row)
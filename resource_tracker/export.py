@@ -0,0 +1,670 @@
+import os
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from os.path import expanduser
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, TextIO
+from . import sql
+from .drift import (
+    ResourceChange,
+    SnapshotNames,
+    diff_resources,
+    read_snapshot,
+    to_names_by_identity,
+    to_previous_state,
+    write_drift_report,
+    write_drift_summary,
+    write_snapshot,
+)
+from .errors import (
+    CapturedError,
+    ErrorCollector,
+    ErrorPolicy,
+    capture_error,
+    set_error_collector,
+)
+from .fetch_engine import FetchOptions
+from .metrics import ExportMetrics
+from .pagination import show_row_limit
+from .profiling import MemoryProfiler, add_stage_observer, remove_stage_observer, stage
+from .replay import RecordingConnection, ReplayConnection
+from .scope import ExportScope, default_exclude_file_formats, parse_patterns
+from .sql import default_batch_size
+from .streaming import can_stream, iter_resource_batches, write_streamed_resources
+from .terraform import (
+    get_resource_names,
+    parse_shard_by,
+    tf_file_extensions,
+    write_import_commands,
+    write_resources_as,
+    write_sharded_resources,
+)
+from .tfstate import TerraformStateIndex, load_terraform_states
+from .trace import QueryTracer, fetcher_context, set_query_tracer
+from .types import SnowflakeResourceT
+from .validation import ViolationReport, validate_resources
+
+# 既定でエクスポートするリソース種別
+imported_resource_types = [
+    "database",
+    "database_grant",
+    "file_format",
+    "file_format_grant",
+    "integration_grant",
+    "notification_integration",
+    "resource_monitor",
+    "resource_monitor_grant",
+    "role",
+    "role_grants",
+    "schema",
+    "schema_grant",
+    "stage",
+    "stage_grant",
+    "storage_integration",
+    "task",
+    "task_grant",
+    "user",
+    "user_grant",
+    "warehouse",
+    "warehouse_grant",
+]
+# account_usageからしか取得しない種別。FetchOptions.sourceが"account_usage"のときだけ出力する
+account_usage_resource_types = ["pipe", "table", "view"]
+# fetch_<複数形>の複数形が単純に"s"を付けたものにならない種別
+irregular_plurals = {"schema": "schemata", "role_grants": "role_grants"}
+default_private_key_path = "~/.ssh/snowflake_tf_snow_key.p8"
+
+
+def get_fetcher(resource_type_name: str) -> Callable:
+    """リソース種別 -> fetch_<複数形>関数"""
+    plural = irregular_plurals.get(resource_type_name, f"{resource_type_name}s")
+    fetch = getattr(sql, f"fetch_{plural}", None)
+    if fetch is None:
+        raise ValueError(f"Unknown resource type: '{resource_type_name}'")
+    return fetch
+
+
+@dataclass
+class ExportConfig:
+    """エクスポート(apps/render_resources.py, resource-tracker export)の設定
+
+    from_envで環境変数(RESOURCE_TRACKER_*, SNOWFLAKE_*)から作り、CLIの引数で上書きする。
+    """
+
+    output_dir: str = "outputs"
+    # Noneなら既定の種別(imported_resource_types、account_usageならその種別も)
+    resource_types: Optional[List[str]] = None
+    fetch_options: FetchOptions = field(default_factory=FetchOptions)
+    # 同時に取得するリソース種別の数。2以上ならスレッドで並列にクエリを実行する
+    fetch_jobs: int = 1
+    # レンダリングに使うプロセス数。2以上ならプロセスプールで並列にレンダリングする
+    render_jobs: int = 1
+    # シャーディング設定(例: ["database", "schema"])。空ならリソース種別ごとに1ファイル
+    shard_by: List[str] = field(default_factory=list)
+    shard_max_resources: Optional[int] = None
+    shard_as_modules: bool = False
+    # "script": import.shを生成する / "block": 各リソースの直後にimportブロックを書く
+    import_mode: str = "script"
+    # "hcl": <type>.tf / "json": テンプレートを使わずに<type>.tf.json(Terraform JSON)を書く
+    output_format: str = "hcl"
+    # 既存のterraform.tfstate(またはterraform show -jsonの出力)
+    tfstate_paths: List[str] = field(default_factory=list)
+    # specで取得できる種別を、カーソルからバッチごとに読んで書き出しまで流す
+    streaming: bool = False
+    stream_batch_size: int = default_batch_size
+    # レンダリング前にスキーマ(data/resources.jsonl)で検証する
+    validate: bool = True
+    # 検証で見つかった違反の集計(JSON Lines)の出力先。Noneなら<output_dir>/violations.jsonl
+    violation_report_path: Optional[str] = None
+    # fetchしたリソースのスナップショット(JSON Lines)の出力先
+    snapshot_path: Optional[str] = None
+    # Trueならsnapshot_pathの前回のスナップショットと比べ、前回の名前を再利用して
+    # 追加されたリソースだけをimportする。追加・変更されたリソースは<output_dir>/drift/にも出力する
+    incremental: bool = False
+    error_policy: ErrorPolicy = ErrorPolicy.FAIL_FAST
+    # skip時のエラーレポート(JSON Lines)の出力先。Noneなら<output_dir>/errors.jsonl
+    error_report_path: Optional[str] = None
+    # stageごと・リソース種別ごとのメモリ使用量とクエリの集計を表示する
+    profile: bool = False
+    # クエリごとのトレース(JSON Lines)の出力先
+    trace_path: Optional[str] = None
+    # リソース種別ごとの件数・時間をOpenMetrics形式で書き出すファイル
+    metrics_path: Optional[str] = None
+    # 実行したクエリと結果を記録するファイル / 記録済みの結果を返す接続を使う場合のファイル
+    record_path: Optional[str] = None
+    replay_path: Optional[str] = None
+    replay_latency: float = 0.0
+    private_key_path: str = default_private_key_path
+
+    @staticmethod
+    def from_env(environ: Mapping[str, str] = os.environ) -> "ExportConfig":
+        scope = ExportScope(
+            databases=parse_patterns(environ.get("RESOURCE_TRACKER_DATABASES", "")),
+            exclude_databases=parse_patterns(
+                environ.get("RESOURCE_TRACKER_EXCLUDE_DATABASES", "")
+            ),
+            schemas=parse_patterns(environ.get("RESOURCE_TRACKER_SCHEMAS", "")),
+            exclude_schemas=parse_patterns(
+                environ.get("RESOURCE_TRACKER_EXCLUDE_SCHEMAS", "")
+            ),
+            names=parse_patterns(environ.get("RESOURCE_TRACKER_NAMES", "")),
+            exclude_names=parse_patterns(
+                environ.get("RESOURCE_TRACKER_EXCLUDE_NAMES", "")
+            ),
+            roles=parse_patterns(environ.get("RESOURCE_TRACKER_ROLES", "")),
+            exclude_roles=parse_patterns(
+                environ.get("RESOURCE_TRACKER_EXCLUDE_ROLES", "")
+            ),
+            file_formats=parse_patterns(
+                environ.get("RESOURCE_TRACKER_FILE_FORMATS", "")
+            ),
+            exclude_file_formats=parse_patterns(
+                environ.get(
+                    "RESOURCE_TRACKER_EXCLUDE_FILE_FORMATS",
+                    ",".join(default_exclude_file_formats),
+                )
+            ),
+        )
+        # SHOWの上限で結果が切り捨てられないようにページに分ける。0なら分けない
+        show_page_size = int(
+            environ.get("RESOURCE_TRACKER_SHOW_PAGE_SIZE", str(show_row_limit))
+        )
+        fetch_options = FetchOptions(
+            server_side_merge=environ.get("RESOURCE_TRACKER_SERVER_SIDE_MERGE")
+            == "true",
+            scope=scope,
+            show_page_size=show_page_size if show_page_size > 0 else None,
+            source=environ.get("RESOURCE_TRACKER_FETCH_SOURCE", "show"),
+        )
+        return ExportConfig(
+            fetch_options=fetch_options,
+            fetch_jobs=int(environ.get("RESOURCE_TRACKER_FETCH_JOBS", "1")),
+            render_jobs=int(environ.get("RESOURCE_TRACKER_RENDER_JOBS", "1")),
+            shard_by=parse_shard_by(environ.get("RESOURCE_TRACKER_SHARD_BY")),
+            shard_max_resources=(
+                int(environ["RESOURCE_TRACKER_SHARD_MAX_RESOURCES"])
+                if environ.get("RESOURCE_TRACKER_SHARD_MAX_RESOURCES")
+                else None
+            ),
+            shard_as_modules=environ.get("RESOURCE_TRACKER_SHARD_AS_MODULES") == "true",
+            import_mode=environ.get("RESOURCE_TRACKER_IMPORT_MODE", "script"),
+            output_format=environ.get("RESOURCE_TRACKER_OUTPUT_FORMAT", "hcl"),
+            tfstate_paths=parse_patterns(environ.get("RESOURCE_TRACKER_TFSTATE", "")),
+            streaming=environ.get("RESOURCE_TRACKER_STREAMING") == "true",
+            stream_batch_size=int(
+                environ.get(
+                    "RESOURCE_TRACKER_STREAM_BATCH_SIZE", str(default_batch_size)
+                )
+            ),
+            validate=environ.get("RESOURCE_TRACKER_VALIDATE", "true") == "true",
+            violation_report_path=environ.get("RESOURCE_TRACKER_VIOLATION_REPORT"),
+            snapshot_path=environ.get("RESOURCE_TRACKER_SNAPSHOT"),
+            error_policy=ErrorPolicy(
+                environ.get("RESOURCE_TRACKER_ERROR_POLICY", "fail_fast")
+            ),
+            error_report_path=environ.get("RESOURCE_TRACKER_ERROR_REPORT"),
+            profile=environ.get("RESOURCE_TRACKER_PROFILE_MEMORY") == "true",
+            trace_path=environ.get("RESOURCE_TRACKER_TRACE"),
+            metrics_path=environ.get("RESOURCE_TRACKER_METRICS"),
+            record_path=environ.get("RESOURCE_TRACKER_RECORD"),
+            replay_path=environ.get("RESOURCE_TRACKER_REPLAY"),
+            replay_latency=float(environ.get("RESOURCE_TRACKER_REPLAY_LATENCY", "0")),
+            private_key_path=environ.get(
+                "SNOWFLAKE_PRIVATE_KEY_PATH", default_private_key_path
+            ),
+        )
+
+    def get_resource_types(self) -> List[str]:
+        if self.resource_types is not None:
+            return self.resource_types
+        if self.fetch_options.source == "account_usage":
+            return imported_resource_types + account_usage_resource_types
+        return imported_resource_types
+
+    def is_sharded(self) -> bool:
+        return len(self.shard_by) > 0 or self.shard_max_resources is not None
+
+    def get_tf_path(self, resource_type_name: str) -> str:
+        extension = tf_file_extensions[self.output_format]
+        return f"{self.output_dir}/{resource_type_name}{extension}"
+
+
+def connect(config: ExportConfig, environ: Mapping[str, str] = os.environ):
+    """Snowflakeに接続する。replay_pathが設定されていれば記録済みの結果を返す接続を使う"""
+    if config.replay_path is not None:
+        return ReplayConnection(config.replay_path, latency=config.replay_latency)
+
+    # 接続しない場合(リプレイ・--help)に読み込まなくて済むよう、ここでimportする
+    import snowflake.connector
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives import serialization
+
+    with open(expanduser(config.private_key_path), "rb") as r:
+        p_key = serialization.load_pem_private_key(
+            r.read(), password=None, backend=default_backend()
+        )
+
+    conn = snowflake.connector.connect(
+        user=environ["SNOWFLAKE_USER"],
+        account=environ["SNOWFLAKE_ACCOUNT"],
+        private_key=p_key,
+        warehouse=environ.get("SNOWFLAKE_WAREHOUSE", "COMPUTE_WS"),
+        database=environ.get("SNOWFLAKE_DATABASE"),
+        schema=environ.get("SNOWFLAKE_SCHEMA", "PUBLIC"),
+        role=environ["SNOWFLAKE_ROLE"],
+    )
+    if config.record_path is not None:
+        return RecordingConnection(conn, config.record_path)
+    return conn
+
+
+def fetch_resource_type(
+    conn, resource_type_name: str, options: Optional[FetchOptions] = None
+) -> List[SnowflakeResourceT]:
+    """1種類のリソースを取得する。失敗した場合はErrorCollectorの方針に従う"""
+    fetch = get_fetcher(resource_type_name)
+    with stage("fetch", resource_type_name), fetcher_context(fetch.__name__):
+        try:
+            return fetch(conn, options)
+        except Exception as e:
+            capture_error("fetch", e)
+            return []
+
+
+def iter_fetched_resources(
+    conn,
+    resource_type_names: List[str],
+    options: Optional[FetchOptions] = None,
+    executor: Optional[Executor] = None,
+    jobs: int = 1,
+) -> Iterator[List[SnowflakeResourceT]]:
+    """resource_type_namesの順に、種別ごとのリソースを返す
+
+    executorがあれば、先のjobs種別分を並列に取得しておく。
+    取得済みで書き出し待ちの種別がjobs個を超えないので、メモリ使用量は並列度に比例する程度で済む。
+    """
+    if executor is None:
+        for resource_type_name in resource_type_names:
+            yield fetch_resource_type(conn, resource_type_name, options)
+        return
+
+    names = iter(resource_type_names)
+    futures = deque(
+        executor.submit(fetch_resource_type, conn, resource_type_name, options)
+        for resource_type_name in islice(names, jobs)
+    )
+    while len(futures) > 0:
+        resources = futures.popleft().result()
+        for resource_type_name in islice(names, 1):
+            futures.append(
+                executor.submit(fetch_resource_type, conn, resource_type_name, options)
+            )
+        yield resources
+
+
+def write_resource_type(
+    config: ExportConfig,
+    import_w: Optional[TextIO],
+    resource_type_name: str,
+    resource_names: List[str],
+    resources: List[SnowflakeResourceT],
+    state: Optional[TerraformStateIndex] = None,
+    executor: Optional[Executor] = None,
+) -> None:
+    """1種類のリソースを.tfファイルとimportコマンド(またはimportブロック)に書き出す
+
+    stateが与えられた場合、既にstateにあるリソースのimportは出力しない。
+    """
+    output_dir = config.output_dir
+    with_import_blocks = import_w is None
+
+    def write_imports(w: TextIO, names: List[str], rs: List[SnowflakeResourceT]):
+        write_import_commands(w, resource_type_name, names, rs, state=state)
+
+    if not config.is_sharded():
+        tf_path = config.get_tf_path(resource_type_name)
+        with open(tf_path, mode="w", encoding="utf-8") as w:
+            write_resources_as(
+                config.output_format,
+                w,
+                resource_type_name,
+                resource_names,
+                resources,
+                with_import_blocks=with_import_blocks,
+                state=state,
+                executor=executor,
+            )
+        if not with_import_blocks:
+            write_imports(import_w, resource_names, resources)
+        return
+
+    shards = write_sharded_resources(
+        output_dir,
+        resource_type_name,
+        resource_names,
+        resources,
+        config.shard_by,
+        max_resources_per_shard=config.shard_max_resources,
+        as_modules=config.shard_as_modules,
+        with_import_blocks=with_import_blocks,
+        state=state,
+        executor=executor,
+        output_format=config.output_format,
+    )
+    if with_import_blocks:
+        return
+
+    for [shard_dir, [shard_resource_names, shard_resources]] in shards.items():
+        if config.shard_as_modules:
+            # モジュールごとにstateが別なので、importもモジュール内で実行する
+            with open(f"{shard_dir}/import.sh", mode="w", encoding="utf-8") as w:
+                write_imports(w, shard_resource_names, shard_resources)
+        else:
+            write_imports(import_w, shard_resource_names, shard_resources)
+
+
+def write_drift_resource_type(
+    config: ExportConfig,
+    resource_type_name: str,
+    resource_names: List[str],
+    resources: List[SnowflakeResourceT],
+    type_changes: List[ResourceChange],
+) -> None:
+    """追加・変更されたリソースだけを、全件の.tfと同じ名前で<output_dir>/drift/に書き出す
+
+    確認用なのでimportは出力しない。変更がなければ前回のファイルを消す。
+    """
+    changed = {id(c.new) for c in type_changes if c.new is not None}
+    pairs = [[n, r] for [n, r] in zip(resource_names, resources) if id(r) in changed]
+    drift_dir = f"{config.output_dir}/drift"
+    extension = tf_file_extensions[config.output_format]
+    tf_path = f"{drift_dir}/{resource_type_name}{extension}"
+    if len(pairs) == 0:
+        if os.path.exists(tf_path):
+            os.remove(tf_path)
+        return
+
+    os.makedirs(drift_dir, exist_ok=True)
+    with open(tf_path, mode="w", encoding="utf-8") as w:
+        write_resources_as(
+            config.output_format,
+            w,
+            resource_type_name,
+            [n for [n, _] in pairs],
+            [r for [_, r] in pairs],
+        )
+
+
+def stream_resource_type(
+    config: ExportConfig,
+    conn,
+    import_w: Optional[TextIO],
+    resource_type_name: str,
+    state: Optional[TerraformStateIndex] = None,
+    snapshot_w: Optional[TextIO] = None,
+    violations: Optional[ViolationReport] = None,
+    executor: Optional[Executor] = None,
+) -> int:
+    """1種類のリソースを、取得から書き出しまでバッチごとに流す。件数を返す"""
+    batches = iter_resource_batches(
+        conn, resource_type_name, config.fetch_options, config.stream_batch_size
+    )
+    with open(config.get_tf_path(resource_type_name), mode="w", encoding="utf-8") as w:
+        return write_streamed_resources(
+            w,
+            resource_type_name,
+            batches,
+            import_w=import_w,
+            with_import_blocks=import_w is None,
+            state=state,
+            snapshot_w=snapshot_w,
+            violations=violations,
+            executor=executor,
+            output_format=config.output_format,
+        )
+
+
+@dataclass
+class ExportResult:
+    # リソース種別 -> 取得した件数
+    counts: Dict[str, int] = field(default_factory=dict)
+    # incrementalのとき、前回のスナップショットからの変更
+    changes: List[ResourceChange] = field(default_factory=list)
+    # keep_resourcesが真のとき、リソース種別 -> 取得したリソース
+    resources: Dict[str, List[SnowflakeResourceT]] = field(default_factory=dict)
+    # keep_resourcesが真のとき、リソース種別 -> 同一性のキー -> .tfでのリソース名
+    resource_names: SnapshotNames = field(default_factory=dict)
+    errors: List[CapturedError] = field(default_factory=list)
+    violation_count: int = 0
+
+
+def run_export(
+    conn,
+    config: ExportConfig,
+    environ: Mapping[str, str] = os.environ,
+    previous: Optional[Dict[str, List[SnowflakeResourceT]]] = None,
+    keep_resources: bool = False,
+    render_executor: Optional[Executor] = None,
+    previous_names: Optional[SnapshotNames] = None,
+) -> ExportResult:
+    """リソース種別ごとに 取得 -> 検証 -> 名前付け -> 書き出し を行い、レポートを出力する
+
+    incrementalのとき、previousが与えられればsnapshot_pathの代わりにそれと比べる
+    (その場合、前回のリソース名はprevious_namesから引く)。
+    keep_resourcesが真なら取得したリソースを結果に残す(その場合はストリーミングしない)。
+    render_executorが与えられれば、レンダリングのプロセスプールを作らずにそれを使う。
+    """
+    output_dir = config.output_dir
+    os.makedirs(output_dir, exist_ok=True)
+    resource_types = config.get_resource_types()
+    state = (
+        load_terraform_states(config.tfstate_paths)
+        if len(config.tfstate_paths) > 0
+        else None
+    )
+    import_w = (
+        open(f"{output_dir}/import.sh", mode="w", encoding="utf-8")
+        if config.import_mode == "script"
+        else None
+    )
+    executor = (
+        ProcessPoolExecutor(max_workers=config.render_jobs)
+        if render_executor is None and config.render_jobs > 1
+        else render_executor
+    )
+    fetch_executor = (
+        ThreadPoolExecutor(max_workers=config.fetch_jobs)
+        if config.fetch_jobs > 1
+        else None
+    )
+
+    # メトリクスのクエリ数・行数はトレースから集計するので、ファイルに出さなくても記録はする
+    tracer = (
+        QueryTracer(config.trace_path)
+        if config.trace_path is not None
+        or config.metrics_path is not None
+        or config.profile
+        else None
+    )
+    set_query_tracer(tracer)
+    metrics = (
+        ExportMetrics(labels={"account": environ.get("SNOWFLAKE_ACCOUNT", "")})
+        if config.metrics_path is not None
+        else None
+    )
+    if metrics is not None:
+        add_stage_observer(metrics)
+
+    errors = ErrorCollector(config.error_policy)
+    set_error_collector(errors)
+    profiler = MemoryProfiler() if config.profile else None
+    if profiler is not None:
+        profiler.start()
+    violations = ViolationReport() if config.validate else None
+    snapshot_w: Optional[TextIO] = None
+    try:
+        # 前回のスナップショットは、同じパスに今回の分を書き出す前に読んでおく
+        if not config.incremental:
+            previous = None
+        elif (
+            previous is None
+            and config.snapshot_path is not None
+            and os.path.exists(config.snapshot_path)
+        ):
+            [previous, previous_names] = read_snapshot(config.snapshot_path)
+        if previous_names is None:
+            previous_names = {}
+        result = ExportResult()
+        changes = result.changes
+        snapshot_w = (
+            open(config.snapshot_path, mode="w", encoding="utf-8")
+            if config.snapshot_path is not None
+            else None
+        )
+
+        # 差分を取るには全件が必要なので、incrementalではストリーミングしない
+        streamed = {
+            resource_type_name
+            for resource_type_name in resource_types
+            if config.streaming
+            and not config.is_sharded()
+            and previous is None
+            and not keep_resources
+            and can_stream(resource_type_name, config.fetch_options)
+        }
+        fetched = iter_fetched_resources(
+            conn,
+            [t for t in resource_types if t not in streamed],
+            config.fetch_options,
+            executor=fetch_executor,
+            jobs=config.fetch_jobs,
+        )
+        for resource_type_name in resource_types:
+            fetcher_name = get_fetcher(resource_type_name).__name__
+            if resource_type_name in streamed:
+                with fetcher_context(fetcher_name):
+                    n = stream_resource_type(
+                        config,
+                        conn,
+                        import_w,
+                        resource_type_name,
+                        state=state,
+                        snapshot_w=snapshot_w,
+                        violations=violations,
+                        executor=executor,
+                    )
+                result.counts[resource_type_name] = n
+                if metrics is not None:
+                    metrics.set_fetcher(resource_type_name, fetcher_name)
+                    metrics.observe_resources(resource_type_name, n)
+                continue
+
+            resources = next(fetched)
+            result.counts[resource_type_name] = len(resources)
+            if keep_resources:
+                result.resources[resource_type_name] = resources
+            if metrics is not None:
+                metrics.set_fetcher(resource_type_name, fetcher_name)
+                metrics.observe_resources(resource_type_name, len(resources))
+            if violations is not None:
+                with stage("validate", resource_type_name):
+                    validate_resources(resource_type_name, resources, violations)
+
+            # 前回からあるリソースは前回の名前で適用済みとみなし、名前を変えずimportもしない。
+            # 実際のtfstateにあるものはそちらを優先する
+            type_state = state
+            if previous is not None:
+                type_changes = diff_resources(
+                    resource_type_name, previous.get(resource_type_name, []), resources
+                )
+                changes.extend(type_changes)
+                type_state = to_previous_state(
+                    resource_type_name,
+                    resources,
+                    previous_names.get(resource_type_name, {}),
+                )
+                if state is not None:
+                    type_state.merge(state)
+
+            with stage("name", resource_type_name):
+                resource_names = get_resource_names(
+                    resource_type_name, resources, type_state
+                )
+            if snapshot_w is not None:
+                write_snapshot(
+                    snapshot_w, resource_type_name, resources, resource_names
+                )
+            if keep_resources:
+                result.resource_names[resource_type_name] = to_names_by_identity(
+                    resource_type_name, resources, resource_names
+                )
+            with stage("output", resource_type_name):
+                write_resource_type(
+                    config,
+                    import_w,
+                    resource_type_name,
+                    resource_names,
+                    resources,
+                    state=type_state,
+                    executor=executor,
+                )
+                if previous is not None:
+                    write_drift_resource_type(
+                        config,
+                        resource_type_name,
+                        resource_names,
+                        resources,
+                        type_changes,
+                    )
+
+        if tracer is not None and (config.trace_path is not None or config.profile):
+            tracer.resolve_server_timings(conn)
+    finally:
+        # 途中で失敗しても、プロセス全体の状態を次のエクスポート(デーモンの次の要求)に残さない
+        if fetch_executor is not None:
+            fetch_executor.shutdown()
+        if executor is not None and executor is not render_executor:
+            executor.shutdown()
+        if import_w is not None:
+            import_w.close()
+        if snapshot_w is not None:
+            snapshot_w.close()
+        if profiler is not None:
+            profiler.stop()
+        if metrics is not None:
+            remove_stage_observer(metrics)
+        if tracer is not None:
+            tracer.close()
+        set_query_tracer(None)
+        set_error_collector(None)
+
+    if previous is not None:
+        with open(f"{output_dir}/drift.jsonl", mode="w", encoding="utf-8") as w:
+            write_drift_report(w, changes)
+        write_drift_summary(changes)
+
+    result.errors = errors.errors
+    if violations is not None:
+        result.violation_count = violations.count()
+    if violations is not None and violations.count() > 0:
+        violations.write_report(
+            config.violation_report_path or f"{output_dir}/violations.jsonl"
+        )
+        violations.write_summary()
+
+    if len(errors.errors) > 0:
+        errors.write_report(config.error_report_path or f"{output_dir}/errors.jsonl")
+        errors.write_summary()
+
+    if profiler is not None:
+        profiler.report()
+
+    if metrics is not None:
+        metrics.observe_queries(tracer)
+        metrics.write(config.metrics_path)
+
+    if tracer is not None and (config.trace_path is not None or config.profile):
+        tracer.write_summary()
+
+    return result
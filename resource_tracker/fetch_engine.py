@@ -0,0 +1,297 @@
+import json
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .errors import capture_error
+from .interning import intern_list, to_object_column, to_values
+from .profiling import stage
+from .scope import ExportScope, to_scoped_select, to_scoped_shows
+from .types import SnowflakeResourceT, sort_merged_values
+
+# FetchOptions.sourceに指定できる値
+fetch_sources = ["show", "account_usage"]
+
+# 列全体(pandas.Series)を受け取り、同じ長さのSeriesを返す変換
+ColumnConversion = Callable[[pd.Series], pd.Series]
+
+
+@dataclass
+class FetcherSpec:
+    """SHOW/SELECTの結果からリソースを作るための宣言
+
+    columnsは 属性名 -> 列名、conversionsは 属性名 -> 列の変換、constantsは 属性名 -> 固定値。
+    merge_keyを指定すると、それ以外の属性が等しい行をまとめ、merge_keyの列をリストに集約する
+    (merge_resources_by_roles/merge_resources_by_usersと同じ結果になる)。
+    scope_columnsは ExportScopeの項目("database"/"schema"/"name"/"role") -> 列名。
+    show_levelはSHOWで取得するオブジェクトの名前が一意になる範囲("account"/"database"/"schema")。
+    "database"/"schema"のものは"in database ..."で実行できる。
+    paginateはSHOWがLIMIT ... FROMを受け付けるか。真のものだけFetchOptions.show_page_sizeでページに分ける。
+    """
+
+    resource_class: type
+    query: str
+    columns: Dict[str, str]
+    conversions: Dict[str, ColumnConversion] = field(default_factory=dict)
+    constants: Dict[str, Any] = field(default_factory=dict)
+    merge_key: Optional[str] = None
+    scope_columns: Dict[str, str] = field(default_factory=dict)
+    show_level: str = "account"
+    paginate: bool = False
+
+    def is_show(self) -> bool:
+        return self.query.lower().startswith("show ")
+
+
+@dataclass
+class FetchOptions:
+    """fetch_*関数に共通の設定"""
+
+    # Trueならロール・ユーザーの集約をSnowflake側のGROUP BY/ARRAY_AGGで行う
+    server_side_merge: bool = False
+    # エクスポートする範囲。SHOWのLIKE/IN DATABASEやWHERE句に変換する
+    scope: Optional[ExportScope] = None
+    # 設定するとSHOWをこの行数ごとのページに分けて実行し、上限での切り捨てを防ぐ
+    show_page_size: Optional[int] = None
+    # オブジェクトの取得元。"show": SHOW / "account_usage": account_usageのビューへのSELECT
+    source: str = "show"
+
+
+def to_object_series(values: list, index: pd.Index) -> pd.Series:
+    # np.arrayにリストを渡すと多次元配列になるので、object配列に1つずつ入れる
+    array = np.empty(len(values), dtype=object)
+    for [i, value] in enumerate(values):
+        array[i] = value
+    return pd.Series(array, index=index, dtype=object)
+
+
+def map_unique(f: Callable[[Any], Any]) -> ColumnConversion:
+    """値の種類が少ない列向けの変換。ユニークな値にだけfを適用して列全体に展開する
+
+    Noneはfを通さずNoneのままにする。
+    """
+
+    def convert(s: pd.Series) -> pd.Series:
+        [codes, uniques] = pd.factorize(s)
+        # 欠損値のコードは-1なので、末尾に置いたNoneを指す
+        converted = to_object_series(
+            [f(u) for u in uniques] + [None], pd.RangeIndex(len(uniques) + 1)
+        )
+        return pd.Series(converted.to_numpy()[codes], index=s.index, dtype=object)
+
+    return convert
+
+
+def split_or_none(sep: str = ",") -> ColumnConversion:
+    """区切り文字で分割してリストにする。空文字列とNoneはNoneにする"""
+
+    def convert(s: pd.Series) -> pd.Series:
+        return s.str.split(sep).where(s.notna() & (s != ""), None)
+
+    return convert
+
+
+def parse_array(value: Any) -> Optional[list]:
+    """ARRAY型の列の値(JSON文字列)をリストにする"""
+    if value is None or isinstance(value, list):
+        return value
+    return json.loads(value)
+
+
+def parse_array_column(s: pd.Series) -> pd.Series:
+    # ロール名などの要素は行ごとに別の文字列になるのでinternする
+    return to_object_series([intern_list(parse_array(value)) for value in s], s.index)
+
+
+def to_scoped_specs(spec: FetcherSpec, scope: ExportScope) -> List[FetcherSpec]:
+    """スコープの条件をクエリに押し込んだspecにする
+
+    SHOWはデータベースごとに複数のクエリに分かれることがあり、押し込めなかった条件は
+    結果をfilter_by_scopeで絞り込む必要がある。SELECTは条件をすべてWHERE句にする。
+    """
+    if spec.is_show():
+        queries = to_scoped_shows(
+            spec.query, scope, spec.scope_columns, spec.show_level != "account"
+        )
+    else:
+        queries = [to_scoped_select(spec.query, scope, spec.scope_columns)]
+    return [replace(spec, query=query) for query in queries]
+
+
+def to_aggregated_spec(spec: FetcherSpec) -> FetcherSpec:
+    """merge_keyの集約をSnowflake側で行うspecにする
+
+    merge_key以外の列でGROUP BYし、merge_keyの列をARRAY_AGGで1行にまとめる。
+    転送する行数がおよそ1オブジェクトあたりのロール数分の1になり、クライアント側のマージが不要になる。
+    """
+    if spec.merge_key is None:
+        return spec
+
+    merge_column = spec.columns[spec.merge_key]
+    key_columns = ", ".join(
+        column
+        for [field_name, column] in spec.columns.items()
+        if field_name != spec.merge_key
+    )
+    query = (
+        f"select {key_columns},"
+        f" array_agg({merge_column}) within group (order by {merge_column})"
+        f" as {merge_column}"
+        f" from ({spec.query}) group by {key_columns}"
+    )
+    return replace(
+        spec,
+        query=query,
+        conversions={**spec.conversions, spec.merge_key: parse_array_column},
+        merge_key=None,
+    )
+
+
+def to_ordered_spec(spec: FetcherSpec) -> FetcherSpec:
+    """merge_key以外の列でORDER BYしたspecにする
+
+    まとめる行が連続して届くので、結果を先頭から少しずつ読みながらマージできる(OrderedMerger)。
+    """
+    if spec.merge_key is None:
+        return spec
+    if spec.is_show():
+        raise ValueError(f"Cannot order the result of '{spec.query}'")
+
+    key_columns = ", ".join(
+        column
+        for [field_name, column] in spec.columns.items()
+        if field_name != spec.merge_key
+    )
+    return replace(spec, query=f"select * from ({spec.query}) order by {key_columns}")
+
+
+def convert_rowwise(
+    df: pd.DataFrame, conversion: ColumnConversion, source: pd.Series
+) -> Tuple[pd.Series, List[Any]]:
+    """列単位の変換が失敗したときに1行ずつ変換し、(変換後の列, 失敗した行のindex)を返す"""
+    values = []
+    failed = []
+    for [i, value] in source.items():
+        try:
+            values.append(conversion(pd.Series([value], dtype=object)).iloc[0])
+        except Exception as e:
+            capture_error("fetch", e, df.loc[i].to_dict())
+            values.append(None)
+            failed.append(i)
+    return (to_object_series(values, source.index), failed)
+
+
+def convert_columns(spec: FetcherSpec, df: pd.DataFrame) -> Dict[str, list]:
+    """specに従って列を変換し、属性名 -> 値のリストにする
+
+    変換に失敗した行はErrorCollectorの方針に従い、SKIPなら除外する。
+    """
+    converted: Dict[str, pd.Series] = {}
+    failed: List[Any] = []
+    for [field_name, column_name] in spec.columns.items():
+        source = df[column_name]
+        conversion = spec.conversions.get(field_name)
+        if conversion is None:
+            converted[field_name] = source
+            continue
+        # 変換は欠損値がNoneのobjectの列を前提にしている
+        source = to_object_column(source)
+        try:
+            converted[field_name] = conversion(source)
+        except Exception:
+            [converted[field_name], failed_rows] = convert_rowwise(
+                df, conversion, source
+            )
+            failed.extend(failed_rows)
+
+    index = df.index.drop(failed) if len(failed) > 0 else df.index
+    values = {
+        field_name: to_values(s.loc[index]) for [field_name, s] in converted.items()
+    }
+    for [field_name, value] in spec.constants.items():
+        values[field_name] = [value] * len(index)
+    return values
+
+
+def merge_columns(values: Dict[str, list], merge_key: str) -> Dict[str, list]:
+    """merge_key以外の値が等しい行をまとめる。グループの順序は出現順
+
+    まとめたリストはsort_merged_valuesで並べるので、to_aggregated_specの結果と同じになる。
+    """
+    key_names = [name for name in values if name != merge_key]
+    groups: Dict[tuple, list] = {}
+    for [key, merge_value] in zip(
+        zip(*[values[name] for name in key_names]), values[merge_key]
+    ):
+        groups.setdefault(key, []).append(merge_value)
+
+    merged = {name: [key[i] for key in groups] for [i, name] in enumerate(key_names)}
+    merged[merge_key] = [sort_merged_values(v) for v in groups.values()]
+    return merged
+
+
+class OrderedMerger:
+    """merge_key以外の値の順に並んだ行を、少しずつ受け取りながらマージする
+
+    連続する同じキーの行を1つにまとめる。最後のグループは次の行で同じキーが続くかもしれないので、
+    pushでは返さずに持ち越し、flushで返す。
+    """
+
+    def __init__(self, merge_key: str):
+        self.merge_key = merge_key
+        self.key_names: Optional[List[str]] = None
+        self.key: Optional[tuple] = None
+        self.merged: Optional[list] = None
+
+    def push(self, values: Dict[str, list]) -> Dict[str, list]:
+        """行を受け取り、確定したグループをmerge_columnsと同じ形で返す"""
+        if self.key_names is None:
+            self.key_names = [name for name in values if name != self.merge_key]
+        keys: List[tuple] = []
+        merged_values: List[list] = []
+        for [key, merge_value] in zip(
+            zip(*[values[name] for name in self.key_names]), values[self.merge_key]
+        ):
+            if self.merged is not None and key == self.key:
+                self.merged.append(merge_value)
+                continue
+            if self.merged is not None:
+                keys.append(self.key)
+                merged_values.append(self.merged)
+            self.key = key
+            self.merged = [merge_value]
+        return self.to_columns(keys, merged_values)
+
+    def flush(self) -> Dict[str, list]:
+        """持ち越したグループを返す"""
+        if self.merged is None:
+            return self.to_columns([], [])
+        [keys, merged_values] = [[self.key], [self.merged]]
+        self.key = None
+        self.merged = None
+        return self.to_columns(keys, merged_values)
+
+    def to_columns(
+        self, keys: List[tuple], merged_values: List[list]
+    ) -> Dict[str, list]:
+        columns = {
+            name: [key[i] for key in keys]
+            for [i, name] in enumerate(self.key_names or [])
+        }
+        columns[self.merge_key] = [sort_merged_values(v) for v in merged_values]
+        return columns
+
+
+def to_resources(resource_class: type, values: Dict[str, list]) -> List[Any]:
+    """属性名 -> 値のリスト からリソースのリストを作る"""
+    names = list(values)
+    return [resource_class(**dict(zip(names, row))) for row in zip(*values.values())]
+
+
+def build_resources(spec: FetcherSpec, df: pd.DataFrame) -> List[SnowflakeResourceT]:
+    """DataFrameからspecに従ってリソースをまとめて作る"""
+    values = convert_columns(spec, df)
+    if spec.merge_key is not None:
+        with stage("merge"):
+            values = merge_columns(values, spec.merge_key)
+    return to_resources(spec.resource_class, values)
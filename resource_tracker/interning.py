@@ -0,0 +1,68 @@
+import sys
+import numpy as np
+import pandas as pd
+from typing import Any, Optional
+
+# ユニークな値の数が行数のこの割合以下の列をcategoricalにする
+category_max_ratio = 0.5
+# これより行数の少ない列はcategoricalにしない(DESCの結果などでは効果がない)
+category_min_rows = 1000
+
+
+def intern_value(value: Any) -> Any:
+    """文字列ならsys.internした同じ値のオブジェクトを返す"""
+    return sys.intern(value) if type(value) is str else value
+
+
+def intern_list(values: Optional[list]) -> Optional[list]:
+    """リストの要素の文字列をinternする"""
+    if values is None:
+        return None
+    return [intern_value(value) for value in values]
+
+
+def intern_column(s: pd.Series, max_ratio: Optional[float] = None) -> pd.Series:
+    """列の中の等しい文字列を1つのオブジェクトにまとめ、sys.internで他の列・クエリとも共有する
+
+    max_ratioを指定すると、ユニークな値が行数のmax_ratio以下の列はcategoricalにする。
+    ユニークな値にだけinternを適用するので、列全体を1回ハッシュするだけで済む。
+    """
+    if s.dtype != object:
+        return s
+    [codes, uniques] = pd.factorize(s)
+    uniques = [intern_value(u) for u in uniques]
+    if (
+        max_ratio is not None
+        and len(s) >= category_min_rows
+        and len(uniques) <= len(s) * max_ratio
+    ):
+        categorical = pd.Categorical.from_codes(codes, categories=uniques)
+        return pd.Series(categorical, index=s.index, name=s.name)
+    # 欠損値のコードは-1なので、末尾に置いたNoneを指す
+    values = np.empty(len(uniques) + 1, dtype=object)
+    values[: len(uniques)] = uniques
+    return pd.Series(values[codes], index=s.index, name=s.name, dtype=object)
+
+
+def intern_frame(df: pd.DataFrame, max_ratio: Optional[float] = None) -> pd.DataFrame:
+    """DataFrameのすべての列にintern_columnを適用する"""
+    df = df.copy(deep=False)
+    for i in range(len(df.columns)):
+        df.isetitem(i, intern_column(df.iloc[:, i], max_ratio))
+    return df
+
+
+def to_object_column(s: pd.Series) -> pd.Series:
+    """categoricalの列を、欠損値がNoneのobjectの列に戻す"""
+    if not isinstance(s.dtype, pd.CategoricalDtype):
+        return s
+    values = np.empty(len(s.cat.categories) + 1, dtype=object)
+    values[:-1] = s.cat.categories.to_numpy(dtype=object)
+    return pd.Series(
+        values[s.cat.codes.to_numpy()], index=s.index, name=s.name, dtype=object
+    )
+
+
+def to_values(s: pd.Series) -> list:
+    """列の値のリスト。categoricalの欠損値(nan)はNoneにする"""
+    return to_object_column(s).tolist()
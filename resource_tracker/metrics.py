@@ -0,0 +1,116 @@
+import os
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from .profiling import StageObserver
+from .trace import QueryTracer
+
+metric_prefix = "resource_tracker_export"
+metric_helps = {
+    "rows_fetched": "Rows returned by the queries issued by the fetcher",
+    "resources": "Resources after merge",
+    "queries": "Queries issued by the fetcher",
+    "bytes_written": "Bytes of Terraform code written",
+    "stage_duration_seconds": "Wall time spent in each stage (fetch includes merge)",
+    "run_duration_seconds": "Wall time of the whole export run",
+    "last_run_timestamp_seconds": "Unix time when the export run finished",
+}
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if len(labels) == 0:
+        return ""
+    items = ",".join(f'{k}="{escape_label_value(v)}"' for [k, v] in labels.items())
+    return "{" + items + "}"
+
+
+class ExportMetrics(StageObserver):
+    """1回のエクスポートの件数・時間をリソース種別とfetcherごとに集計し、OpenMetrics形式で書き出す
+
+    node_exporterのtextfile collectorなどで読み込まれることを想定している。
+    """
+
+    def __init__(self, labels: Optional[Dict[str, str]] = None):
+        self.labels = labels if labels is not None else {}
+        self.started_at = time.time()
+        self.fetchers: Dict[str, str] = {}
+        self.values: Dict[str, Dict[Tuple[str, ...], float]] = defaultdict(
+            lambda: defaultdict(float)
+        )
+
+    def set_fetcher(self, resource_type_name: str, fetcher_name: str) -> None:
+        self.fetchers[resource_type_name] = fetcher_name
+
+    def exit(
+        self, stage_name: str, resource_type_name: Optional[str], seconds: float
+    ) -> None:
+        if resource_type_name is not None:
+            self.values["stage_duration_seconds"][
+                (resource_type_name, stage_name)
+            ] += seconds
+
+    def count(
+        self, counter_name: str, resource_type_name: Optional[str], value: int
+    ) -> None:
+        if resource_type_name is not None:
+            self.values[counter_name][(resource_type_name,)] += value
+
+    def observe_resources(self, resource_type_name: str, n: int) -> None:
+        self.values["resources"][(resource_type_name,)] = n
+
+    def observe_queries(self, tracer: QueryTracer) -> None:
+        """トレースからfetcherごとのクエリ数と行数を集計する"""
+        resource_types = {
+            fetcher_name: resource_type_name
+            for [resource_type_name, fetcher_name] in self.fetchers.items()
+        }
+        for trace in tracer.traces:
+            resource_type_name = resource_types.get(trace.fetcher)
+            if resource_type_name is None:
+                continue
+            self.values["queries"][(resource_type_name,)] += 1
+            self.values["rows_fetched"][(resource_type_name,)] += trace.row_count
+
+    def get_labels(self, resource_type_name: str, *rest: Tuple[str, str]) -> str:
+        labels = {
+            **self.labels,
+            "resource_type": resource_type_name,
+            "fetcher": self.fetchers.get(resource_type_name, ""),
+            **dict(rest),
+        }
+        return format_labels(labels)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for [name, samples] in self.values.items():
+            metric_name = f"{metric_prefix}_{name}"
+            lines.append(f"# TYPE {metric_name} gauge")
+            if name in metric_helps:
+                lines.append(f"# HELP {metric_name} {metric_helps[name]}")
+            for [key, value] in samples.items():
+                extra = [("stage", key[1])] if len(key) > 1 else []
+                lines.append(f"{metric_name}{self.get_labels(key[0], *extra)} {value}")
+
+        finished_at = time.time()
+        for [name, value] in [
+            ("run_duration_seconds", finished_at - self.started_at),
+            ("last_run_timestamp_seconds", finished_at),
+        ]:
+            metric_name = f"{metric_prefix}_{name}"
+            lines.append(f"# TYPE {metric_name} gauge")
+            lines.append(f"# HELP {metric_name} {metric_helps[name]}")
+            lines.append(f"{metric_name}{format_labels(self.labels)} {value}")
+
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """収集途中のファイルを読まれないよう、一時ファイルに書いてから置き換える"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, mode="w", encoding="utf-8") as w:
+            w.write(self.render())
+        os.replace(tmp_path, path)
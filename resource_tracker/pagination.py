@@ -0,0 +1,104 @@
+from typing import Callable, Iterator, Optional, Tuple
+import pandas as pd
+from .scope import quote_string, to_identifier
+
+# SHOWが1回で返す行数の上限
+show_row_limit = 10000
+# オブジェクトの名前が一意になる範囲の階層。アカウント > データベース > スキーマ
+show_levels = ["account", "database", "schema"]
+
+Execute = Callable[[str], pd.DataFrame]
+
+
+def split_show_query(query: str) -> Tuple[str, str]:
+    """ "show stages in database DB" -> ("show stages", "database DB")"""
+    [prefix, container] = query.rsplit(" in ", 1)
+    return (prefix, container)
+
+
+def get_container_level(container: str) -> str:
+    return container.split(" ", 1)[0].lower()
+
+
+def paginate_show(
+    execute: Execute,
+    prefix: str,
+    container: str,
+    page_size: int,
+    first_page: Optional[pd.DataFrame] = None,
+) -> Iterator[pd.DataFrame]:
+    """名前が一意になる範囲のSHOWを LIMIT ... FROM '<前のページの最後の名前>' で1ページずつ返す
+
+    FROMの位置の行が次のページにも含まれる場合に備えて、前のページの最後の名前の行は除く。
+    """
+    last_name = None
+    page = first_page
+    while True:
+        if page is None:
+            sql = f"{prefix} in {container} limit {page_size}"
+            if last_name is not None:
+                sql += f" from {quote_string(last_name)}"
+            page = execute(sql)
+
+        n = len(page)
+        if last_name is not None:
+            page = page[page["name"] != last_name]
+            if len(page) == 0:
+                return
+        yield page
+        if n < page_size:
+            return
+        last_name = page["name"].iloc[-1]
+        page = None
+
+
+def iter_child_containers(
+    execute: Execute, container: str, page_size: int
+) -> Iterator[str]:
+    """containerの1つ下の階層(アカウントならデータベース、データベースならスキーマ)"""
+    level = get_container_level(container)
+    if level == "account":
+        for page in iter_show_pages(
+            execute, "show databases", "account", "account", page_size
+        ):
+            for name in page["name"]:
+                yield f"database {to_identifier(name)}"
+    elif level == "database":
+        for page in iter_show_pages(
+            execute, "show schemas", container, "database", page_size
+        ):
+            for [database_name, name] in zip(page["database_name"], page["name"]):
+                yield f"schema {to_identifier(database_name)}.{to_identifier(name)}"
+    else:
+        raise ValueError(f"Cannot fan out SHOW in {container}")
+
+
+def iter_show_pages(
+    execute: Execute,
+    prefix: str,
+    container: str,
+    object_level: str,
+    page_size: int = show_row_limit,
+) -> Iterator[pd.DataFrame]:
+    """SHOWの結果を上限で切り捨てられないように、ページに分けて返す
+
+    まず上限付きで1回実行し、上限に達しなければそれで終わる。
+    達した場合、名前がその範囲で一意になるならLIMIT/FROMでページを進め、
+    そうでなければ1つ下の階層(データベース・スキーマ)ごとのSHOWに分けて同じことを繰り返す。
+    object_levelはオブジェクトの名前が一意になる範囲("account"/"database"/"schema")。
+    """
+    if page_size < 2:
+        # FROMの位置の行が次のページに含まれる場合、1行ずつでは先に進めない
+        raise ValueError(f"page_size must be at least 2: {page_size}")
+    first_page = execute(f"{prefix} in {container} limit {page_size}")
+    if len(first_page) < page_size:
+        yield first_page
+        return
+
+    container_level = get_container_level(container)
+    if show_levels.index(container_level) >= show_levels.index(object_level):
+        yield from paginate_show(execute, prefix, container, page_size, first_page)
+        return
+
+    for child in iter_child_containers(execute, container, page_size):
+        yield from iter_show_pages(execute, prefix, child, object_level, page_size)
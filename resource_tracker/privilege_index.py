@@ -0,0 +1,133 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from .role_graph import RoleGraph, iter_bits
+
+# grantのリソース種別 -> (対象のオブジェクト種別, 対象を指す属性名(データベース・スキーマ・オブジェクトの順))
+grant_object_attr_names_map = {
+    "database_grant": ("database", ["database_name"]),
+    "schema_grant": ("schema", ["database_name", "schema_name"]),
+    "table_grant": ("table", ["database_name", "schema_name", "table_name"]),
+    "view_grant": ("view", ["database_name", "schema_name", "view_name"]),
+    "materialized_view_grant": (
+        "materialized_view",
+        ["database_name", "schema_name", "materialized_view_name"],
+    ),
+    "external_table_grant": (
+        "external_table",
+        ["database_name", "schema_name", "external_table_name"],
+    ),
+    "stage_grant": ("stage", ["database_name", "schema_name", "stage_name"]),
+    "stream_grant": ("stream", ["database_name", "schema_name", "stream_name"]),
+    "pipe_grant": ("pipe", ["database_name", "schema_name", "pipe_name"]),
+    "sequence_grant": ("sequence", ["database_name", "schema_name", "sequence_name"]),
+    "task_grant": ("task", ["database_name", "schema_name", "task_name"]),
+    "file_format_grant": (
+        "file_format",
+        ["database_name", "schema_name", "file_format_name"],
+    ),
+    "warehouse_grant": ("warehouse", ["warehouse_name"]),
+    "integration_grant": ("integration", ["integration_name"]),
+    "resource_monitor_grant": ("resource_monitor", ["monitor_name"]),
+    "user_grant": ("user", ["user_name"]),
+}
+
+# (オブジェクト種別, データベース・スキーマ・オブジェクト名, 権限, 範囲)
+# 範囲は "object": 個別のオブジェクト / "all": 既存の全オブジェクト / "future": 将来のオブジェクト
+IndexKey = Tuple[str, Tuple[Optional[str], ...], str, str]
+
+
+def parse_object_name(object_name: str) -> Tuple[str, ...]:
+    """ "DB.SCHEMA.TABLE" -> ("DB", "SCHEMA", "TABLE")"""
+    return tuple(object_name.split("."))
+
+
+class PrivilegeIndex:
+    """(オブジェクト種別, オブジェクト, 権限) -> 権限を持つロール の転置インデックス
+
+    値はロールに振った連番のビット集合(int)。
+    on_all/on_futureのgrantはスキーマ(またはデータベース)単位のキーに入れ、
+    検索時にオブジェクト自身・スキーマ・データベースのキーをまとめて引く。
+    """
+
+    def __init__(self):
+        self.role_ids: Dict[str, int] = {}
+        self.role_names: List[str] = []
+        self.index: Dict[IndexKey, int] = {}
+
+    @staticmethod
+    def from_resources(resources_by_type: Dict[str, Iterable]) -> "PrivilegeIndex":
+        """リソース種別 -> grantのリスト からインデックスを作る"""
+        index = PrivilegeIndex()
+        for [resource_type_name, resources] in resources_by_type.items():
+            if resource_type_name in grant_object_attr_names_map:
+                index.add_grants(resource_type_name, resources)
+        return index
+
+    def get_role_id(self, role_name: str) -> int:
+        role = self.role_ids.get(role_name)
+        if role is None:
+            role = len(self.role_names)
+            self.role_ids[role_name] = role
+            self.role_names.append(role_name)
+        return role
+
+    def add_grants(self, resource_type_name: str, resources: Iterable) -> None:
+        [object_type, attr_names] = grant_object_attr_names_map[resource_type_name]
+        depth = len(attr_names)
+        for resource in resources:
+            if not resource.roles:
+                continue
+            path = tuple(getattr(resource, attr_name) for attr_name in attr_names)
+            if getattr(resource, "on_future", None):
+                scope = "future"
+            elif getattr(resource, "on_all", None):
+                scope = "all"
+            else:
+                scope = "object"
+            if scope != "object":
+                # on_all/on_futureはオブジェクト名を持たない。スキーマ名も無ければデータベース単位
+                path = path[: depth - 1]
+                if len(path) > 0 and path[-1] is None:
+                    path = path[:-1]
+            key = (object_type, path, resource.privilege, scope)
+
+            bits = self.index.get(key, 0)
+            for role_name in resource.roles:
+                bits |= 1 << self.get_role_id(role_name)
+            self.index[key] = bits
+
+    def get_role_bits(
+        self,
+        object_type: str,
+        object_name: str,
+        privilege: str,
+        include_future: bool = True,
+    ) -> int:
+        path = parse_object_name(object_name)
+        bits = self.index.get((object_type, path, privilege, "object"), 0)
+        # 親のスキーマ・データベースに対するon_all/on_futureのgrant
+        for depth in range(len(path) - 1, 0, -1):
+            parent = path[:depth]
+            bits |= self.index.get((object_type, parent, privilege, "all"), 0)
+            if include_future:
+                bits |= self.index.get((object_type, parent, privilege, "future"), 0)
+        return bits
+
+    def get_roles(
+        self,
+        object_type: str,
+        object_name: str,
+        privilege: str,
+        include_future: bool = True,
+        role_graph: Optional[RoleGraph] = None,
+    ) -> List[str]:
+        """オブジェクト(例: table, "DB.SCHEMA.TABLE")に対して権限を持つロール
+
+        role_graphを与えた場合は、それらのロールを継承するロールも含める。
+        on_all/on_futureのgrantは、そのオブジェクトが対象に含まれるものとして数える。
+        """
+        bits = self.get_role_bits(object_type, object_name, privilege, include_future)
+        roles = {self.role_names[i] for i in iter_bits(bits)}
+        if role_graph is not None:
+            for role_name in list(roles):
+                roles.update(role_graph.get_inheritors(role_name))
+        return sorted(roles)
@@ -0,0 +1,261 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+# 処理中のリソース種別。stage(..., resource_type_name)で設定され、入れ子のstageに引き継がれる
+current_resource_type: ContextVar[Optional[str]] = ContextVar(
+    "current_resource_type", default=None
+)
+
+
+class StageObserver:
+    """stage()の開始・終了を受け取るもの"""
+
+    def enter(self, stage_name: str, resource_type_name: Optional[str]) -> None:
+        pass
+
+    def exit(
+        self, stage_name: str, resource_type_name: Optional[str], seconds: float
+    ) -> None:
+        pass
+
+    def count(
+        self, counter_name: str, resource_type_name: Optional[str], value: int
+    ) -> None:
+        pass
+
+
+stage_observers: List[StageObserver] = []
+
+
+def has_stage_observers() -> bool:
+    """観測用の値の計算自体が重い場合に、事前に確認するために使う"""
+    return len(stage_observers) > 0
+
+
+def observe_count(counter_name: str, value: int) -> None:
+    """書き出したバイト数などの量をobserverに通知する"""
+    typ = current_resource_type.get()
+    for observer in stage_observers:
+        observer.count(counter_name, typ, value)
+
+
+def add_stage_observer(observer: StageObserver) -> None:
+    stage_observers.append(observer)
+
+
+def remove_stage_observer(observer: StageObserver) -> None:
+    stage_observers.remove(observer)
+
+
+@contextmanager
+def stage(stage_name: str, resource_type_name: Optional[str] = None) -> Iterator[None]:
+    """fetch/merge/render/writeなどの処理段階を囲む。observerが無ければほぼ何もしない"""
+    token = (
+        current_resource_type.set(resource_type_name)
+        if resource_type_name is not None
+        else None
+    )
+    try:
+        if len(stage_observers) == 0:
+            yield
+            return
+
+        typ = current_resource_type.get()
+        for observer in stage_observers:
+            observer.enter(stage_name, typ)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            for observer in reversed(stage_observers):
+                observer.exit(stage_name, typ, seconds)
+    finally:
+        if token is not None:
+            current_resource_type.reset(token)
+
+
+def get_rss_bytes() -> int:
+    """現在のRSS。/procが無い環境ではプロセス開始以来の最大RSSで代用する"""
+    try:
+        with open("/proc/self/statm") as r:
+            return int(r.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+snapshot_filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+
+
+@dataclass
+class StageMemoryStats:
+    calls: int = 0
+    seconds: float = 0.0
+    peak_bytes: int = 0
+    retained_bytes: int = 0
+    peak_rss_bytes: int = 0
+    # (ファイル名:行番号) -> 増加したバイト数
+    top_sites: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class StageFrame:
+    stage_name: str
+    resource_type_name: Optional[str]
+    start_bytes: int
+    peak_bytes: int
+    peak_rss_bytes: int
+    snapshot: Optional[tracemalloc.Snapshot] = None
+
+
+class MemoryProfiler(StageObserver):
+    """stageごと・リソース種別ごとのピークメモリと残存メモリを集計する
+
+    tracemallocのピークは入れ子のstageごとに区切って測る(親のピークには子のピークも含む)。
+    最上位のstage(mainから呼ぶfetch/name/outputなど)では
+    開始時と終了時のスナップショットを比較して、メモリを増やした箇所の上位top_n件も記録する。
+    RSSはrss_interval秒ごとに別スレッドでサンプリングする。
+    stageの入れ子はスレッドごとに持ち、スナップショットはstart()を呼んだスレッドでだけ取る。
+    tracemallocのピークはプロセス全体の値なので、並列にfetchする場合の値は参考程度。
+    """
+
+    def __init__(self, top_n: int = 10, rss_interval: float = 0.05, frames: int = 1):
+        self.top_n = top_n
+        self.rss_interval = rss_interval
+        self.frames = frames
+        self.stats: Dict[Tuple[Optional[str], str], StageMemoryStats] = {}
+        self._local = threading.local()
+        self._owner: Optional[int] = None
+        self._rss_max = 0
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    @property
+    def _stack(self) -> List[StageFrame]:
+        """このスレッドで開いているstage"""
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def start(self) -> None:
+        self._owner = threading.get_ident()
+        tracemalloc.start(self.frames)
+        self._rss_max = get_rss_bytes()
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample_rss, daemon=True)
+        self._sampler.start()
+        add_stage_observer(self)
+
+    def stop(self) -> None:
+        remove_stage_observer(self)
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        tracemalloc.stop()
+
+    def _sample_rss(self) -> None:
+        while not self._stop.wait(self.rss_interval):
+            self._rss_max = max(self._rss_max, get_rss_bytes())
+
+    def _take_peaks(self) -> Tuple[int, int, int]:
+        """(現在のメモリ, 前回からのピーク, 前回からのRSSピーク)を返し、ピークをリセットする"""
+        [current, peak] = tracemalloc.get_traced_memory()
+        rss = get_rss_bytes()
+        rss_peak = max(self._rss_max, rss)
+        tracemalloc.reset_peak()
+        self._rss_max = rss
+        return (current, peak, rss_peak)
+
+    def enter(self, stage_name: str, resource_type_name: Optional[str]) -> None:
+        # スナップショット自体の確保を計測に含めないよう、先に取ってから基準値を読む
+        # fetchのワーカースレッドでは取らない(取得ごとにスナップショットを取ることになる)
+        is_top = (
+            len(self._stack) == 0
+            and self.top_n > 0
+            and threading.get_ident() == self._owner
+        )
+        snapshot = tracemalloc.take_snapshot() if is_top else None
+
+        [current, peak, rss_peak] = self._take_peaks()
+        if len(self._stack) > 0:
+            parent = self._stack[-1]
+            parent.peak_bytes = max(parent.peak_bytes, peak)
+            parent.peak_rss_bytes = max(parent.peak_rss_bytes, rss_peak)
+
+        self._stack.append(
+            StageFrame(
+                stage_name=stage_name,
+                resource_type_name=resource_type_name,
+                start_bytes=current,
+                peak_bytes=current,
+                peak_rss_bytes=rss_peak,
+                snapshot=snapshot,
+            )
+        )
+
+    def exit(
+        self, stage_name: str, resource_type_name: Optional[str], seconds: float
+    ) -> None:
+        [current, peak, rss_peak] = self._take_peaks()
+        frame = self._stack.pop()
+        frame.peak_bytes = max(frame.peak_bytes, peak)
+        frame.peak_rss_bytes = max(frame.peak_rss_bytes, rss_peak)
+        if len(self._stack) > 0:
+            parent = self._stack[-1]
+            parent.peak_bytes = max(parent.peak_bytes, frame.peak_bytes)
+            parent.peak_rss_bytes = max(parent.peak_rss_bytes, frame.peak_rss_bytes)
+
+        stats = self.stats.setdefault(
+            (resource_type_name, stage_name), StageMemoryStats()
+        )
+        stats.calls += 1
+        stats.seconds += seconds
+        stats.peak_bytes = max(stats.peak_bytes, frame.peak_bytes - frame.start_bytes)
+        stats.retained_bytes += current - frame.start_bytes
+        stats.peak_rss_bytes = max(stats.peak_rss_bytes, frame.peak_rss_bytes)
+
+        if frame.snapshot is not None:
+            diffs = (
+                tracemalloc.take_snapshot()
+                .filter_traces(snapshot_filters)
+                .compare_to(frame.snapshot.filter_traces(snapshot_filters), "lineno")
+            )
+            for diff in diffs[: self.top_n]:
+                site = str(diff.traceback[0])
+                stats.top_sites[site] = stats.top_sites.get(site, 0) + diff.size_diff
+            # スナップショットの比較で確保したメモリを次のstageのピークに含めない
+            tracemalloc.reset_peak()
+
+    def report(self, file: TextIO = sys.stderr) -> None:
+        mib = 1024 * 1024
+        print(
+            f"{'resource type':<28} {'stage':<10} {'calls':>7} {'seconds':>9}"
+            f" {'peak MiB':>9} {'kept MiB':>9} {'RSS MiB':>9}",
+            file=file,
+        )
+        for [[typ, stage_name], stats] in self.stats.items():
+            print(
+                f"{typ or '-':<28} {stage_name:<10} {stats.calls:>7}"
+                f" {stats.seconds:>9.2f} {stats.peak_bytes / mib:>9.1f}"
+                f" {stats.retained_bytes / mib:>9.1f} {stats.peak_rss_bytes / mib:>9.1f}",
+                file=file,
+            )
+
+        for [[typ, stage_name], stats] in self.stats.items():
+            if len(stats.top_sites) == 0:
+                continue
+            print(f"\ntop allocation sites: {typ or '-'} / {stage_name}", file=file)
+            sites = sorted(stats.top_sites.items(), key=lambda kv: kv[1], reverse=True)
+            for [site, size] in sites[: self.top_n]:
+                print(f"  {size / mib:>9.1f} MiB  {site}", file=file)
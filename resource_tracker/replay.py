@@ -0,0 +1,204 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Union
+from uuid import uuid4
+
+
+@dataclass
+class ReplayColumn:
+    """cursor.descriptionの要素(ResultMetadata)の代わり。nameだけを持つ"""
+
+    name: str
+
+
+@dataclass
+class QueryRecording:
+    """1つのSQLの実行結果"""
+
+    sql: str
+    columns: List[str]
+    rows: List[List[Any]] = field(default_factory=list)
+
+
+class ReplayMissError(LookupError):
+    """記録に無いSQLが実行された"""
+
+
+def normalize_sql(sql: str) -> str:
+    """空白の違いを無視してSQLを照合するための正規化"""
+    return " ".join(sql.split())
+
+
+def load_recordings(path: str) -> List[QueryRecording]:
+    with open(path, encoding="utf-8") as r:
+        return [QueryRecording(**json.loads(line)) for line in r if line.strip() != ""]
+
+
+class RecordingCursor:
+    """SnowflakeCursorをラップし、実行したSQLと結果をRecordingConnectionに記録する"""
+
+    def __init__(self, cursor, connection: "RecordingConnection"):
+        self._cursor = cursor
+        self._connection = connection
+        self._sql: Optional[str] = None
+        self._rows: List[Any] = []
+
+    def execute(self, sql: str, *args, **kwargs):
+        # 読み終えずに次のSQLを実行した場合も、そこまでの結果を記録する
+        self._flush()
+        self._cursor.execute(sql, *args, **kwargs)
+        self._sql = sql
+        self._rows = []
+        return self
+
+    def fetchall(self) -> List[Any]:
+        rows = self._cursor.fetchall()
+        self._rows.extend(rows)
+        self._flush()
+        return rows
+
+    def fetchmany(self, size: Optional[int] = None) -> List[Any]:
+        rows = self._cursor.fetchmany(size)
+        self._rows.extend(rows)
+        if len(rows) == 0:
+            self._flush()
+        return rows
+
+    def close(self) -> None:
+        # 途中までしか読まなかった結果は、読んだ行だけを記録する
+        self._flush()
+        self._cursor.close()
+
+    def _flush(self) -> None:
+        if self._sql is None:
+            return
+        columns = [d.name for d in self._cursor.description]
+        self._connection.record(QueryRecording(self._sql, columns, self._rows))
+        self._sql = None
+        self._rows = []
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+
+class RecordingConnection:
+    """SnowflakeConnectionをラップし、全クエリの結果をJSON Linesファイルに記録する
+
+    ファイルは接続ごとに上書きする。追記すると以前の実行の記録が残り、リプレイで古い結果が返るため。
+    """
+
+    def __init__(self, conn, path: str):
+        self._conn = conn
+        self._lock = threading.Lock()
+        self._w = open(path, mode="w", encoding="utf-8")
+
+    def cursor(self, *args, **kwargs) -> RecordingCursor:
+        return RecordingCursor(self._conn.cursor(*args, **kwargs), self)
+
+    def record(self, recording: QueryRecording) -> None:
+        # Decimalやdatetimeはstrにする。pd_executeはdtype=strで読むので結果は変わらない
+        line = json.dumps(
+            {
+                "sql": recording.sql,
+                "columns": recording.columns,
+                "rows": [list(row) for row in recording.rows],
+            },
+            ensure_ascii=False,
+            default=str,
+        )
+        with self._lock:
+            self._w.write(line + "\n")
+            self._w.flush()
+
+    def close(self) -> None:
+        self._w.close()
+        self._conn.close()
+
+    def __getattr__(self, name: str):
+        return getattr(self._conn, name)
+
+
+class ReplayCursor:
+    """記録済みの結果を返すSnowflakeCursorの代わり"""
+
+    def __init__(self, connection: "ReplayConnection"):
+        self._connection = connection
+        self._rows: List[Any] = []
+        self._position = 0
+        self.description: Optional[List[ReplayColumn]] = None
+        self.sfqid: Optional[str] = None
+        self.rowcount: Optional[int] = None
+
+    def execute(self, sql: str, *args, **kwargs):
+        recording = self._connection.lookup(sql)
+        self._connection.wait(self._connection.latency)
+        self.description = [ReplayColumn(name) for name in recording.columns]
+        self.sfqid = str(uuid4())
+        self.rowcount = len(recording.rows)
+        self._rows = recording.rows
+        self._position = 0
+        return self
+
+    def fetchmany(self, size: Optional[int] = None) -> List[Any]:
+        size = size if size is not None else 1
+        rows = self._rows[self._position : self._position + size]
+        self._position += len(rows)
+        self._connection.wait(self._connection.row_latency * len(rows))
+        return [tuple(row) for row in rows]
+
+    def fetchall(self) -> List[Any]:
+        return self.fetchmany(len(self._rows) - self._position)
+
+    def fetchone(self) -> Optional[tuple]:
+        rows = self.fetchmany(1)
+        return rows[0] if len(rows) > 0 else None
+
+    def close(self) -> None:
+        pass
+
+
+class ReplayConnection:
+    """RecordingConnectionが記録した結果を返すSnowflakeConnectionの代わり
+
+    latencyはクエリごと、row_latencyは1行ごとに挿入する待ち時間(秒)。
+    同じSQLが複数回記録されている場合は記録順に返し、最後のものを繰り返す。
+    """
+
+    def __init__(
+        self,
+        recordings: Union[str, List[QueryRecording]],
+        latency: float = 0.0,
+        row_latency: float = 0.0,
+    ):
+        if isinstance(recordings, str):
+            recordings = load_recordings(recordings)
+        self.latency = latency
+        self.row_latency = row_latency
+        self._recordings: Dict[str, List[QueryRecording]] = defaultdict(list)
+        self._served: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        for recording in recordings:
+            self._recordings[normalize_sql(recording.sql)].append(recording)
+
+    def lookup(self, sql: str) -> QueryRecording:
+        key = normalize_sql(sql)
+        recordings = self._recordings.get(key)
+        if recordings is None:
+            raise ReplayMissError(f"No recording for SQL: {sql}")
+        with self._lock:
+            i = min(self._served[key], len(recordings) - 1)
+            self._served[key] += 1
+        return recordings[i]
+
+    def wait(self, seconds: float) -> None:
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def cursor(self, *args, **kwargs) -> ReplayCursor:
+        return ReplayCursor(self)
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,257 @@
+from typing import Dict, Iterable, Iterator, List
+from .types import SnowflakeRoleGrants
+
+
+def iter_bits(bits: int) -> Iterator[int]:
+    """立っているビットの位置を下位から順に返す"""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class RoleGraph:
+    """ロールの継承関係を表すグラフ
+
+    ロールAをロールBに付与すると、BはAの権限を継承する(A -> Bの辺)。
+    ロールとユーザーに連番を振り、各ロールについて
+    「そのロールを継承するロール」と「そのロールが継承するロール」をPythonのintのビット集合で持つ。
+    推移閉包は強連結成分ごとにまとめて計算するので、循環があっても止まらない(get_cyclesで確認できる)。
+    辺の追加は差分で閉包を更新し、削除した場合は次の問い合わせ時に作り直す。
+    """
+
+    def __init__(self):
+        self.role_ids: Dict[str, int] = {}
+        self.role_names: List[str] = []
+        self.user_ids: Dict[str, int] = {}
+        self.user_names: List[str] = []
+        # ロール -> 直接付与されたロール / ユーザー
+        self.granted_to: List[int] = []
+        self.granted_users: List[int] = []
+        # ユーザー -> 直接付与されたロール
+        self.user_roles: List[int] = []
+        # 推移閉包。inheritors[a]: aを継承するロール / inherited[b]: bが継承するロール
+        self.inheritors: List[int] = []
+        self.inherited: List[int] = []
+        self._dirty = False
+
+    @staticmethod
+    def from_role_grants(resources: Iterable[SnowflakeRoleGrants]) -> "RoleGraph":
+        """fetch_role_grantsの結果からグラフを作る"""
+        graph = RoleGraph()
+        for resource in resources:
+            role = graph.get_role_id(resource.role_name)
+            for grantee in resource.roles or []:
+                graph.granted_to[role] |= 1 << graph.get_role_id(grantee)
+            for user in resource.users or []:
+                graph.add_user_grant(resource.role_name, user)
+        graph.rebuild()
+        return graph
+
+    def get_role_id(self, role_name: str) -> int:
+        role = self.role_ids.get(role_name)
+        if role is None:
+            role = len(self.role_names)
+            self.role_ids[role_name] = role
+            self.role_names.append(role_name)
+            self.granted_to.append(0)
+            self.granted_users.append(0)
+            self.inheritors.append(0)
+            self.inherited.append(0)
+        return role
+
+    def get_user_id(self, user_name: str) -> int:
+        user = self.user_ids.get(user_name)
+        if user is None:
+            user = len(self.user_names)
+            self.user_ids[user_name] = user
+            self.user_names.append(user_name)
+            self.user_roles.append(0)
+        return user
+
+    def rebuild(self) -> None:
+        """推移閉包を作り直す
+
+        Tarjanのアルゴリズムで強連結成分を求めると、辿れる先の成分から順に確定するので、
+        その順に辿れる先のビット集合の和をとる。同じ成分内のロールは互いに継承しあう。
+        """
+        n = len(self.role_names)
+        inheritors = [0] * n
+        for component in self.strongly_connected_components():
+            members = 0
+            for role in component:
+                members |= 1 << role
+            reach = 0
+            for role in component:
+                for grantee in iter_bits(self.granted_to[role]):
+                    if not (members >> grantee) & 1:
+                        reach |= (1 << grantee) | inheritors[grantee]
+            if len(component) > 1 or (self.granted_to[component[0]] & members):
+                reach |= members
+            for role in component:
+                inheritors[role] = reach
+
+        inherited = [0] * n
+        for role in range(n):
+            bit = 1 << role
+            for inheritor in iter_bits(inheritors[role]):
+                inherited[inheritor] |= bit
+
+        self.inheritors = inheritors
+        self.inherited = inherited
+        self._dirty = False
+
+    def strongly_connected_components(self) -> List[List[int]]:
+        """強連結成分を、辿れる先の成分が先に来る順で返す(再帰を使わないTarjan)"""
+        n = len(self.role_names)
+        index = [-1] * n
+        lowlink = [0] * n
+        on_stack = [False] * n
+        stack: List[int] = []
+        components: List[List[int]] = []
+        counter = 0
+
+        for root in range(n):
+            if index[root] != -1:
+                continue
+            work = [(root, iter_bits(self.granted_to[root]))]
+            index[root] = lowlink[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+            while work:
+                [role, successors] = work[-1]
+                advanced = False
+                for successor in successors:
+                    if index[successor] == -1:
+                        index[successor] = lowlink[successor] = counter
+                        counter += 1
+                        stack.append(successor)
+                        on_stack[successor] = True
+                        work.append((successor, iter_bits(self.granted_to[successor])))
+                        advanced = True
+                        break
+                    elif on_stack[successor]:
+                        lowlink[role] = min(lowlink[role], index[successor])
+                if advanced:
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[role])
+                if lowlink[role] == index[role]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component.append(member)
+                        if member == role:
+                            break
+                    components.append(component)
+        return components
+
+    def _ensure_closure(self) -> None:
+        if self._dirty:
+            self.rebuild()
+
+    def add_grant(self, role_name: str, grantee_role_name: str) -> None:
+        """role_nameをgrantee_role_nameに付与する辺を追加し、推移閉包を差分で更新する"""
+        role = self.get_role_id(role_name)
+        grantee = self.get_role_id(grantee_role_name)
+        if (self.granted_to[role] >> grantee) & 1:
+            return
+        self.granted_to[role] |= 1 << grantee
+        if self._dirty:
+            return
+
+        # roleとroleが継承するロールを、granteeとgranteeを継承するロールが新たに継承する
+        sources = self.inherited[role] | (1 << role)
+        targets = self.inheritors[grantee] | (1 << grantee)
+        for source in iter_bits(sources):
+            self.inheritors[source] |= targets
+        for target in iter_bits(targets):
+            self.inherited[target] |= sources
+
+    def remove_grant(self, role_name: str, grantee_role_name: str) -> None:
+        """辺を削除する。推移閉包は次の問い合わせ時に作り直す"""
+        role = self.role_ids.get(role_name)
+        grantee = self.role_ids.get(grantee_role_name)
+        if role is None or grantee is None:
+            return
+        if (self.granted_to[role] >> grantee) & 1:
+            self.granted_to[role] &= ~(1 << grantee)
+            self._dirty = True
+
+    def add_user_grant(self, role_name: str, user_name: str) -> None:
+        role = self.get_role_id(role_name)
+        user = self.get_user_id(user_name)
+        self.granted_users[role] |= 1 << user
+        self.user_roles[user] |= 1 << role
+
+    def remove_user_grant(self, role_name: str, user_name: str) -> None:
+        role = self.role_ids.get(role_name)
+        user = self.user_ids.get(user_name)
+        if role is not None and user is not None:
+            self.granted_users[role] &= ~(1 << user)
+            self.user_roles[user] &= ~(1 << role)
+
+    def get_inheritors(self, role_name: str) -> List[str]:
+        """role_nameを(間接的にでも)継承するロール"""
+        self._ensure_closure()
+        role = self.role_ids.get(role_name)
+        if role is None:
+            return []
+        return [self.role_names[i] for i in iter_bits(self.inheritors[role])]
+
+    def get_inherited_roles(self, role_name: str) -> List[str]:
+        """role_nameが(間接的にでも)継承するロール"""
+        self._ensure_closure()
+        role = self.role_ids.get(role_name)
+        if role is None:
+            return []
+        return [self.role_names[i] for i in iter_bits(self.inherited[role])]
+
+    def get_users_inheriting(self, role_name: str) -> List[str]:
+        """role_nameを直接または他のロール経由で付与されているユーザー"""
+        self._ensure_closure()
+        role = self.role_ids.get(role_name)
+        if role is None:
+            return []
+        users = self.granted_users[role]
+        for inheritor in iter_bits(self.inheritors[role]):
+            users |= self.granted_users[inheritor]
+        return [self.user_names[i] for i in iter_bits(users)]
+
+    def get_user_roles(self, user_name: str) -> List[str]:
+        """ユーザーが直接または間接的に持つロール"""
+        self._ensure_closure()
+        user = self.user_ids.get(user_name)
+        if user is None:
+            return []
+        roles = self.user_roles[user]
+        for role in iter_bits(self.user_roles[user]):
+            roles |= self.inherited[role]
+        return [self.role_names[i] for i in iter_bits(roles)]
+
+    def inherits(self, role_name: str, inherited_role_name: str) -> bool:
+        """role_nameがinherited_role_nameの権限を(間接的にでも)持つか"""
+        self._ensure_closure()
+        role = self.role_ids.get(role_name)
+        inherited_role = self.role_ids.get(inherited_role_name)
+        if role is None or inherited_role is None:
+            return False
+        return role == inherited_role or bool(
+            (self.inheritors[inherited_role] >> role) & 1
+        )
+
+    def get_cycles(self) -> List[List[str]]:
+        """循環している(互いに継承しあう)ロールの組"""
+        self._ensure_closure()
+        cycles = []
+        for role in range(len(self.role_names)):
+            component = self.inheritors[role] & self.inherited[role]
+            # 成分内で最小の番号のロールのときだけ出力する
+            if (component >> role) & 1 and component & ((1 << role) - 1) == 0:
+                cycles.append([self.role_names[i] for i in iter_bits(component)])
+        return cycles
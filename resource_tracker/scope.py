@@ -0,0 +1,160 @@
+import re
+import pandas as pd
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+# fetchの結果のうち、スコープの判定に使う列の種類
+scope_kinds = ["database", "schema", "name", "role", "file_format"]
+# 既定で除くファイルフォーマット(RESOURCE_TRACKER_EXCLUDE_FILE_FORMATSで上書きできる)
+default_exclude_file_formats = ["MYPARQUET"]
+
+
+@dataclass
+class ExportScope:
+    """エクスポートする範囲。各項目は"*"を任意の文字列とするパターン(大文字小文字を区別しない)のリスト
+
+    include側が空なら全て、exclude側に一致するものは除く。
+    """
+
+    databases: List[str] = field(default_factory=list)
+    exclude_databases: List[str] = field(default_factory=list)
+    schemas: List[str] = field(default_factory=list)
+    exclude_schemas: List[str] = field(default_factory=list)
+    names: List[str] = field(default_factory=list)
+    exclude_names: List[str] = field(default_factory=list)
+    roles: List[str] = field(default_factory=list)
+    exclude_roles: List[str] = field(default_factory=list)
+    file_formats: List[str] = field(default_factory=list)
+    exclude_file_formats: List[str] = field(
+        default_factory=lambda: list(default_exclude_file_formats)
+    )
+
+    def get_rules(self, kind: str) -> Tuple[List[str], List[str]]:
+        """(includeのパターン, excludeのパターン)"""
+        if kind == "database":
+            return (self.databases, self.exclude_databases)
+        elif kind == "schema":
+            return (self.schemas, self.exclude_schemas)
+        elif kind == "name":
+            return (self.names, self.exclude_names)
+        elif kind == "role":
+            return (self.roles, self.exclude_roles)
+        elif kind == "file_format":
+            return (self.file_formats, self.exclude_file_formats)
+        else:
+            raise ValueError(f"Unknown scope kind: '{kind}'")
+
+    def is_empty(self) -> bool:
+        return all(
+            len(includes) == 0 and len(excludes) == 0
+            for [includes, excludes] in map(self.get_rules, scope_kinds)
+        )
+
+
+def parse_patterns(value: str) -> List[str]:
+    """カンマ区切りの設定値をパターンのリストにする"""
+    return [p.strip() for p in value.split(",") if p.strip() != ""]
+
+
+def is_exact(pattern: str) -> bool:
+    return "*" not in pattern
+
+
+def quote_string(value: str) -> str:
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def to_identifier(name: str) -> str:
+    """大文字小文字を区別しない(引用符なしの)識別子として書けるならそのまま、書けなければ引用符で囲む"""
+    if re.fullmatch(r"[A-Za-z_][A-Za-z0-9_$]*", name):
+        return name
+    return '"' + name.replace('"', '""') + '"'
+
+
+def to_like(pattern: str) -> str:
+    """ESCAPE '!'で使うLIKEのパターンにする"""
+    escaped = pattern.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+    return escaped.replace("*", "%")
+
+
+def to_regex(pattern: str) -> str:
+    return re.escape(pattern).replace("\\*", ".*")
+
+
+def to_where_clause(scope: ExportScope, scope_columns: Dict[str, str]) -> List[str]:
+    """スコープをWHERE句の条件(andでつなぐもの)にする"""
+    conditions = []
+    for [kind, column] in scope_columns.items():
+        [includes, excludes] = scope.get_rules(kind)
+        if len(includes) > 0:
+            conditions.append(
+                "("
+                + " or ".join(
+                    f"{column} ilike {quote_string(to_like(p))} escape '!'"
+                    for p in includes
+                )
+                + ")"
+            )
+        for pattern in excludes:
+            conditions.append(
+                f"not coalesce({column} ilike {quote_string(to_like(pattern))}"
+                " escape '!', false)"
+            )
+    return conditions
+
+
+def to_scoped_select(
+    query: str, scope: ExportScope, scope_columns: Dict[str, str]
+) -> str:
+    conditions = to_where_clause(scope, scope_columns)
+    if len(conditions) == 0:
+        return query
+    return f"select * from ({query}) where " + " and ".join(conditions)
+
+
+def to_scoped_shows(
+    query: str,
+    scope: ExportScope,
+    scope_columns: Dict[str, str],
+    show_in_database: bool,
+) -> List[str]:
+    """SHOWに押し込める条件だけをLIKE/IN DATABASEにする
+
+    IN DATABASEはデータベースがすべて完全一致のとき、データベースごとに1つのSHOWに分ける。
+    LIKEは名前のincludeが1つのときだけ使う(SHOWのLIKEはESCAPEを指定できず"_"も任意の1文字になるので、
+    実際より広く取れる)。いずれも広めに取るだけなので、結果はfilter_by_scopeで正確に絞り込む。
+    """
+    suffix = " in account"
+    if not query.endswith(suffix):
+        return [query]
+    prefix = query[: -len(suffix)]
+
+    [names, _] = scope.get_rules("name")
+    if "name" in scope_columns and len(names) == 1:
+        prefix = f"{prefix} like {quote_string(names[0].replace('*', '%'))}"
+
+    [databases, _] = scope.get_rules("database")
+    if (
+        show_in_database
+        and len(databases) > 0
+        and all(is_exact(database) for database in databases)
+    ):
+        return [f"{prefix} in database {to_identifier(d)}" for d in databases]
+    return [prefix + suffix]
+
+
+def filter_by_scope(
+    df: pd.DataFrame, scope: ExportScope, scope_columns: Dict[str, str]
+) -> pd.DataFrame:
+    """SHOWの結果をスコープで絞り込む(列ごとの正規表現の判定)"""
+    mask = pd.Series(True, index=df.index)
+    for [kind, column] in scope_columns.items():
+        [includes, excludes] = scope.get_rules(kind)
+        values = df[column]
+        if len(includes) > 0:
+            regex = "|".join(f"(?:{to_regex(p)})" for p in includes)
+            mask &= values.str.fullmatch(regex, case=False, na=False)
+        if len(excludes) > 0:
+            regex = "|".join(f"(?:{to_regex(p)})" for p in excludes)
+            mask &= ~values.str.fullmatch(regex, case=False, na=False)
+    return df[mask]
@@ -1,96 +1,832 @@
+import time
 import pandas as pd
-import IPython as ipy
 from datetime import datetime
-from typing import Optional
+from functools import partial
+from typing import Dict, Iterator, Optional
 from snowflake.connector import SnowflakeConnection
 from snowflake.connector.cursor import SnowflakeCursor
+from .errors import capture_error
+from .fetch_engine import (
+    FetcherSpec,
+    FetchOptions,
+    OrderedMerger,
+    build_resources,
+    convert_columns,
+    fetch_sources,
+    map_unique,
+    parse_array_column,
+    split_or_none,
+    to_aggregated_spec,
+    to_ordered_spec,
+    to_resources,
+    to_scoped_specs,
+)
+from .interning import category_max_ratio, intern_frame
+from .profiling import stage
+from .pagination import iter_show_pages, split_show_query
+from .scope import filter_by_scope
+from .trace import QueryTrace, current_fetcher, get_query_tracer
 from .types import *
 from .utils import to_bool
 
 
-def fetch_pandas_all(cursor: SnowflakeCursor) -> pd.DataFrame:
-    """SQLを実行して、結果をpandas.DataFrameで返す(cursor起点)"""
-    data = cursor.fetchall()
+def to_dataframe(
+    cursor: SnowflakeCursor, data: list, category_max_ratio: Optional[float] = None
+) -> pd.DataFrame:
+    """fetchした行をpandas.DataFrameにする
+
+    同じ文字列は1つのオブジェクトにまとめ(intern_frame)、category_max_ratioを指定すると
+    値の種類が少ない列をcategoricalにする。
+    変換できない場合はErrorCollectorの方針に従い、SKIPなら不正な行を記録して除外する。
+    """
+    columns = [d.name for d in cursor.description]
     try:
-        return pd.DataFrame(
-            data, columns=[d.name for d in cursor.description], dtype=str
-        )
+        df = pd.DataFrame(data, columns=columns, dtype=str)
+        return intern_frame(df, category_max_ratio)
     except ValueError as e:
-        ipy.embed()
+        error = e
 
+    good_rows = [row for row in data if len(row) == len(columns)]
+    if len(good_rows) == len(data):
+        # 列数以外の原因なので行単位では救えない
+        capture_error("fetch", error)
+        return pd.DataFrame([], columns=columns, dtype=str)
 
-def pd_execute(conn: SnowflakeConnection, sql: str) -> pd.DataFrame:
+    for row in data:
+        if len(row) != len(columns):
+            capture_error(
+                "fetch",
+                ValueError(f"{len(columns)} columns expected, got {len(row)}"),
+                row,
+            )
+    df = pd.DataFrame(good_rows, columns=columns, dtype=str)
+    return intern_frame(df, category_max_ratio)
+
+
+def fetch_pandas_all(
+    cursor: SnowflakeCursor, category_max_ratio: Optional[float] = None
+) -> pd.DataFrame:
+    """SQLを実行して、結果をpandas.DataFrameで返す(cursor起点)"""
+    data = cursor.fetchall()
+    return to_dataframe(cursor, data, category_max_ratio)
+
+
+def pd_execute(
+    conn: SnowflakeConnection, sql: str, category_max_ratio: Optional[float] = None
+) -> pd.DataFrame:
     """SQLを実行して、結果をpandas.DataFrameで返す"""
+    tracer = get_query_tracer()
+    if tracer is None:
+        cur = conn.cursor()
+        cur.execute(sql)
+        return fetch_pandas_all(cur, category_max_ratio)
+
+    started_at = time.time()
+    t0 = time.perf_counter()
     cur = conn.cursor()
     cur.execute(sql)
-    return fetch_pandas_all(cur)
+    t1 = time.perf_counter()
+    data = cur.fetchall()
+    t2 = time.perf_counter()
+    df = to_dataframe(cur, data, category_max_ratio)
+    t3 = time.perf_counter()
+    tracer.record(
+        QueryTrace(
+            sql=sql,
+            fetcher=current_fetcher.get(),
+            query_id=getattr(cur, "sfqid", None),
+            started_at=started_at,
+            execute_seconds=t1 - t0,
+            fetch_seconds=t2 - t1,
+            dataframe_seconds=t3 - t2,
+            row_count=len(data),
+            approx_bytes=int(df.memory_usage(deep=True).sum()) if df is not None else 0,
+        )
+    )
+    return df
+
+
+# ストリーミングで1回にfetchmanyする行数
+default_batch_size = 10000
+
+
+def iter_execute(
+    conn: SnowflakeConnection,
+    sql: str,
+    batch_size: int = default_batch_size,
+    category_max_ratio: Optional[float] = None,
+) -> Iterator[pd.DataFrame]:
+    """SQLを実行し、結果をfetchmanyでbatch_size行ずつpandas.DataFrameにして返す
+
+    pd_executeと違い、結果全体をメモリに載せない。トレースは読み終えたときに1件として記録する。
+    """
+    tracer = get_query_tracer()
+    started_at = time.time()
+    t0 = time.perf_counter()
+    cur = conn.cursor()
+    cur.execute(sql)
+    execute_seconds = time.perf_counter() - t0
+    fetch_seconds = 0.0
+    dataframe_seconds = 0.0
+    row_count = 0
+    approx_bytes = 0
+    try:
+        while True:
+            t1 = time.perf_counter()
+            data = cur.fetchmany(batch_size)
+            t2 = time.perf_counter()
+            fetch_seconds += t2 - t1
+            if len(data) == 0:
+                return
+            df = to_dataframe(cur, data, category_max_ratio)
+            dataframe_seconds += time.perf_counter() - t2
+            row_count += len(data)
+            if tracer is not None:
+                approx_bytes += int(df.memory_usage(deep=True).sum())
+            yield df
+    finally:
+        # 途中で読むのをやめた場合もカーソルを閉じる
+        cur.close()
+        if tracer is not None:
+            tracer.record(
+                QueryTrace(
+                    sql=sql,
+                    fetcher=current_fetcher.get(),
+                    query_id=getattr(cur, "sfqid", None),
+                    started_at=started_at,
+                    execute_seconds=execute_seconds,
+                    fetch_seconds=fetch_seconds,
+                    dataframe_seconds=dataframe_seconds,
+                    row_count=row_count,
+                    approx_bytes=approx_bytes,
+                )
+            )
+
+
+def run_fetcher(
+    conn: SnowflakeConnection,
+    spec: FetcherSpec,
+    options: Optional[FetchOptions] = None,
+) -> List[SnowflakeResourceT]:
+    """specのクエリを実行し、結果からリソースを作る"""
+    if spec.merge_key is None:
+        return [r for page in iter_fetcher_pages(conn, spec, options) for r in page]
+
+    df = pd_execute_spec(conn, spec, options)
+    if options is not None and options.server_side_merge:
+        # 集約済みの結果なので、ロールの列をリストとして読む
+        spec = to_aggregated_spec(spec)
+    return build_resources(spec, df)
+
+
+def pd_execute_spec(
+    conn: SnowflakeConnection,
+    spec: FetcherSpec,
+    options: Optional[FetchOptions] = None,
+) -> pd.DataFrame:
+    """specのクエリを、optionsのスコープ・集約の設定を反映して実行する"""
+    frames = list(iter_spec_frames(conn, spec, options))
+    if len(frames) == 1:
+        return frames[0]
+    # 種類の違うcategoricalの列はobjectになるので、まとめ直す
+    return intern_frame(pd.concat(frames, ignore_index=True), category_max_ratio)
+
+
+def iter_spec_frames(
+    conn: SnowflakeConnection,
+    spec: FetcherSpec,
+    options: Optional[FetchOptions] = None,
+) -> Iterator[pd.DataFrame]:
+    """pd_execute_specの結果を、クエリ・SHOWのページごとに返す"""
+    scope = options.scope if options is not None else None
+    if scope is not None and scope.is_empty():
+        scope = None
+    page_size = options.show_page_size if options is not None else None
+
+    specs = [spec] if scope is None else to_scoped_specs(spec, scope)
+    if options is not None and options.server_side_merge:
+        specs = [to_aggregated_spec(s) for s in specs]
+
+    for s in specs:
+        if page_size is not None and s.paginate and " in " in s.query:
+            [prefix, container] = split_show_query(s.query)
+            frames = iter_show_pages(
+                partial(pd_execute, conn, category_max_ratio=category_max_ratio),
+                prefix,
+                container,
+                s.show_level,
+                page_size,
+            )
+        else:
+            frames = iter([pd_execute(conn, s.query, category_max_ratio)])
+        for df in frames:
+            if scope is not None and s.is_show():
+                df = filter_by_scope(df, scope, s.scope_columns)
+            yield df
+
+
+def iter_fetcher_pages(
+    conn: SnowflakeConnection,
+    spec: FetcherSpec,
+    options: Optional[FetchOptions] = None,
+) -> Iterator[List[SnowflakeResourceT]]:
+    """run_fetcherの結果をページごとに返す
+
+    ページをまたいでマージする必要があるmerge_key付きのspecは、全体を1ページとして返す。
+    """
+    if spec.merge_key is not None:
+        yield run_fetcher(conn, spec, options)
+        return
+    for df in iter_spec_frames(conn, spec, options):
+        yield build_resources(spec, df)
+
+
+def iter_spec_batches(
+    conn: SnowflakeConnection,
+    spec: FetcherSpec,
+    options: Optional[FetchOptions] = None,
+    batch_size: int = default_batch_size,
+) -> Iterator[pd.DataFrame]:
+    """iter_spec_framesのストリーミング版。SELECTの結果はbatch_size行ずつ読む
+
+    merge_keyがあれば、まとめる行が連続して届くようにORDER BYを付ける。
+    SHOWはfetchmanyで分けても結果全体が一度に返るので、iter_spec_framesと同じくページごとに読む。
+    """
+    if spec.is_show():
+        yield from iter_spec_frames(conn, spec, options)
+        return
+
+    scope = options.scope if options is not None else None
+    if scope is not None and scope.is_empty():
+        scope = None
+    specs = [spec] if scope is None else to_scoped_specs(spec, scope)
+    for s in specs:
+        if options is not None and options.server_side_merge:
+            s = to_aggregated_spec(s)
+        else:
+            s = to_ordered_spec(s)
+        yield from iter_execute(conn, s.query, batch_size, category_max_ratio)
+
+
+def iter_fetcher_batches(
+    conn: SnowflakeConnection,
+    spec: FetcherSpec,
+    options: Optional[FetchOptions] = None,
+    batch_size: int = default_batch_size,
+) -> Iterator[List[SnowflakeResourceT]]:
+    """run_fetcherのストリーミング版。リソースをbatch_size行程度ずつ作って返す
+
+    merge_keyのあるspecは、ORDER BYした結果をOrderedMergerで読みながらマージするので、
+    全体を保持せずにrun_fetcherと同じリソースを作れる。
+    """
+    # 集約済みの結果なら、ロールの列をリストとして読む
+    build_spec = (
+        to_aggregated_spec(spec)
+        if options is not None and options.server_side_merge
+        else spec
+    )
+    merge_key = build_spec.merge_key
+    merger = OrderedMerger(merge_key) if merge_key is not None else None
+    for df in iter_spec_batches(conn, spec, options, batch_size):
+        values = convert_columns(build_spec, df)
+        if merger is not None:
+            with stage("merge"):
+                values = merger.push(values)
+        resources = to_resources(spec.resource_class, values)
+        if len(resources) > 0:
+            yield resources
+    if merger is not None:
+        resources = to_resources(spec.resource_class, merger.flush())
+        if len(resources) > 0:
+            yield resources
+
+
+def grants_to_roles_query(granted_on: str) -> str:
+    return f"select * from snowflake.account_usage.grants_to_roles where granted_on = '{granted_on}' and granted_to = 'ROLE' and deleted_on is null"
+
+
+def convert_timestamp_format(timestamp_str: str) -> str:
+    timestamp = datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S%z")
+    return timestamp.strftime("%Y-%m-%dT%H:%M:%S%Z")
+
+
+def strip_create_view(s: pd.Series) -> pd.Series:
+    """VIEW_DEFINITION("create view ... as select ...")からSELECT文の部分を取り出す"""
+    return s.str.replace(r"(?is)^\s*create\s.*?\sas\s+", "", n=1, regex=True)
+
+
+to_bool_column = map_unique(to_bool)
+
+# SHOW/SELECTの結果を列の対応づけだけでリソースにできるもの
+fetcher_specs: Dict[str, FetcherSpec] = {
+    "warehouse": FetcherSpec(
+        SnowflakeWarehouse,
+        "show warehouses in account",
+        columns={"name": "name", "comment": "comment", "warehouse_size": "size"},
+        constants={
+            "max_concurrency_level": 8,
+            "statement_queued_timeout_in_seconds": 0,
+            "statement_timeout_in_seconds": 172800,
+        },
+        scope_columns={"name": "name"},
+    ),
+    "database": FetcherSpec(
+        SnowflakeDatabase,
+        "show databases in account",
+        columns={"name": "name", "comment": "comment"},
+        scope_columns={"database": "name", "name": "name"},
+        paginate=True,
+    ),
+    "schema": FetcherSpec(
+        SnowflakeSchema,
+        "show schemas in account",
+        columns={"database": "database_name", "name": "name", "comment": "comment"},
+        scope_columns={"database": "database_name", "schema": "name", "name": "name"},
+        show_level="database",
+        paginate=True,
+    ),
+    "stage": FetcherSpec(
+        SnowflakeStage,
+        "show stages in account",
+        columns={
+            "database": "database_name",
+            "schema": "schema_name",
+            "name": "name",
+            "url": "url",
+            "comment": "comment",
+        },
+        scope_columns={
+            "database": "database_name",
+            "schema": "schema_name",
+            "name": "name",
+        },
+        show_level="schema",
+        paginate=True,
+    ),
+    "role": FetcherSpec(
+        SnowflakeRole,
+        "show roles in account",
+        columns={"name": "name", "comment": "comment"},
+        scope_columns={"name": "name", "role": "name"},
+    ),
+    "user": FetcherSpec(
+        SnowflakeUser,
+        "show users in account",
+        columns={
+            "email": "email",
+            "name": "name",
+            "default_warehouse": "default_warehouse",
+        },
+        scope_columns={"name": "name"},
+        paginate=True,
+    ),
+    "resource_monitor": FetcherSpec(
+        SnowflakeResourceMonitor,
+        "show resource monitors in account",
+        columns={
+            "name": "name",
+            "credit_quota": "credit_quota",
+            "end_timestamp": "end_time",
+            "frequency": "frequency",
+            "notify_users": "notify_users",
+            "start_timestamp": "start_time",
+        },
+        conversions={
+            "notify_users": split_or_none(","),
+            "start_timestamp": map_unique(convert_timestamp_format),
+        },
+        scope_columns={"name": "name"},
+    ),
+    "task": FetcherSpec(
+        SnowflakeTask,
+        "show tasks in account",
+        columns={
+            "database": "database_name",
+            "name": "name",
+            "schema": "schema_name",
+            "sql_statement": "definition",
+            "allow_overlapping_execution": "allow_overlapping_execution",
+            "comment": "comment",
+            "error_integration": "error_integration",
+            "schedule": "schedule",
+            "warehouse": "warehouse",
+        },
+        scope_columns={
+            "database": "database_name",
+            "schema": "schema_name",
+            "name": "name",
+        },
+        show_level="schema",
+        paginate=True,
+    ),
+    "database_grant": FetcherSpec(
+        SnowflakeDatabaseGrant,
+        grants_to_roles_query("DATABASE"),
+        columns={
+            "database_name": "NAME",
+            "privilege": "PRIVILEGE",
+            "roles": "GRANTEE_NAME",
+            "with_grant_option": "GRANT_OPTION",
+        },
+        conversions={"with_grant_option": to_bool_column},
+        merge_key="roles",
+        scope_columns={"database": "NAME", "role": "GRANTEE_NAME"},
+    ),
+    "file_format_grant": FetcherSpec(
+        SnowflakeFileFormatGrant,
+        grants_to_roles_query("FILE FORMAT"),
+        columns={
+            "database_name": "TABLE_CATALOG",
+            "roles": "GRANTEE_NAME",
+            "file_format_name": "NAME",
+            "schema_name": "TABLE_SCHEMA",
+            "privilege": "PRIVILEGE",
+            "with_grant_option": "GRANT_OPTION",
+        },
+        conversions={"with_grant_option": to_bool_column},
+        merge_key="roles",
+        scope_columns={
+            "database": "TABLE_CATALOG",
+            "schema": "TABLE_SCHEMA",
+            "name": "NAME",
+            "role": "GRANTEE_NAME",
+        },
+    ),
+    "integration_grant": FetcherSpec(
+        SnowflakeIntegrationGrant,
+        grants_to_roles_query("INTEGRATION"),
+        columns={
+            "integration_name": "NAME",
+            "privilege": "PRIVILEGE",
+            "roles": "GRANTEE_NAME",
+            "with_grant_option": "GRANT_OPTION",
+        },
+        conversions={"with_grant_option": to_bool_column},
+        merge_key="roles",
+        scope_columns={"name": "NAME", "role": "GRANTEE_NAME"},
+    ),
+    "resource_monitor_grant": FetcherSpec(
+        SnowflakeResourceMonitorGrant,
+        grants_to_roles_query("RESOURCE MONITOR"),
+        columns={
+            "monitor_name": "NAME",
+            "privilege": "PRIVILEGE",
+            "roles": "GRANTEE_NAME",
+            "with_grant_option": "GRANT_OPTION",
+        },
+        conversions={"with_grant_option": to_bool_column},
+        merge_key="roles",
+        scope_columns={"name": "NAME", "role": "GRANTEE_NAME"},
+    ),
+    "role_grants_to_roles": FetcherSpec(
+        SnowflakeRoleGrants,
+        "select * from snowflake.account_usage.grants_to_roles where granted_on = 'ROLE' and granted_to = 'ROLE' and privilege = 'USAGE' and deleted_on is null",
+        columns={"role_name": "NAME", "roles": "GRANTEE_NAME"},
+        constants={"enable_multiple_grants": True},
+        merge_key="roles",
+        scope_columns={"name": "NAME", "role": "GRANTEE_NAME"},
+    ),
+    "role_grants_to_users": FetcherSpec(
+        SnowflakeRoleGrants,
+        "select * from snowflake.account_usage.grants_to_users",
+        columns={"role_name": "ROLE", "users": "GRANTEE_NAME"},
+        constants={"enable_multiple_grants": True},
+        merge_key="users",
+        scope_columns={"name": "ROLE", "role": "ROLE"},
+    ),
+    "schema_grant": FetcherSpec(
+        SnowflakeSchemaGrant,
+        grants_to_roles_query("SCHEMA"),
+        columns={
+            "database_name": "TABLE_CATALOG",
+            "privilege": "PRIVILEGE",
+            "roles": "GRANTEE_NAME",
+            "schema_name": "TABLE_SCHEMA",
+            "with_grant_option": "GRANT_OPTION",
+        },
+        conversions={"with_grant_option": to_bool_column},
+        merge_key="roles",
+        scope_columns={
+            "database": "TABLE_CATALOG",
+            "schema": "TABLE_SCHEMA",
+            "role": "GRANTEE_NAME",
+        },
+    ),
+    "stage_grant": FetcherSpec(
+        SnowflakeStageGrant,
+        grants_to_roles_query("STAGE"),
+        columns={
+            "database_name": "TABLE_CATALOG",
+            "roles": "GRANTEE_NAME",
+            "privilege": "PRIVILEGE",
+            "schema_name": "TABLE_SCHEMA",
+            "stage_name": "NAME",
+            "with_grant_option": "GRANT_OPTION",
+        },
+        conversions={"with_grant_option": to_bool_column},
+        merge_key="roles",
+        scope_columns={
+            "database": "TABLE_CATALOG",
+            "schema": "TABLE_SCHEMA",
+            "name": "NAME",
+            "role": "GRANTEE_NAME",
+        },
+    ),
+    "warehouse_grant": FetcherSpec(
+        SnowflakeWarehouseGrant,
+        grants_to_roles_query("WAREHOUSE"),
+        columns={
+            "warehouse_name": "NAME",
+            "privilege": "PRIVILEGE",
+            "roles": "GRANTEE_NAME",
+            "with_grant_option": "GRANT_OPTION",
+        },
+        conversions={"with_grant_option": to_bool_column},
+        merge_key="roles",
+        scope_columns={"name": "NAME", "role": "GRANTEE_NAME"},
+    ),
+    "table_grant": FetcherSpec(
+        SnowflakeTableGrant,
+        grants_to_roles_query("TABLE"),
+        columns={
+            "database_name": "TABLE_CATALOG",
+            "privilege": "PRIVILEGE",
+            "roles": "GRANTEE_NAME",
+            "schema_name": "TABLE_SCHEMA",
+            "table_name": "NAME",
+            "with_grant_option": "GRANT_OPTION",
+        },
+        conversions={"with_grant_option": to_bool_column},
+        merge_key="roles",
+        scope_columns={
+            "database": "TABLE_CATALOG",
+            "schema": "TABLE_SCHEMA",
+            "name": "NAME",
+            "role": "GRANTEE_NAME",
+        },
+    ),
+    "task_grant": FetcherSpec(
+        SnowflakeTaskGrant,
+        grants_to_roles_query("TASK"),
+        columns={
+            "database_name": "TABLE_CATALOG",
+            "roles": "GRANTEE_NAME",
+            "privilege": "PRIVILEGE",
+            "schema_name": "TABLE_SCHEMA",
+            "task_name": "NAME",
+            "with_grant_option": "GRANT_OPTION",
+        },
+        conversions={"with_grant_option": to_bool_column},
+        merge_key="roles",
+        scope_columns={
+            "database": "TABLE_CATALOG",
+            "schema": "TABLE_SCHEMA",
+            "name": "NAME",
+            "role": "GRANTEE_NAME",
+        },
+    ),
+    "user_grant": FetcherSpec(
+        SnowflakeUserGrant,
+        grants_to_roles_query("USER"),
+        columns={
+            "privilege": "PRIVILEGE",
+            "user_name": "NAME",
+            "roles": "GRANTEE_NAME",
+            "with_grant_option": "GRANT_OPTION",
+        },
+        conversions={"with_grant_option": to_bool_column},
+        merge_key="roles",
+        scope_columns={"name": "NAME", "role": "GRANTEE_NAME"},
+    ),
+}
+
 
+# account_usageのビューから1回のSELECTで取得するspec
+# fetcher_specsにもある種別はSHOWと同じ属性を取る。ビューの反映には最大で数時間の遅れがある
+account_usage_specs: Dict[str, FetcherSpec] = {
+    "schema": FetcherSpec(
+        SnowflakeSchema,
+        "select catalog_name, schema_name, comment"
+        " from snowflake.account_usage.schemata where deleted is null",
+        columns={
+            "database": "CATALOG_NAME",
+            "name": "SCHEMA_NAME",
+            "comment": "COMMENT",
+        },
+        scope_columns={
+            "database": "CATALOG_NAME",
+            "schema": "SCHEMA_NAME",
+            "name": "SCHEMA_NAME",
+        },
+    ),
+    "stage": FetcherSpec(
+        SnowflakeStage,
+        "select stage_catalog, stage_schema, stage_name, stage_url, comment"
+        " from snowflake.account_usage.stages where deleted is null",
+        columns={
+            "database": "STAGE_CATALOG",
+            "schema": "STAGE_SCHEMA",
+            "name": "STAGE_NAME",
+            "url": "STAGE_URL",
+            "comment": "COMMENT",
+        },
+        scope_columns={
+            "database": "STAGE_CATALOG",
+            "schema": "STAGE_SCHEMA",
+            "name": "STAGE_NAME",
+        },
+    ),
+    "user": FetcherSpec(
+        SnowflakeUser,
+        "select name, email, default_warehouse"
+        " from snowflake.account_usage.users where deleted_on is null",
+        columns={
+            "email": "EMAIL",
+            "name": "NAME",
+            "default_warehouse": "DEFAULT_WAREHOUSE",
+        },
+        scope_columns={"name": "NAME"},
+    ),
+    # タスクはtask_versionsにしか定義がなく、削除されたタスクの版も残り続けて除けないので、
+    # account_usageでもSHOWで取得する
+    # 列はcolumnsビューをテーブルごとにARRAY_AGGし、columnブロックのリストにする
+    "table": FetcherSpec(
+        SnowflakeTable,
+        "select t.table_catalog, t.table_schema, t.table_name, t.comment,"
+        " t.retention_time, c.columns"
+        " from snowflake.account_usage.tables t"
+        " join (select table_id, array_agg(object_construct("
+        "'name', column_name,"
+        " 'type', case"
+        " when data_type = 'NUMBER'"
+        " then 'NUMBER(' || numeric_precision || ',' || numeric_scale || ')'"
+        " when data_type = 'TEXT'"
+        " then 'VARCHAR(' || character_maximum_length || ')'"
+        " else data_type end,"
+        " 'nullable', is_nullable = 'YES',"
+        " 'comment', comment))"
+        " within group (order by ordinal_position) as columns"
+        " from snowflake.account_usage.columns where deleted is null"
+        " group by table_id) c on c.table_id = t.table_id"
+        " where t.deleted is null and t.table_type = 'BASE TABLE'",
+        columns={
+            "database": "TABLE_CATALOG",
+            "schema": "TABLE_SCHEMA",
+            "name": "TABLE_NAME",
+            "comment": "COMMENT",
+            "data_retention_time_in_days": "RETENTION_TIME",
+            "column": "COLUMNS",
+        },
+        conversions={
+            "data_retention_time_in_days": map_unique(int),
+            "column": parse_array_column,
+        },
+        scope_columns={
+            "database": "TABLE_CATALOG",
+            "schema": "TABLE_SCHEMA",
+            "name": "TABLE_NAME",
+        },
+    ),
+    "view": FetcherSpec(
+        SnowflakeView,
+        "select table_catalog, table_schema, table_name, view_definition, comment,"
+        " (is_secure = 'YES') as is_secure"
+        " from snowflake.account_usage.views where deleted is null",
+        columns={
+            "database": "TABLE_CATALOG",
+            "schema": "TABLE_SCHEMA",
+            "name": "TABLE_NAME",
+            "statement": "VIEW_DEFINITION",
+            "comment": "COMMENT",
+            "is_secure": "IS_SECURE",
+        },
+        conversions={"statement": strip_create_view, "is_secure": to_bool_column},
+        scope_columns={
+            "database": "TABLE_CATALOG",
+            "schema": "TABLE_SCHEMA",
+            "name": "TABLE_NAME",
+        },
+    ),
+    "pipe": FetcherSpec(
+        SnowflakePipe,
+        "select pipe_catalog, pipe_schema, pipe_name, definition, comment,"
+        " (is_autoingest_enabled = 'YES') as is_autoingest_enabled"
+        " from snowflake.account_usage.pipes where deleted is null",
+        columns={
+            "database": "PIPE_CATALOG",
+            "schema": "PIPE_SCHEMA",
+            "name": "PIPE_NAME",
+            "copy_statement": "DEFINITION",
+            "comment": "COMMENT",
+            "auto_ingest": "IS_AUTOINGEST_ENABLED",
+        },
+        conversions={"auto_ingest": to_bool_column},
+        scope_columns={
+            "database": "PIPE_CATALOG",
+            "schema": "PIPE_SCHEMA",
+            "name": "PIPE_NAME",
+        },
+    ),
+}
 
-def fetch_warehouses(conn: SnowflakeConnection) -> List[SnowflakeWarehouse]:
+
+def get_fetcher_specs(
+    resource_type_name: str, options: Optional[FetchOptions] = None
+) -> Optional[List[FetcherSpec]]:
+    """リソース種別を取得するspecのリスト。1件ずつdescが必要な種別はNone"""
+    if resource_type_name == "role_grants":
+        return [
+            fetcher_specs["role_grants_to_roles"],
+            fetcher_specs["role_grants_to_users"],
+        ]
+    if resource_type_name in fetcher_specs:
+        return [get_fetcher_spec(resource_type_name, options)]
+    if resource_type_name in account_usage_specs:
+        return [account_usage_specs[resource_type_name]]
+    return None
+
+
+def get_fetcher_spec(
+    resource_type_name: str, options: Optional[FetchOptions] = None
+) -> FetcherSpec:
+    """options.sourceに応じたspec。account_usageに対応するビューがない種別はSHOWのspec"""
+    source = options.source if options is not None else "show"
+    if source not in fetch_sources:
+        raise ValueError(f"Unknown fetch source: '{source}'")
+    if source == "account_usage" and resource_type_name in account_usage_specs:
+        return account_usage_specs[resource_type_name]
+    return fetcher_specs[resource_type_name]
+
+
+# 1件ずつdescで属性を取る種別の、一覧の取得にだけ使うspec
+list_specs: Dict[str, FetcherSpec] = {
+    "file_format": FetcherSpec(
+        SnowflakeFileFormat,
+        "show file formats in account",
+        columns={},
+        scope_columns={
+            "database": "database_name",
+            "schema": "schema_name",
+            "name": "name",
+            "file_format": "name",
+        },
+        show_level="schema",
+    ),
+    "storage_integration": FetcherSpec(
+        SnowflakeStorageIntegration,
+        "show storage integrations",
+        columns={},
+        scope_columns={"name": "name"},
+    ),
+    "notification_integration": FetcherSpec(
+        SnowflakeNotificationIntegration,
+        "show notification integrations",
+        columns={},
+        scope_columns={"name": "name"},
+    ),
+}
+
+
+def fetch_warehouses(
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
+) -> List[SnowflakeWarehouse]:
     """Snowflakeのウェアハウス一覧を取得する"""
-    df = pd_execute(conn, "show warehouses in account")
-    return [
-        SnowflakeWarehouse(
-            name=row.name,
-            comment=row.comment,
-            warehouse_size=row.size,
-            max_concurrency_level=8,
-            statement_queued_timeout_in_seconds=0,
-            statement_timeout_in_seconds=172800,
-        )
-        for row in df.itertuples()
-    ]
+    return run_fetcher(conn, fetcher_specs["warehouse"], options)
 
 
-def fetch_databases(conn: SnowflakeConnection) -> List[SnowflakeDatabase]:
+def fetch_databases(
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
+) -> List[SnowflakeDatabase]:
     """Snowflakeのデータベース一覧を取得する"""
-    df = pd_execute(conn, "show databases in account")
-    return [
-        SnowflakeDatabase(name=row.name, comment=row.comment) for row in df.itertuples()
-    ]
+    return run_fetcher(conn, fetcher_specs["database"], options)
 
 
-def fetch_schemata(conn: SnowflakeConnection) -> List[SnowflakeSchema]:
+def fetch_schemata(
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
+) -> List[SnowflakeSchema]:
     """Snowflakeのスキーマ一覧を取得する"""
-    df = pd_execute(conn, "show schemas in account")
-    return [
-        SnowflakeSchema(database=row.database_name, name=row.name, comment=row.comment)
-        for row in df.itertuples()
-    ]
+    return run_fetcher(conn, get_fetcher_spec("schema", options), options)
 
 
-def fetch_stages(conn: SnowflakeConnection) -> List[SnowflakeStage]:
+def fetch_stages(
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
+) -> List[SnowflakeStage]:
     """Snowflakeのステージ一覧を取得する"""
-    df = pd_execute(conn, "show stages in account")
-    return [
-        SnowflakeStage(
-            database=row.database_name,
-            schema=row.schema_name,
-            name=row.name,
-            url=row.url,
-            comment=row.comment,
-        )
-        for row in df.itertuples()
-    ]
+    return run_fetcher(conn, get_fetcher_spec("stage", options), options)
 
 
-def fetch_roles(conn: SnowflakeConnection) -> List[SnowflakeRole]:
+def fetch_roles(
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
+) -> List[SnowflakeRole]:
     """Snowflakeのロール一覧を取得する"""
-    df = pd_execute(conn, "show roles in account")
-    return [
-        SnowflakeRole(name=row.name, comment=row.comment) for row in df.itertuples()
-    ]
+    return run_fetcher(conn, fetcher_specs["role"], options)
 
 
-def fetch_users(conn: SnowflakeConnection) -> List[SnowflakeUser]:
+def fetch_users(
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
+) -> List[SnowflakeUser]:
     """Snowflakeのユーザー一覧を取得する"""
-    df = pd_execute(conn, "show users in account")
-    return [
-        SnowflakeUser(
-            email=row.email, name=row.name, default_warehouse=row.default_warehouse
-        )
-        for row in df.itertuples()
-    ]
+    return run_fetcher(conn, get_fetcher_spec("user", options), options)
 
 
 def get_property(df: pd.DataFrame, name: str) -> Optional[dict]:
@@ -109,10 +845,10 @@ def get_property_value(df: pd.DataFrame, name: str) -> Optional[str]:
 
 
 def fetch_storage_integrations(
-    conn: SnowflakeConnection,
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
 ) -> List[SnowflakeStorageIntegration]:
     """Snowflakeのストレージ統合一覧を取得する"""
-    df = pd_execute(conn, "show storage integrations")
+    df = pd_execute_spec(conn, list_specs["storage_integration"], options)
     resources = []
 
     for p in df.itertuples():
@@ -145,10 +881,10 @@ def get_notification_integration_type(typ: str) -> str:
 
 
 def fetch_notification_integrations(
-    conn: SnowflakeConnection,
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
 ) -> List[SnowflakeNotificationIntegration]:
     """Snowflakeの通知統合一覧を取得する"""
-    df = pd_execute(conn, "show notification integrations")
+    df = pd_execute_spec(conn, list_specs["notification_integration"], options)
     resources = []
 
     for p in df.itertuples():
@@ -171,291 +907,142 @@ def fetch_notification_integrations(
     return resources
 
 
-def fetch_database_grants(conn: SnowflakeConnection) -> List[SnowflakeDatabaseGrant]:
-    df = pd_execute(
-        conn,
-        "select * from snowflake.account_usage.grants_to_roles where granted_on = 'DATABASE' and granted_to = 'ROLE' and deleted_on is null",
-    )
-    resources = [
-        SnowflakeDatabaseGrant(
-            database_name=p.NAME,
-            privilege=p.PRIVILEGE,
-            roles=[p.GRANTEE_NAME],
-            with_grant_option=to_bool(p.GRANT_OPTION),
-        )
-        for p in df.itertuples()
-    ]
-    return merge_resources_by_roles(resources)
+def fetch_database_grants(
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
+) -> List[SnowflakeDatabaseGrant]:
+    return run_fetcher(conn, fetcher_specs["database_grant"], options)
 
 
-def fetch_file_formats(conn: SnowflakeConnection) -> List[SnowflakeFileFormat]:
-    df = pd_execute(conn, "show file formats in account")
+def fetch_file_formats(
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
+) -> List[SnowflakeFileFormat]:
+    df = pd_execute_spec(conn, list_specs["file_format"], options)
     resources = []
 
     for p in df.itertuples():
-        if p.name != "MYPARQUET":
-            df2 = pd_execute(conn, f"desc file format {p.name}")
-            resource = SnowflakeFileFormat(
-                database=p.database_name,
-                format_type=p.type,
-                name=p.name,
-                schema=p.schema_name,
-                allow_duplicate=get_property_value(df2, "ALLOW_DUPLICATE"),
-                binary_format=get_property_value(df2, "BINARY_FORMAT"),
-                compression=get_property_value(df2, "COMPRESSION"),
-                date_format=get_property_value(df2, "DATE_FORMAT"),
-                encoding=get_property_value(df2, "ENCODING"),
-                escape=get_property_value(df2, "ESCAPE"),
-                escape_unenclosed_field=get_property_value(
-                    df2, "ESCAPE_UNENCLOSED_FIELD"
-                ),
-                field_delimiter=get_property_value(df2, "FIELD_DELIMITER"),
-                field_optionally_enclosed_by=get_property_value(
-                    df2, "FIELD_OPTIONALLY_ENCLOSED_BY"
-                ),
-                file_extension=get_property_value(df2, "FILE_EXTENSION"),
-                null_if=get_property_value(df2, "NULL_IF").split(","),
-                record_delimiter=get_property_value(df2, "RECORD_DELIMITER"),
-                skip_blank_lines=get_property_value(df2, "SKIP_BLANK_LINES"),
-                skip_byte_order_mark=get_property_value(df2, "SKIP_BYTE_ORDER_MARK"),
-                time_format=get_property_value(df2, "TIME_FORMAT"),
-                timestamp_format=get_property_value(df2, "TIMESTAMP_FORMAT"),
-                trim_space=get_property_value(df2, "TRIM_SPACE"),
-            )
-            resources.append(resource)
+        df2 = pd_execute(conn, f"desc file format {p.name}")
+        # NULL_IFが取れないフォーマットではNoneにする
+        null_if = get_property_value(df2, "NULL_IF")
+        resource = SnowflakeFileFormat(
+            database=p.database_name,
+            format_type=p.type,
+            name=p.name,
+            schema=p.schema_name,
+            allow_duplicate=get_property_value(df2, "ALLOW_DUPLICATE"),
+            binary_format=get_property_value(df2, "BINARY_FORMAT"),
+            compression=get_property_value(df2, "COMPRESSION"),
+            date_format=get_property_value(df2, "DATE_FORMAT"),
+            encoding=get_property_value(df2, "ENCODING"),
+            escape=get_property_value(df2, "ESCAPE"),
+            escape_unenclosed_field=get_property_value(df2, "ESCAPE_UNENCLOSED_FIELD"),
+            field_delimiter=get_property_value(df2, "FIELD_DELIMITER"),
+            field_optionally_enclosed_by=get_property_value(
+                df2, "FIELD_OPTIONALLY_ENCLOSED_BY"
+            ),
+            file_extension=get_property_value(df2, "FILE_EXTENSION"),
+            null_if=null_if.split(",") if null_if is not None else None,
+            record_delimiter=get_property_value(df2, "RECORD_DELIMITER"),
+            skip_blank_lines=get_property_value(df2, "SKIP_BLANK_LINES"),
+            skip_byte_order_mark=get_property_value(df2, "SKIP_BYTE_ORDER_MARK"),
+            time_format=get_property_value(df2, "TIME_FORMAT"),
+            timestamp_format=get_property_value(df2, "TIMESTAMP_FORMAT"),
+            trim_space=get_property_value(df2, "TRIM_SPACE"),
+        )
+        resources.append(resource)
 
     return resources
 
 
 def fetch_file_format_grants(
-    conn: SnowflakeConnection,
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
 ) -> List[SnowflakeFileFormatGrant]:
-    df = pd_execute(
-        conn,
-        "select * from snowflake.account_usage.grants_to_roles where granted_on = 'FILE FORMAT' and granted_to = 'ROLE' and deleted_on is null",
-    )
-    resources = [
-        SnowflakeFileFormatGrant(
-            database_name=p.TABLE_CATALOG,
-            roles=[p.GRANTEE_NAME],
-            file_format_name=p.NAME,
-            schema_name=p.TABLE_SCHEMA,
-            privilege=p.PRIVILEGE,
-            with_grant_option=to_bool(p.GRANT_OPTION),
-        )
-        for p in df.itertuples()
-    ]
-    return merge_resources_by_roles(resources)
+    return run_fetcher(conn, fetcher_specs["file_format_grant"], options)
 
 
 def fetch_integration_grants(
-    conn: SnowflakeConnection,
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
 ) -> List[SnowflakeIntegrationGrant]:
-    df = pd_execute(
-        conn,
-        "select * from snowflake.account_usage.grants_to_roles where granted_on = 'INTEGRATION' and granted_to = 'ROLE' and deleted_on is null",
-    )
-    resources = [
-        SnowflakeIntegrationGrant(
-            integration_name=p.NAME,
-            privilege=p.PRIVILEGE,
-            roles=[p.GRANTEE_NAME],
-            with_grant_option=to_bool(p.GRANT_OPTION),
-        )
-        for p in df.itertuples()
-    ]
-    return merge_resources_by_roles(resources)
-
-
-def convert_timestamp_format(timestamp_str: str) -> str:
-    timestamp = datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S%z")
-    return timestamp.strftime("%Y-%m-%dT%H:%M:%S%Z")
+    return run_fetcher(conn, fetcher_specs["integration_grant"], options)
 
 
 def fetch_resource_monitors(
-    conn: SnowflakeConnection,
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
 ) -> List[SnowflakeResourceMonitor]:
-    df = pd_execute(conn, "show resource monitors in account")
-    return [
-        SnowflakeResourceMonitor(
-            name=p.name,
-            credit_quota=p.credit_quota,
-            end_timestamp=p.end_time,
-            frequency=p.frequency,
-            notify_triggers=None,
-            notify_users=p.notify_users.split(",") if p.notify_users != "" else None,
-            start_timestamp=convert_timestamp_format(p.start_time),
-        )
-        for p in df.itertuples()
-    ]
+    return run_fetcher(conn, fetcher_specs["resource_monitor"], options)
 
 
 def fetch_resource_monitor_grants(
-    conn: SnowflakeConnection,
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
 ) -> List[SnowflakeResourceMonitorGrant]:
-    df = pd_execute(
-        conn,
-        "select * from snowflake.account_usage.grants_to_roles where granted_on = 'RESOURCE MONITOR' and granted_to = 'ROLE' and deleted_on is null",
-    )
-    resources = [
-        SnowflakeResourceMonitorGrant(
-            monitor_name=p.NAME,
-            privilege=p.PRIVILEGE,
-            roles=[p.GRANTEE_NAME],
-            with_grant_option=to_bool(p.GRANT_OPTION),
-        )
-        for p in df.itertuples()
-    ]
-    return merge_resources_by_roles(resources)
+    return run_fetcher(conn, fetcher_specs["resource_monitor_grant"], options)
 
 
-def fetch_role_grants(conn: SnowflakeConnection) -> List[SnowflakeRoleGrants]:
-    df = pd_execute(
-        conn,
-        "select * from snowflake.account_usage.grants_to_roles where granted_on = 'ROLE' and granted_to = 'ROLE' and privilege = 'USAGE' and deleted_on is null",
-    )
-    resources_to_roles = [
-        SnowflakeRoleGrants(
-            role_name=p.NAME, roles=[p.GRANTEE_NAME], enable_multiple_grants=True
-        )
-        for p in df.itertuples()
-    ]
-    merged_for_roles = merge_resources_by_roles(resources_to_roles)
-    df = pd_execute(conn, "select * from snowflake.account_usage.grants_to_users")
-    resources_to_users = [
-        SnowflakeRoleGrants(
-            role_name=p.ROLE, users=[p.GRANTEE_NAME], enable_multiple_grants=True
-        )
-        for p in df.itertuples()
-    ]
-    merged_for_users = merge_resources_by_users(resources_to_users)
+def fetch_role_grants(
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
+) -> List[SnowflakeRoleGrants]:
+    merged_for_roles = run_fetcher(conn, fetcher_specs["role_grants_to_roles"], options)
+    merged_for_users = run_fetcher(conn, fetcher_specs["role_grants_to_users"], options)
     return merged_for_roles + merged_for_users
 
 
-def fetch_schema_grants(conn: SnowflakeConnection) -> List[SnowflakeSchemaGrant]:
-    df = pd_execute(
-        conn,
-        "select * from snowflake.account_usage.grants_to_roles where granted_on = 'SCHEMA' and granted_to = 'ROLE' and deleted_on is null",
-    )
-    resources = [
-        SnowflakeSchemaGrant(
-            database_name=p.TABLE_CATALOG,
-            privilege=p.PRIVILEGE,
-            roles=[p.GRANTEE_NAME],
-            schema_name=p.TABLE_SCHEMA,
-            with_grant_option=to_bool(p.GRANT_OPTION),
-        )
-        for p in df.itertuples()
-    ]
-    return merge_resources_by_roles(resources)
+def fetch_schema_grants(
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
+) -> List[SnowflakeSchemaGrant]:
+    return run_fetcher(conn, fetcher_specs["schema_grant"], options)
 
 
-def fetch_stage_grants(conn: SnowflakeConnection) -> List[SnowflakeStageGrant]:
-    df = pd_execute(
-        conn,
-        "select * from snowflake.account_usage.grants_to_roles where granted_on = 'STAGE' and granted_to = 'ROLE' and deleted_on is null",
-    )
-    resources = [
-        SnowflakeStageGrant(
-            database_name=p.TABLE_CATALOG,
-            roles=[p.GRANTEE_NAME],
-            privilege=p.PRIVILEGE,
-            schema_name=p.TABLE_SCHEMA,
-            stage_name=p.NAME,
-            with_grant_option=to_bool(p.GRANT_OPTION),
-        )
-        for p in df.itertuples()
-    ]
-    return merge_resources_by_roles(resources)
+def fetch_stage_grants(
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
+) -> List[SnowflakeStageGrant]:
+    return run_fetcher(conn, fetcher_specs["stage_grant"], options)
 
 
-def fetch_warehouse_grants(conn: SnowflakeConnection) -> List[SnowflakeWarehouseGrant]:
-    df = pd_execute(
-        conn,
-        "select * from snowflake.account_usage.grants_to_roles where granted_on = 'WAREHOUSE' and granted_to = 'ROLE' and deleted_on is null",
-    )
-    resources = [
-        SnowflakeWarehouseGrant(
-            warehouse_name=p.NAME,
-            privilege=p.PRIVILEGE,
-            roles=[p.GRANTEE_NAME],
-            with_grant_option=to_bool(p.GRANT_OPTION),
-        )
-        for p in df.itertuples()
-    ]
-    return merge_resources_by_roles(resources)
+def fetch_warehouse_grants(
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
+) -> List[SnowflakeWarehouseGrant]:
+    return run_fetcher(conn, fetcher_specs["warehouse_grant"], options)
 
 
-def fetch_table_grants(conn: SnowflakeConnection) -> List[SnowflakeTableGrant]:
-    df = pd_execute(
-        conn,
-        "select * from snowflake.account_usage.grants_to_roles where granted_on = 'TABLE' and granted_to = 'ROLE' and deleted_on is null",
-    )
-    resources = [
-        SnowflakeTableGrant(
-            database_name=p.TABLE_CATALOG,
-            privilege=p.PRIVILEGE,
-            roles=[p.GRANTEE_NAME],
-            schema_name=p.TABLE_SCHEMA,
-            table_name=p.NAME,
-            with_grant_option=to_bool(p.GRANT_OPTION),
-        )
-        for p in df.itertuples()
-    ]
-    return merge_resources_by_roles(resources)
+def fetch_table_grants(
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
+) -> List[SnowflakeTableGrant]:
+    return run_fetcher(conn, fetcher_specs["table_grant"], options)
 
 
-def fetch_tasks(conn: SnowflakeConnection) -> List[SnowflakeTask]:
-    df = pd_execute(conn, "show tasks in account")
-    return [
-        SnowflakeTask(
-            database=p.database_name,
-            name=p.name,
-            schema=p.schema_name,
-            sql_statement=p.definition,
-            allow_overlapping_execution=p.allow_overlapping_execution,
-            comment=p.comment,
-            error_integration=p.error_integration
-            if p.error_integration is not None
-            else None,
-            schedule=p.schedule,
-            warehouse=p.warehouse,
-        )
-        for p in df.itertuples()
-    ]
+def fetch_tasks(
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
+) -> List[SnowflakeTask]:
+    return run_fetcher(conn, get_fetcher_spec("task", options), options)
 
 
-def fetch_task_grants(conn: SnowflakeConnection) -> List[SnowflakeTaskGrant]:
-    df = pd_execute(
-        conn,
-        "select * from snowflake.account_usage.grants_to_roles where granted_on = 'TASK' and granted_to = 'ROLE' and deleted_on is null",
-    )
-    resources = [
-        SnowflakeTaskGrant(
-            database_name=p.TABLE_CATALOG,
-            roles=[p.GRANTEE_NAME],
-            privilege=p.PRIVILEGE,
-            schema_name=p.TABLE_SCHEMA,
-            task_name=p.NAME,
-            with_grant_option=to_bool(p.GRANT_OPTION),
-        )
-        for p in df.itertuples()
-    ]
-    return merge_resources_by_roles(resources)
+def fetch_task_grants(
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
+) -> List[SnowflakeTaskGrant]:
+    return run_fetcher(conn, fetcher_specs["task_grant"], options)
 
 
-def fetch_user_grants(conn: SnowflakeConnection) -> List[SnowflakeUserGrant]:
-    df = pd_execute(
-        conn,
-        "select * from snowflake.account_usage.grants_to_roles where granted_on = 'USER' and granted_to = 'ROLE' and deleted_on is null",
-    )
-    resources = [
-        SnowflakeUserGrant(
-            privilege=p.PRIVILEGE,
-            user_name=p.NAME,
-            roles=[p.GRANTEE_NAME],
-            with_grant_option=to_bool(p.GRANT_OPTION),
-        )
-        for p in df.itertuples()
-    ]
-    return merge_resources_by_roles(resources)
+def fetch_user_grants(
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
+) -> List[SnowflakeUserGrant]:
+    return run_fetcher(conn, fetcher_specs["user_grant"], options)
+
+
+def fetch_tables(
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
+) -> List[SnowflakeTable]:
+    """Snowflakeのテーブル一覧を取得する(account_usageから)"""
+    return run_fetcher(conn, account_usage_specs["table"], options)
+
+
+def fetch_views(
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
+) -> List[SnowflakeView]:
+    """Snowflakeのビュー一覧を取得する(account_usageから)"""
+    return run_fetcher(conn, account_usage_specs["view"], options)
+
+
+def fetch_pipes(
+    conn: SnowflakeConnection, options: Optional[FetchOptions] = None
+) -> List[SnowflakePipe]:
+    """Snowflakeのパイプ一覧を取得する(account_usageから)"""
+    return run_fetcher(conn, account_usage_specs["pipe"], options)
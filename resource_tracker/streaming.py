@@ -0,0 +1,114 @@
+from concurrent.futures import Executor
+from typing import Iterator, List, Optional, TextIO
+from snowflake.connector import SnowflakeConnection
+from .drift import write_snapshot
+from .errors import capture_error
+from .fetch_engine import FetchOptions
+from .profiling import stage
+from .sql import default_batch_size, get_fetcher_specs, iter_fetcher_batches
+from .terraform import (
+    TfJsonWriter,
+    get_resource_names,
+    write_import_commands,
+    write_resources,
+)
+from .tfstate import TerraformStateIndex
+from .types import SnowflakeResourceT
+from .validation import ViolationReport, validate_resources
+
+
+def can_stream(resource_type_name: str, options: Optional[FetchOptions] = None) -> bool:
+    """specだけで取得できる(ストリーミングできる)種別か"""
+    return get_fetcher_specs(resource_type_name, options) is not None
+
+
+def iter_resource_batches(
+    conn: SnowflakeConnection,
+    resource_type_name: str,
+    options: Optional[FetchOptions] = None,
+    batch_size: int = default_batch_size,
+) -> Iterator[List[SnowflakeResourceT]]:
+    """1種類のリソースを、カーソルから読んだ行数程度ずつのバッチで返す"""
+    specs = get_fetcher_specs(resource_type_name, options)
+    if specs is None:
+        raise ValueError(f"Cannot stream '{resource_type_name}'")
+    for spec in specs:
+        yield from iter_fetcher_batches(conn, spec, options, batch_size)
+
+
+def write_streamed_resources(
+    file: TextIO,
+    resource_type_name: str,
+    batches: Iterator[List[SnowflakeResourceT]],
+    import_w: Optional[TextIO] = None,
+    with_import_blocks: bool = False,
+    state: Optional[TerraformStateIndex] = None,
+    snapshot_w: Optional[TextIO] = None,
+    violations: Optional[ViolationReport] = None,
+    executor: Optional[Executor] = None,
+    output_format: str = "hcl",
+) -> int:
+    """バッチごとに 検証 -> 名前付け・スナップショット -> レンダリング -> 書き出し を行い、件数を返す
+
+    保持するのは1バッチ分のリソースだけなので、メモリ使用量はリソースの総数によらない。
+    output_formatが"json"なら、すべてのバッチを1つの.tf.jsonのドキュメントとして書く。
+    """
+    # バッチごとのstageは種別全体のstageの下に入れ子にする。
+    # 最上位のstageにするとプロファイラがバッチごとにスナップショットを取ってしまう
+    with stage("stream", resource_type_name):
+        json_writer = (
+            TfJsonWriter(file, resource_type_name) if output_format == "json" else None
+        )
+        count = 0
+        while True:
+            with stage("fetch", resource_type_name):
+                try:
+                    resources = next(batches, None)
+                except Exception as e:
+                    # 取得に失敗した種別は、それまでに書き出した分で打ち切る
+                    capture_error("fetch", e)
+                    resources = None
+            if resources is None:
+                if json_writer is not None:
+                    json_writer.close()
+                return count
+            count += len(resources)
+
+            if violations is not None:
+                with stage("validate", resource_type_name):
+                    validate_resources(resource_type_name, resources, violations)
+            with stage("name", resource_type_name):
+                resource_names = get_resource_names(
+                    resource_type_name, resources, state
+                )
+            if snapshot_w is not None:
+                write_snapshot(
+                    snapshot_w, resource_type_name, resources, resource_names
+                )
+            with stage("output", resource_type_name):
+                if json_writer is not None:
+                    json_writer.write(
+                        resource_names,
+                        resources,
+                        with_import_blocks=with_import_blocks,
+                        state=state,
+                        executor=executor,
+                    )
+                else:
+                    write_resources(
+                        file,
+                        resource_type_name,
+                        resource_names,
+                        resources,
+                        with_import_blocks=with_import_blocks,
+                        state=state,
+                        executor=executor,
+                    )
+                if import_w is not None:
+                    write_import_commands(
+                        import_w,
+                        resource_type_name,
+                        resource_names,
+                        resources,
+                        state=state,
+                    )
@@ -0,0 +1,778 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+from collections import defaultdict, deque
+from concurrent.futures import Executor, Future
+from dataclasses import fields
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, TextIO, Tuple
+from uuid import uuid4
+from .errors import capture_error
+from .profiling import has_stage_observers, observe_count, stage
+from .tfstate import TerraformStateIndex, to_resource_name
+from .types import SnowflakeResourceT
+from .utils import render_resource, to_json
+
+# .tf.jsonの出力を速くするための任意の依存
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+resource_id_attr_names_map = {
+    "database": ["name"],
+    "database_grant": [
+        "database_name",
+        "privilege",
+        "with_grant_option",
+        "roles",
+        "shares",
+    ],
+    "file_format": ["database", "schema", "name"],
+    "file_format_grant": [
+        "database_name",
+        "schema_name",
+        "file_format_name",
+        "privilege",
+        "with_grant_option",
+        "on_future",
+        "on_all",
+        "roles",
+    ],
+    "integration_grant": [
+        "integration_name",
+        "privilege",
+        "with_grant_option",
+        "roles",
+    ],
+    "notification_integration": ["name"],
+    "resource_monitor": ["name"],
+    "resource_monitor_grant": [
+        "monitor_name",
+        "privilege",
+        "with_grant_option",
+        "roles",
+    ],
+    "pipe": ["database", "schema", "name"],
+    "role": ["name"],
+    "role_grants": ["role_name", "roles", "users"],
+    "schema": ["database", "name"],
+    "schema_grant": [
+        "database_name",
+        "schema_name",
+        "privilege",
+        "with_grant_option",
+        "on_future",
+        "on_all",
+        "roles",
+        "shares",
+    ],
+    "stage": ["database", "schema", "name"],
+    "stage_grant": [
+        "database_name",
+        "schema_name",
+        "stage_name",
+        "privilege",
+        "with_grant_option",
+        "on_future",
+        "on_all",
+        "roles",
+    ],
+    "storage_integration": ["name"],
+    "table": ["database", "schema", "name"],
+    "table_grant": [
+        "database_name",
+        "schema_name",
+        "table_name",
+        "privilege",
+        "with_grant_option",
+        "on_future",
+        "on_all",
+        "roles",
+        "shares",
+    ],
+    "task": ["database", "schema", "name"],
+    "task_grant": [
+        "database_name",
+        "schema_name",
+        "task_name",
+        "privilege",
+        "with_grant_option",
+        "on_future",
+        "on_all",
+        "roles",
+    ],
+    "user": ["name"],
+    "user_grant": [
+        "user_name",
+        "privilege",
+        "with_grant_option",
+        "roles",
+    ],
+    "view": ["database", "schema", "name"],
+    "warehouse": ["name"],
+    "warehouse_grant": [
+        "warehouse_name",
+        "privilege",
+        "with_grant_option",
+        "roles",
+    ],
+}
+
+# マージで集約される属性。これらの違いは同一リソースの変更として扱う
+merged_attr_names = ("roles", "users", "shares")
+
+# シャードキーの別名。リソースによって属性名が異なるものをまとめる
+shard_key_aliases = {
+    "database": ["database_name", "database"],
+    "schema": ["schema_name", "schema"],
+}
+default_shard_key = "_account"
+providers_tf = """terraform {
+  required_providers {
+    snowflake = {
+      source = "Snowflake-Labs/snowflake"
+    }
+  }
+}
+"""
+
+
+def to_tf_resource_name(resource_name):
+    return f"snowflake_{resource_name}"
+
+
+def get_resource_name(resource_type_name: str, resource: SnowflakeResourceT) -> str:
+    return (
+        resource.name
+        if resource_type_name
+        not in ["stage", "file_format", "schema", "table", "view", "pipe"]
+        and hasattr(resource, "name")
+        else "a_" + str(uuid4()).replace("-", "_")
+    )
+
+
+def get_resource_id(resource_type_name: str, resource: SnowflakeResourceT) -> str:
+    """terraform importに渡すリソースIDを返す(属性値をパイプで連結したもの)"""
+    resource_id_attr_names = resource_id_attr_names_map[resource_type_name]
+    attrs = [getattr(resource, attr_name) for attr_name in resource_id_attr_names]
+
+    resource_id_attrs = []
+    for attr in attrs:
+        if attr is None:
+            resource_id_attrs.append("false")
+        elif isinstance(attr, list):
+            resource_id_attrs.append(",".join(attr))
+        elif isinstance(attr, str):
+            resource_id_attrs.append(attr)
+        else:
+            resource_id_attrs.append(json.dumps(attr))
+
+    return "|".join(resource_id_attrs)
+
+
+def to_identity_id(resource_type_name: str, resource_id: str) -> str:
+    """importに使うIDから、マージで集約される属性(roles等)の値を除いたもの
+
+    drift.get_resource_identityと同じく、値がある集約属性は属性名に置き換えて区別する。
+    """
+    attr_names = resource_id_attr_names_map[resource_type_name]
+    parts = resource_id.split("|")
+    if len(parts) != len(attr_names):
+        # 値に区切り文字を含むIDは分解できないのでそのまま使う
+        return resource_id
+    return "|".join(
+        attr_name if attr_name in merged_attr_names and part != "false" else part
+        for [attr_name, part] in zip(attr_names, parts)
+    )
+
+
+def get_state_address(
+    state: TerraformStateIndex, resource_type_name: str, resource_id: str
+) -> Optional[str]:
+    """IDが一致するstate上のリソースのアドレス。無ければroles等を除いたIDが一致するもの
+
+    マージした権限のIDにはロールの一覧が入るため、ロールが増減しただけでIDが一致しなくなる。
+    """
+    tf_resource_type_name = to_tf_resource_name(resource_type_name)
+    address = state.get_address(tf_resource_type_name, resource_id)
+    if address is not None or not any(
+        a in merged_attr_names for a in resource_id_attr_names_map[resource_type_name]
+    ):
+        return address
+    return state.get_address_by_identity(
+        tf_resource_type_name,
+        to_identity_id(resource_type_name, resource_id),
+        lambda i: to_identity_id(resource_type_name, i),
+    )
+
+
+def render_import_block(
+    tf_resource_type_name: str, resource_name: str, resource_id: str
+) -> str:
+    """Terraform 1.5以降のimportブロックを返す"""
+    return "\n".join(
+        [
+            "import {",
+            f"  to = {tf_resource_type_name}.{resource_name}",
+            f"  id = {to_json(resource_id)}",
+            "}",
+        ]
+    )
+
+
+def get_resource_names(
+    resource_type_name: str,
+    resources: List[SnowflakeResourceT],
+    state: Optional[TerraformStateIndex] = None,
+) -> List[str]:
+    """リソース名のリストを返す。stateに同じリソースがあればその名前を再利用する
+
+    stateとの照合はget_state_addressで行う(roles等だけが違うものも同じリソースとみなす)。
+    """
+    if state is None:
+        return [get_resource_name(resource_type_name, r) for r in resources]
+
+    resource_names = []
+    for resource in resources:
+        resource_id = get_resource_id(resource_type_name, resource)
+        resource_name = to_resource_name(
+            get_state_address(state, resource_type_name, resource_id)
+        )
+        resource_names.append(
+            resource_name
+            if resource_name is not None
+            else get_resource_name(resource_type_name, resource)
+        )
+    return resource_names
+
+
+def needs_import(
+    resource_type_name: str,
+    resource_name: str,
+    resource_id: str,
+    state: Optional[TerraformStateIndex],
+) -> bool:
+    if state is None:
+        return True
+    return (
+        not state.contains(
+            to_tf_resource_name(resource_type_name), resource_name, resource_id
+        )
+        and get_state_address(state, resource_type_name, resource_id) is None
+    )
+
+
+def render_resource_chunk(
+    resource_type_name: str,
+    resource_names: List[str],
+    resources: List[SnowflakeResourceT],
+    import_ids: List[Optional[str]],
+) -> Tuple[str, List[Tuple[SnowflakeResourceT, Exception]]]:
+    """リソースのチャンクを.tfの文字列にする。プロセスプールのワーカーからも呼ばれる
+
+    import_idsの要素がNoneでないリソースには、その直後にimportブロックを付ける。
+    レンダリングできなかったリソースは飛ばし、(リソース, 例外)のリストとして一緒に返す。
+    エラーの扱いはワーカーではなく呼び出し元のErrorCollectorが決める。
+    """
+    tf_resource_type_name = to_tf_resource_name(resource_type_name)
+    texts = []
+    failures = []
+    for [resource_name, resource, import_id] in zip(
+        resource_names, resources, import_ids
+    ):
+        try:
+            text = render_resource(tf_resource_type_name, resource_name, resource)
+        except TypeError as e:
+            failures.append((resource, e))
+            continue
+
+        texts.append(text + "\n")
+        if import_id is not None:
+            texts.append(
+                render_import_block(tf_resource_type_name, resource_name, import_id)
+                + "\n"
+            )
+        texts.append("\n")
+    return ("".join(texts), failures)
+
+
+def collect_render_failures(
+    result: Tuple[Any, List[Tuple[SnowflakeResourceT, Exception]]]
+) -> Any:
+    [text, failures] = result
+    for [resource, e] in failures:
+        capture_error("render", e, resource)
+    return text
+
+
+def get_import_ids(
+    resource_type_name: str,
+    resource_names: List[str],
+    resources: List[SnowflakeResourceT],
+    with_import_blocks: bool,
+    state: Optional[TerraformStateIndex],
+) -> List[Optional[str]]:
+    """各リソースのimportブロックに使うIDを返す。importしないものはNone"""
+    if not with_import_blocks:
+        return [None] * len(resources)
+
+    import_ids = []
+    for [resource_name, resource] in zip(resource_names, resources):
+        resource_id = get_resource_id(resource_type_name, resource)
+        import_ids.append(
+            resource_id
+            if needs_import(resource_type_name, resource_name, resource_id, state)
+            else None
+        )
+    return import_ids
+
+
+def iter_rendered_chunks(
+    resource_type_name: str,
+    resource_names: List[str],
+    resources: List[SnowflakeResourceT],
+    import_ids: List[Optional[str]],
+    executor: Optional[Executor] = None,
+    chunk_size: int = 1000,
+    max_pending_chunks: int = 64,
+    render_chunk: Callable[..., tuple] = render_resource_chunk,
+) -> Iterator[Any]:
+    """リソースをチャンクごとにレンダリングし、入力順にチャンクの文字列を返す
+
+    executor(ProcessPoolExecutorなど)が与えられた場合はチャンクを並列にレンダリングする。
+    先行して投入するチャンク数をmax_pending_chunksまでに抑えるので、
+    完了したチャンクから順に書き出せばメモリ使用量は一定に収まる。
+    render_chunkは(結果, 失敗のリスト)を返す関数で、返すのはその結果(既定では.tfの文字列)。
+    """
+    chunks = zip(
+        chunked(resource_names, chunk_size),
+        chunked(resources, chunk_size),
+        chunked(import_ids, chunk_size),
+    )
+
+    if executor is None:
+        for [names, rs, ids] in chunks:
+            yield collect_render_failures(
+                render_chunk(resource_type_name, names, rs, ids)
+            )
+        return
+
+    pending: Deque[Future] = deque()
+    for [names, rs, ids] in chunks:
+        pending.append(
+            executor.submit(render_chunk, resource_type_name, names, rs, ids)
+        )
+        if len(pending) >= max_pending_chunks:
+            yield collect_render_failures(pending.popleft().result())
+    while len(pending) > 0:
+        yield collect_render_failures(pending.popleft().result())
+
+
+def write_resources(
+    file: TextIO,
+    resource_type_name: str,
+    resource_names: List[str],
+    resources: List[SnowflakeResourceT],
+    with_import_blocks: bool = False,
+    state: Optional[TerraformStateIndex] = None,
+    executor: Optional[Executor] = None,
+    chunk_size: int = 1000,
+) -> None:
+    """リソースを書き出す。with_import_blocksが真なら各リソースの直後にimportブロックも書く
+
+    stateが与えられた場合、既にstateに存在するリソースのimportブロックは書かない。
+    executorが与えられた場合はプロセスプールでレンダリングする(出力は逐次版と同一)。
+    """
+    import_ids = get_import_ids(
+        resource_type_name, resource_names, resources, with_import_blocks, state
+    )
+    chunks = iter_rendered_chunks(
+        resource_type_name,
+        resource_names,
+        resources,
+        import_ids,
+        executor=executor,
+        chunk_size=chunk_size,
+    )
+    while True:
+        with stage("render"):
+            text = next(chunks, None)
+        if text is None:
+            break
+        with stage("write"):
+            file.write(text)
+        if has_stage_observers():
+            observe_count("bytes_written", len(text.encode("utf-8")))
+
+
+def write_import_commands(
+    w: TextIO,
+    resource_type_name: str,
+    resource_names: List[str],
+    resources: List[SnowflakeResourceT],
+    state: Optional[TerraformStateIndex] = None,
+) -> None:
+    """importコマンドを書き出す。stateが与えられた場合は未インポートのものだけを書く"""
+    tf_resource_type_name = to_tf_resource_name(resource_type_name)
+    for [resource_name, resource] in zip(resource_names, resources):
+        resource_id = get_resource_id(resource_type_name, resource)
+        if not needs_import(resource_type_name, resource_name, resource_id, state):
+            continue
+        print(
+            f"terraform import '{tf_resource_type_name}.{resource_name}' '{resource_id}'",
+            file=w,
+        )
+
+
+# output_formatsの値 -> 拡張子
+tf_file_extensions = {"hcl": ".tf", "json": ".tf.json"}
+output_formats = list(tf_file_extensions)
+
+
+def encode_default(value: Any) -> Any:
+    # setはリストにする(順序を出力ごとに変えないよう並べる)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> str:
+    """1行のJSONにする。orjsonがあれば使い、無ければ標準のjsonを使う"""
+    if orjson is not None:
+        return orjson.dumps(value, default=encode_default).decode("utf-8")
+    return json.dumps(
+        value, ensure_ascii=False, separators=(",", ":"), default=encode_default
+    )
+
+
+@lru_cache(maxsize=None)
+def get_field_names(resource_class: type) -> Tuple[str, ...]:
+    return tuple(f.name for f in fields(resource_class))
+
+
+def to_tf_json_body(resource: SnowflakeResourceT) -> dict:
+    """リソースの属性名 -> 値(Noneを除く)
+
+    ブロック(BlockList/BlockSet)の値は辞書のリストのままで、Terraform JSONではそれがブロックの並びになる。
+    """
+    return {
+        name: value
+        for name in get_field_names(type(resource))
+        for value in (getattr(resource, name),)
+        if value is not None
+    }
+
+
+def render_tf_json_chunk(
+    resource_type_name: str,
+    resource_names: List[str],
+    resources: List[SnowflakeResourceT],
+    import_ids: List[Optional[str]],
+) -> Tuple[Tuple[str, str], List[Tuple[SnowflakeResourceT, Exception]]]:
+    """リソースのチャンクを、Terraform JSONの"名前": {属性}の行とimportの行にする
+
+    render_resource_chunkの.tf.json版で、プロセスプールのワーカーからも呼ばれる。
+    1リソース1行で、行は","と改行で区切る。チャンクの間の区切りはTfJsonWriterが入れる。
+    """
+    tf_resource_type_name = to_tf_resource_name(resource_type_name)
+    entries = []
+    imports = []
+    failures = []
+    for [resource_name, resource, import_id] in zip(
+        resource_names, resources, import_ids
+    ):
+        try:
+            entry = f"{dumps(resource_name)}:{dumps(to_tf_json_body(resource))}"
+        except TypeError as e:
+            failures.append((resource, e))
+            continue
+
+        entries.append(entry)
+        if import_id is not None:
+            to = f"{tf_resource_type_name}.{resource_name}"
+            imports.append(dumps({"to": to, "id": import_id}))
+    return ((",\n".join(entries), ",\n".join(imports)), failures)
+
+
+class TfJsonWriter:
+    """1種類のリソースを、1つのTerraform JSON(.tf.json)のドキュメントとして書き出す
+
+    writeを何回かに分けて呼べる(ストリーミングのバッチごとなど)。
+    importブロックはリソースの後にまとめて書くので、それまで一時ファイルに溜めておく。
+    """
+
+    def __init__(self, file: TextIO, resource_type_name: str):
+        self.file = file
+        self.resource_type_name = resource_type_name
+        self.n_resources = 0
+        self.n_imports = 0
+        self._imports: Optional[TextIO] = None
+
+    def write(
+        self,
+        resource_names: List[str],
+        resources: List[SnowflakeResourceT],
+        with_import_blocks: bool = False,
+        state: Optional[TerraformStateIndex] = None,
+        executor: Optional[Executor] = None,
+        chunk_size: int = 1000,
+    ) -> None:
+        import_ids = get_import_ids(
+            self.resource_type_name,
+            resource_names,
+            resources,
+            with_import_blocks,
+            state,
+        )
+        chunks = iter_rendered_chunks(
+            self.resource_type_name,
+            resource_names,
+            resources,
+            import_ids,
+            executor=executor,
+            chunk_size=chunk_size,
+            render_chunk=render_tf_json_chunk,
+        )
+        while True:
+            with stage("render"):
+                rendered = next(chunks, None)
+            if rendered is None:
+                break
+            [entries, imports] = rendered
+            with stage("write"):
+                text = self.write_entries(entries)
+                self.write_imports(imports)
+            if has_stage_observers():
+                observe_count("bytes_written", len(text.encode("utf-8")))
+
+    def write_entries(self, entries: str) -> str:
+        if entries == "":
+            return ""
+        if self.n_resources == 0:
+            tf_resource_type_name = to_tf_resource_name(self.resource_type_name)
+            text = f'{{"resource":{{{dumps(tf_resource_type_name)}:{{\n{entries}'
+        else:
+            text = f",\n{entries}"
+        self.file.write(text)
+        self.n_resources += entries.count("\n") + 1
+        return text
+
+    def write_imports(self, imports: str) -> None:
+        if imports == "":
+            return
+        if self._imports is None:
+            self._imports = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+        if self.n_imports > 0:
+            self._imports.write(",\n")
+        self._imports.write(imports)
+        self.n_imports += imports.count("\n") + 1
+
+    def close(self) -> None:
+        """ドキュメントを閉じる。ファイル自体は閉じない"""
+        if self.n_resources == 0:
+            self.file.write("{}\n")
+        else:
+            self.file.write("\n}}")
+            if self._imports is not None:
+                self.file.write(',"import":[\n')
+                self._imports.seek(0)
+                shutil.copyfileobj(self._imports, self.file)
+                self.file.write("\n]")
+            self.file.write("}\n")
+        if self._imports is not None:
+            self._imports.close()
+            self._imports = None
+
+
+def write_tf_json_resources(
+    file: TextIO,
+    resource_type_name: str,
+    resource_names: List[str],
+    resources: List[SnowflakeResourceT],
+    with_import_blocks: bool = False,
+    state: Optional[TerraformStateIndex] = None,
+    executor: Optional[Executor] = None,
+    chunk_size: int = 1000,
+) -> None:
+    """write_resourcesの.tf.json版。テンプレートを使わず、リソースを直接JSONにする"""
+    writer = TfJsonWriter(file, resource_type_name)
+    writer.write(
+        resource_names,
+        resources,
+        with_import_blocks=with_import_blocks,
+        state=state,
+        executor=executor,
+        chunk_size=chunk_size,
+    )
+    writer.close()
+
+
+def write_resources_as(
+    output_format: str,
+    file: TextIO,
+    resource_type_name: str,
+    resource_names: List[str],
+    resources: List[SnowflakeResourceT],
+    with_import_blocks: bool = False,
+    state: Optional[TerraformStateIndex] = None,
+    executor: Optional[Executor] = None,
+) -> None:
+    """output_format("hcl"/"json")に応じてwrite_resourcesかwrite_tf_json_resourcesで書き出す"""
+    write = write_tf_json_resources if output_format == "json" else write_resources
+    write(
+        file,
+        resource_type_name,
+        resource_names,
+        resources,
+        with_import_blocks=with_import_blocks,
+        state=state,
+        executor=executor,
+    )
+
+
+def parse_shard_by(shard_by: Optional[str]) -> List[str]:
+    """ "database,schema"のようなカンマ区切りのシャードキー指定をリストにする"""
+    if shard_by is None:
+        return []
+    return [key.strip() for key in shard_by.split(",") if key.strip() != ""]
+
+
+def get_shard_key_value(resource: SnowflakeResourceT, key: str) -> Optional[str]:
+    """シャードキーに対応する属性値を返す。属性が無いリソースではNoneを返す"""
+    for attr_name in shard_key_aliases.get(key, [key]):
+        value = getattr(resource, attr_name, None)
+        if value is not None:
+            return str(value)
+    return None
+
+
+def to_shard_name(values: List[Optional[str]]) -> str:
+    """属性値のリストからファイル名・ディレクトリ名に使えるシャード名を作る"""
+    names = [
+        re.sub("[^0-9a-z]+", "_", value.lower()).strip("_")
+        for value in values
+        if value is not None
+    ]
+    names = [name for name in names if name != ""]
+    return "__".join(names) if len(names) > 0 else default_shard_key
+
+
+def chunked(items: List, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+
+def shard_resources(
+    resource_names: List[str],
+    resources: List[SnowflakeResourceT],
+    shard_by: List[str],
+    max_resources_per_shard: Optional[int] = None,
+) -> Dict[str, List[Tuple[str, SnowflakeResourceT]]]:
+    """リソースをシャードキーごとにまとめ、必要なら最大件数ごとにさらに分割する
+
+    シャードの順序と各シャード内のリソースの順序は入力順を保つ。
+    """
+    groups: Dict[str, List[Tuple[str, SnowflakeResourceT]]] = defaultdict(list)
+    for [resource_name, resource] in zip(resource_names, resources):
+        values = [get_shard_key_value(resource, key) for key in shard_by]
+        groups[to_shard_name(values)].append((resource_name, resource))
+
+    if max_resources_per_shard is None:
+        return dict(groups)
+
+    shards = {}
+    for [shard_name, items] in groups.items():
+        if len(items) <= max_resources_per_shard:
+            shards[shard_name] = items
+        else:
+            for [i, chunk] in enumerate(chunked(items, max_resources_per_shard)):
+                shards[f"{shard_name}__{i + 1:04d}"] = chunk
+    return shards
+
+
+def get_shard_dir(
+    output_dir: str, resource_type_name: str, shard_name: str, as_modules: bool
+) -> str:
+    """シャードの出力先ディレクトリを返す
+
+    as_modulesが真の場合はシャードごとに独立したルートモジュール(=独立したstate)にする。
+    偽の場合は従来通りoutput_dir直下(=1つのルートモジュール)に置く。
+    """
+    if as_modules:
+        return os.path.join(output_dir, resource_type_name, shard_name)
+    else:
+        return output_dir
+
+
+def write_sharded_resources(
+    output_dir: str,
+    resource_type_name: str,
+    resource_names: List[str],
+    resources: List[SnowflakeResourceT],
+    shard_by: List[str],
+    max_resources_per_shard: Optional[int] = None,
+    as_modules: bool = False,
+    with_import_blocks: bool = False,
+    state: Optional[TerraformStateIndex] = None,
+    executor: Optional[Executor] = None,
+    output_format: str = "hcl",
+) -> Dict[str, Tuple[List[str], List[SnowflakeResourceT]]]:
+    """リソースをシャードに分けて書き出す
+
+    - as_modulesが偽: outputs/<type>__<shard>.tf
+    - as_modulesが真: outputs/<type>/<shard>/main.tf (+ providers.tf)
+
+    output_formatが"json"なら.tfの代わりに.tf.jsonにする(providers.tfはそのまま)。
+
+    シャードの出力先ディレクトリから(リソース名のリスト, リソースのリスト)への辞書を返す。
+    """
+    shards = shard_resources(
+        resource_names, resources, shard_by, max_resources_per_shard
+    )
+    written: Dict[str, Tuple[List[str], List[SnowflakeResourceT]]] = {}
+    extension = tf_file_extensions[output_format]
+
+    for [shard_name, items] in shards.items():
+        shard_dir = get_shard_dir(
+            output_dir, resource_type_name, shard_name, as_modules
+        )
+        os.makedirs(shard_dir, exist_ok=True)
+
+        if as_modules:
+            tf_path = os.path.join(shard_dir, f"main{extension}")
+            with open(
+                os.path.join(shard_dir, "providers.tf"), mode="w", encoding="utf-8"
+            ) as w:
+                w.write(providers_tf)
+        else:
+            tf_path = os.path.join(
+                shard_dir, f"{resource_type_name}__{shard_name}{extension}"
+            )
+
+        shard_resource_names = [resource_name for [resource_name, _] in items]
+        shard_resources_ = [resource for [_, resource] in items]
+        with open(tf_path, mode="w", encoding="utf-8") as w:
+            write_resources_as(
+                output_format,
+                w,
+                resource_type_name,
+                shard_resource_names,
+                shard_resources_,
+                with_import_blocks=with_import_blocks,
+                state=state,
+                executor=executor,
+            )
+
+        [names, rs] = written.setdefault(shard_dir, ([], []))
+        names.extend(shard_resource_names)
+        rs.extend(shard_resources_)
+
+    return written
@@ -0,0 +1,136 @@
+import json
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+
+@dataclass
+class TerraformStateIndex:
+    """terraform.tfstate(またはterraform show -jsonの出力)のリソースを引けるようにしたもの"""
+
+    # "snowflake_schema_grant.foo" のようなアドレスの集合
+    addresses: Set[str] = field(default_factory=set)
+    # (リソースタイプ, importに使うID) -> アドレス
+    ids: Dict[Tuple[str, str], str] = field(default_factory=dict)
+    # リソースタイプ -> IDをget_address_by_identityのto_identityで変換したもの -> アドレス
+    # 変換後のキーが重複するものはNone。idsから必要になったときに作る
+    identities: Dict[str, Dict[str, Optional[str]]] = field(
+        default_factory=dict, repr=False, compare=False
+    )
+
+    def add(self, address: str, tf_resource_type_name: str, resource_id: Optional[str]):
+        self.addresses.add(address)
+        if resource_id is not None:
+            self.ids[(tf_resource_type_name, resource_id)] = address
+            self.identities.pop(tf_resource_type_name, None)
+
+    def merge(self, other: "TerraformStateIndex") -> "TerraformStateIndex":
+        self.addresses |= other.addresses
+        self.ids.update(other.ids)
+        self.identities.clear()
+        return self
+
+    def get_address(
+        self, tf_resource_type_name: str, resource_id: str
+    ) -> Optional[str]:
+        return self.ids.get((tf_resource_type_name, resource_id))
+
+    def get_address_by_identity(
+        self,
+        tf_resource_type_name: str,
+        identity: str,
+        to_identity: Callable[[str], str],
+    ) -> Optional[str]:
+        """IDをto_identityで変換した値がidentityと一致するstate上のリソースのアドレスを返す
+
+        一致するものが複数あれば、どれを使うべきか決められないのでNoneを返す。
+        """
+        addresses = self.identities.get(tf_resource_type_name)
+        if addresses is None:
+            addresses = {}
+            for [[typ, resource_id], address] in self.ids.items():
+                if typ != tf_resource_type_name:
+                    continue
+                key = to_identity(resource_id)
+                addresses[key] = address if key not in addresses else None
+            self.identities[tf_resource_type_name] = addresses
+        return addresses.get(identity)
+
+    def get_resource_name(
+        self, tf_resource_type_name: str, resource_id: str
+    ) -> Optional[str]:
+        """IDが一致するstate上のリソースの名前(アドレスの最後の要素)を返す"""
+        return to_resource_name(self.get_address(tf_resource_type_name, resource_id))
+
+    def contains(
+        self, tf_resource_type_name: str, resource_name: str, resource_id: str
+    ) -> bool:
+        """アドレスかIDのどちらかがstateに存在するかどうかを返す"""
+        return (
+            f"{tf_resource_type_name}.{resource_name}" in self.addresses
+            or (tf_resource_type_name, resource_id) in self.ids
+        )
+
+
+def to_resource_name(address: Optional[str]) -> Optional[str]:
+    """アドレスの最後の要素を、.tfでのリソース名として再利用できる場合に返す"""
+    if address is None:
+        return None
+    name = address.rsplit(".", 1)[-1]
+    # count/for_eachで作られたものは名前として再利用できない
+    return name if "[" not in name else None
+
+
+def format_index_key(index_key) -> str:
+    return f"[{json.dumps(index_key)}]" if index_key is not None else ""
+
+
+def iter_tfstate_resources(state: dict) -> Iterator[Tuple[str, str, Optional[str]]]:
+    """terraform.tfstate(version 4)から(アドレス, タイプ, ID)を列挙する"""
+    for resource in state.get("resources", []):
+        if resource.get("mode", "managed") != "managed":
+            continue
+        module = resource.get("module")
+        prefix = f"{module}." if module else ""
+        for instance in resource.get("instances", []):
+            address = (
+                prefix
+                + f"{resource['type']}.{resource['name']}"
+                + format_index_key(instance.get("index_key"))
+            )
+            yield (address, resource["type"], instance.get("attributes", {}).get("id"))
+
+
+def iter_show_json_resources(module: dict) -> Iterator[Tuple[str, str, Optional[str]]]:
+    """terraform show -jsonの出力(values.root_module)から(アドレス, タイプ, ID)を列挙する"""
+    for resource in module.get("resources", []):
+        if resource.get("mode", "managed") != "managed":
+            continue
+        yield (resource["address"], resource["type"], resource["values"].get("id"))
+    for child in module.get("child_modules", []):
+        yield from iter_show_json_resources(child)
+
+
+def index_terraform_state(state: dict) -> TerraformStateIndex:
+    index = TerraformStateIndex()
+    if "values" in state:
+        resources = iter_show_json_resources(state["values"].get("root_module", {}))
+    else:
+        resources = iter_tfstate_resources(state)
+
+    for [address, tf_resource_type_name, resource_id] in resources:
+        index.add(address, tf_resource_type_name, resource_id)
+    return index
+
+
+def load_terraform_state(path: str) -> TerraformStateIndex:
+    """terraform.tfstateまたはterraform show -jsonの出力ファイルを読み込む"""
+    with open(path, encoding="utf-8") as r:
+        return index_terraform_state(json.load(r))
+
+
+def load_terraform_states(paths: List[str]) -> TerraformStateIndex:
+    """複数のstate(シャードごとのモジュールなど)を1つのインデックスにまとめる"""
+    index = TerraformStateIndex()
+    for path in paths:
+        index.merge(load_terraform_state(path))
+    return index
@@ -0,0 +1,182 @@
+import json
+import os
+import sys
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, asdict
+from typing import Dict, Iterator, List, Optional, TextIO
+
+# 実行中のfetch_*関数の名前。トレースの集計キーになる
+current_fetcher: ContextVar[Optional[str]] = ContextVar("current_fetcher", default=None)
+# query_history_by_sessionのresult_limitの上限
+query_history_page_size = 10000
+
+
+@contextmanager
+def fetcher_context(fetcher_name: str) -> Iterator[None]:
+    token = current_fetcher.set(fetcher_name)
+    try:
+        yield
+    finally:
+        current_fetcher.reset(token)
+
+
+@dataclass
+class QueryTrace:
+    """1回のクエリ実行の記録"""
+
+    sql: str
+    fetcher: Optional[str]
+    query_id: Optional[str]
+    started_at: float
+    execute_seconds: float
+    fetch_seconds: float
+    dataframe_seconds: float
+    row_count: int
+    approx_bytes: int
+    # 以下はresolve_server_timingsで query_history から埋める(ミリ秒)
+    queued_ms: Optional[int] = None
+    execution_ms: Optional[int] = None
+
+    @property
+    def total_seconds(self) -> float:
+        return self.execute_seconds + self.fetch_seconds + self.dataframe_seconds
+
+
+def query_history_sql(end_ms: Optional[int], page_size: int) -> str:
+    """セッションのクエリ履歴のうち、end_ms(エポックミリ秒)までに終わったものを新しい順に取得する"""
+    end_range = (
+        f"end_time_range_end => to_timestamp_ltz({end_ms}, 3), "
+        if end_ms is not None
+        else ""
+    )
+    return (
+        "select query_id,"
+        " queued_provisioning_time + queued_repair_time + queued_overload_time,"
+        " execution_time, date_part(epoch_millisecond, end_time)"
+        " from table(information_schema.query_history_by_session("
+        f"{end_range}result_limit => {page_size}))"
+        " order by end_time desc"
+    )
+
+
+class QueryTracer:
+    """pd_executeから呼ばれ、クエリごとの時間と件数を集める
+
+    pathを与えた場合は記録するたびにJSON Linesで追記するので、途中で失敗しても
+    それまでのトレースが残る。close時にサーバ側の時間を埋めた内容で書き直す。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.traces: List[QueryTrace] = []
+        self._lock = threading.Lock()
+        self._file: Optional[TextIO] = (
+            open(path, mode="w", encoding="utf-8") if path is not None else None
+        )
+
+    def record(self, trace: QueryTrace) -> None:
+        with self._lock:
+            self.traces.append(trace)
+            if self._file is not None:
+                print(json.dumps(asdict(trace), ensure_ascii=False), file=self._file)
+                self._file.flush()
+
+    def resolve_server_timings(
+        self, conn, page_size: int = query_history_page_size
+    ) -> None:
+        """Snowflake側のキュー待ち時間と実行時間を、セッションのクエリ履歴から取得する
+
+        1回に取得できる履歴はpage_size件までなので、記録したクエリがすべて見つかるか、
+        トレースを始める前の履歴に達するまで、終了時刻をさかのぼってページごとに取得する。
+        """
+        pending = {t.query_id: t for t in self.traces if t.query_id is not None}
+        if len(pending) == 0:
+            return
+        since_ms = int(min(t.started_at for t in pending.values()) * 1000)
+
+        end_ms: Optional[int] = None
+        try:
+            while len(pending) > 0:
+                cur = conn.cursor()
+                cur.execute(query_history_sql(end_ms, page_size))
+                rows = cur.fetchall()
+                for [query_id, queued_ms, execution_ms, _] in rows:
+                    trace = pending.pop(query_id, None)
+                    if trace is not None:
+                        trace.queued_ms = queued_ms
+                        trace.execution_ms = execution_ms
+                if len(rows) < page_size:
+                    break
+                # 同じ時刻に終わったクエリを取りこぼさないよう、最も古い終了時刻も範囲に含める
+                oldest_ms = min(row[3] for row in rows)
+                if oldest_ms < since_ms or (end_ms is not None and oldest_ms >= end_ms):
+                    break
+                end_ms = oldest_ms
+        except Exception as e:
+            print(f"Failed to resolve server timings: {e}", file=sys.stderr)
+
+    def summary(self) -> List[dict]:
+        """fetcherごとの集計(合計時間の降順)"""
+        groups: Dict[Optional[str], List[QueryTrace]] = defaultdict(list)
+        for trace in self.traces:
+            groups[trace.fetcher].append(trace)
+
+        rows = [
+            {
+                "fetcher": fetcher if fetcher is not None else "-",
+                "queries": len(traces),
+                "rows": sum(t.row_count for t in traces),
+                "execute_seconds": sum(t.execute_seconds for t in traces),
+                "fetch_seconds": sum(t.fetch_seconds for t in traces),
+                "dataframe_seconds": sum(t.dataframe_seconds for t in traces),
+                "total_seconds": sum(t.total_seconds for t in traces),
+                "queued_seconds": sum(t.queued_ms or 0 for t in traces) / 1000,
+                "execution_seconds": sum(t.execution_ms or 0 for t in traces) / 1000,
+                "approx_bytes": sum(t.approx_bytes for t in traces),
+            }
+            for [fetcher, traces] in groups.items()
+        ]
+        return sorted(rows, key=lambda row: row["total_seconds"], reverse=True)
+
+    def write_summary(self, file: TextIO = sys.stderr) -> None:
+        print(
+            f"{'fetcher':<40} {'queries':>8} {'rows':>10} {'execute':>9}"
+            f" {'fetch':>9} {'frame':>9} {'queued':>9} {'server':>9} {'MiB':>9}",
+            file=file,
+        )
+        for row in self.summary():
+            print(
+                f"{row['fetcher']:<40} {row['queries']:>8} {row['rows']:>10}"
+                f" {row['execute_seconds']:>9.2f} {row['fetch_seconds']:>9.2f}"
+                f" {row['dataframe_seconds']:>9.2f} {row['queued_seconds']:>9.2f}"
+                f" {row['execution_seconds']:>9.2f}"
+                f" {row['approx_bytes'] / 1024 / 1024:>9.1f}",
+                file=file,
+            )
+
+    def close(self) -> None:
+        """追記していたファイルを閉じ、サーバ側の時間を埋めた内容で置き換える"""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, mode="w", encoding="utf-8") as w:
+            for trace in self.traces:
+                print(json.dumps(asdict(trace), ensure_ascii=False), file=w)
+        os.replace(tmp_path, self.path)
+
+
+query_tracer: Optional[QueryTracer] = None
+
+
+def set_query_tracer(tracer: Optional[QueryTracer]) -> None:
+    global query_tracer
+    query_tracer = tracer
+
+
+def get_query_tracer() -> Optional[QueryTracer]:
+    return query_tracer
@@ -3,8 +3,9 @@ import IPython as ipy
 from dataclasses import dataclass, asdict
 from operator import add
 from functools import partial, reduce
-from typing import List, Optional, TypeAlias, Callable, TypeVar
+from typing import Any, Dict, List, Optional, TypeAlias, Callable, TypeVar
 from numbers import Number
+from .profiling import stage
 
 ReadOnly: TypeAlias = Optional
 
@@ -27,6 +28,23 @@ class Block:
     pass
 
 
+def to_hashable(value: Any) -> Any:
+    """辞書やリストを含む値を、等しさを保ったままハッシュできる値にする"""
+    if isinstance(value, (list, tuple)):
+        return tuple(to_hashable(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(to_hashable(v) for v in value)
+    if isinstance(value, dict):
+        return frozenset((k, to_hashable(v)) for [k, v] in value.items())
+    return value
+
+
+def sort_merged_values(values: list) -> list:
+    """まとめたロール名などのリスト。Snowflake側の集約(ARRAY_AGG ... WITHIN GROUP
+    (ORDER BY ...))と同じになるよう、Noneを除いて昇順に並べる"""
+    return sorted(v for v in values if v is not None)
+
+
 def dict_except_keys(d, except_keys):
     return dict(((k, v) for [k, v] in d.items() if k not in except_keys))
 
@@ -57,40 +75,46 @@ class SnowflakeResource:
     def band(
         rs: List[SnowflakeResourceT], except_key: str
     ) -> List[List[SnowflakeResourceT]]:
-        """except_key以外の属性が等しいrs内の要素をグルーピングする"""
-        if len(rs) > 0:
-            indice = [
-                i
-                for [i, r] in enumerate(rs)
-                if SnowflakeResource.equals_except(rs[0], r, [except_key])
-            ]
-            targets = [r for [i, r] in enumerate(rs) if i in indice]
-            rest = [r for [i, r] in enumerate(rs) if i not in indice]
-            return [targets] + SnowflakeResource.band(rest, except_key=except_key)
-        else:
-            return []
+        """except_key以外の属性が等しいrs内の要素をグルーピングする(グループの順序は出現順)"""
+        bands: Dict[Any, List[SnowflakeResourceT]] = {}
+        for r in rs:
+            key = (type(r),) + tuple(
+                to_hashable(getattr(r, f.name))
+                for f in dataclasses.fields(r)
+                if f.name != except_key
+            )
+            bands.setdefault(key, []).append(r)
+        return list(bands.values())
+
+
+def merge_band(band: List[SnowflakeResourceT], key: str) -> SnowflakeResourceT:
+    """bandの要素のkeyを連結し、sort_merged_valuesで並べた1つのリソースにする"""
+    merged = reduce(partial(SnowflakeResource.merge_field, key=key), band)
+    return dataclasses.replace(
+        merged, **{key: sort_merged_values(getattr(merged, key))}
+    )
 
 
 def merge_resources_by_roles(
     resources: List[SnowflakeResourceT],
 ) -> List[SnowflakeResourceT]:
     key = "roles"
-    bands = SnowflakeResource.band(resources, except_key=key)
-    merge_field = partial(SnowflakeResource.merge_field, key=key)
-    return [reduce(merge_field, band) for band in bands]
+    with stage("merge"):
+        bands = SnowflakeResource.band(resources, except_key=key)
+        return [merge_band(band, key) for band in bands]
 
 
 def merge_resources_by_users(
     resources: List[SnowflakeResourceT],
 ) -> List[SnowflakeResourceT]:
     key = "users"
-    bands = SnowflakeResource.band(resources, except_key=key)
-    merge_field = partial(SnowflakeResource.merge_field, key=key)
-    return [reduce(merge_field, band) for band in bands]
+    with stage("merge"):
+        bands = SnowflakeResource.band(resources, except_key=key)
+        return [merge_band(band, key) for band in bands]
 
 
 # ----------------------------------------------------------------------
-# 以下はgenerate_resource_schemas.pyで生成されたもの
+# 以下はresource-tracker generate(codegen.py)で生成されたもの
 # ----------------------------------------------------------------------
 
 
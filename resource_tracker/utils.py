@@ -1,10 +1,11 @@
 import json
 import re
 import IPython as ipy
-from dataclasses import asdict
-from typing import Any, List, Tuple, Optional
+from dataclasses import asdict, fields
+from functools import lru_cache
+from typing import Any, FrozenSet, List, Tuple, Optional, get_args
 from jinja2 import Environment, FileSystemLoader, Template
-from .types import SnowflakeResourceT
+from .types import BlockList, BlockSet, SnowflakeResourceT
 
 
 def camel_case_to_snake_case(text: str) -> str:
@@ -24,6 +25,7 @@ def to_json(value: Any) -> str:
     return json.dumps(value, ensure_ascii=False)
 
 
+@lru_cache(maxsize=None)
 def get_template(template_path: str) -> Template:
     env = Environment(loader=FileSystemLoader("./data"))
     env.filters["to_json"] = to_json
@@ -40,13 +42,37 @@ def dict_factory_without_none(items: List[Tuple[str, Any]]) -> dict[Any, Any]:
     return {k: v for [k, v] in items if not v is None}
 
 
+@lru_cache(maxsize=None)
+def get_block_attr_names(resource_class: type) -> FrozenSet[str]:
+    """BlockList/BlockSet型(Optionalを含む)の属性名。.tfでは属性ではなくブロックとして書く"""
+    block_types = (BlockList, BlockSet)
+    return frozenset(
+        f.name
+        for f in fields(resource_class)
+        if f.type in block_types or any(t in block_types for t in get_args(f.type))
+    )
+
+
 def render_resource(
     resource_type_name: str, resource_name: str, resource: SnowflakeResourceT
 ) -> str:
-    template = get_template("snowflake_resource.tf.jinja")
     attr = asdict(resource, dict_factory=dict_factory_without_none)
+    return render_attrs(resource_type_name, resource_name, type(resource), attr)
+
+
+def render_attrs(
+    resource_type_name: str, resource_name: str, resource_class: type, attr: dict
+) -> str:
+    """属性名 -> 値(Noneを除いたもの)の辞書からリソースを.tfの文字列にする"""
+    template = get_template("snowflake_resource.tf.jinja")
+    # ブロックの値は辞書のリスト。要素ごとに1つのブロックにする
+    block_attr_names = get_block_attr_names(resource_class)
+    blocks = {k: attr.pop(k) for k in list(attr) if k in block_attr_names}
     return template.render(
-        resource_type_name=resource_type_name, name=resource_name, attr=attr
+        resource_type_name=resource_type_name,
+        name=resource_name,
+        attr=attr,
+        blocks=blocks,
     )
 
 
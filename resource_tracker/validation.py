@@ -0,0 +1,278 @@
+import json
+import sys
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from itertools import chain
+from operator import attrgetter
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, TextIO, Tuple
+from .drift import get_resource_class
+from .errors import to_jsonable_row
+from .types import SnowflakeResourceT
+
+# resource-tracker scrape(provider_docs.write_resource_schemas)の出力
+resource_schemas_path = "data/resources.jsonl"
+
+
+def is_number_string(value: Any) -> bool:
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return True
+
+
+def is_number(value: Any) -> bool:
+    # boolはintのサブクラスだが、数値としては受け付けない
+    if type(value) in (int, float):
+        return True
+    # Terraformは文字列の"1"を数値に変換する
+    return isinstance(value, str) and is_number_string(value)
+
+
+def is_bool(value: Any) -> bool:
+    if type(value) is bool:
+        return True
+    return isinstance(value, str) and value.lower() in ("true", "false")
+
+
+def is_string(value: Any) -> bool:
+    return isinstance(value, str)
+
+
+def is_block(value: Any) -> bool:
+    return isinstance(value, dict)
+
+
+def collection_of(
+    collection_types: Tuple[type, ...], element_check: Callable[[Any], bool]
+) -> Callable[[Any], bool]:
+    def check(value: Any) -> bool:
+        return isinstance(value, collection_types) and all(
+            element_check(element) for element in value
+        )
+
+    return check
+
+
+# スキーマの型 -> 値の検査
+value_checks_map: Dict[str, Callable[[Any], bool]] = {
+    "String": is_string,
+    "Number": is_number,
+    "Boolean": is_bool,
+    "List of String": collection_of((list, tuple), is_string),
+    "Set of String": collection_of((list, tuple, set, frozenset), is_string),
+    "Set of Number": collection_of((list, tuple, set, frozenset), is_number),
+    "Map of String": lambda value: isinstance(value, (dict, list)),
+    "Block List": collection_of((list, tuple), is_block),
+    "Block Set": collection_of((list, tuple, set, frozenset), is_block),
+    "Block": lambda value: isinstance(value, (dict, list)),
+}
+# スキーマの型 -> 値を見なくても正しいと分かるPythonの型
+trusted_types_map: Dict[str, FrozenSet[type]] = {
+    "String": frozenset([str]),
+    "Number": frozenset([int, float]),
+    "Boolean": frozenset([bool]),
+    "List of String": frozenset([list, tuple]),
+    "Set of String": frozenset([list, tuple, set, frozenset]),
+    "Set of Number": frozenset([list, tuple, set, frozenset]),
+    "Block List": frozenset([list, tuple]),
+    "Block Set": frozenset([list, tuple, set, frozenset]),
+}
+# コレクションの型 -> 要素の値を見なくても正しいと分かるPythonの型
+trusted_element_types_map: Dict[str, FrozenSet[type]] = {
+    "List of String": frozenset([str]),
+    "Set of String": frozenset([str]),
+    "Set of Number": frozenset([int, float]),
+    "Block List": frozenset([dict]),
+    "Block Set": frozenset([dict]),
+}
+
+
+@dataclass
+class AttributeCheck:
+    """スキーマから組み立てた1つの属性の検査"""
+
+    attr_name: str
+    required: bool
+    value_check: Optional[Callable[[Any], bool]]
+    trusted_types: FrozenSet[type]
+    trusted_element_types: Optional[FrozenSet[type]]
+    min: Optional[int]
+    max: Optional[int]
+
+    def find_violations(self, values: List[Any]) -> List[Tuple[str, List[int]]]:
+        """列の値を検査し、(違反の種類, 違反した行の位置)のリストを返す
+
+        列の値の型(コレクションなら要素の型も)がすべてtrusted_types(trusted_element_types)に
+        含まれるなら、値ごとの検査は行わない。
+        """
+        violations = []
+        if self.required and None in values:
+            violations.append(
+                ("required", [i for [i, v] in enumerate(values) if v is None])
+            )
+
+        value_types = set(map(type, values))
+        value_types.discard(type(None))
+        trusted = value_types <= self.trusted_types
+        if trusted and self.trusted_element_types is not None:
+            # Noneと空のコレクションは要素を持たないので除いてよい
+            element_types = set(map(type, chain.from_iterable(filter(None, values))))
+            trusted = element_types <= self.trusted_element_types
+        if self.value_check is not None and not trusted:
+            value_check = self.value_check
+            invalid = [
+                i
+                for [i, v] in enumerate(values)
+                if v is not None and not value_check(v)
+            ]
+            if len(invalid) > 0:
+                violations.append(("type", invalid))
+
+        # min/maxはブロックの数の制約
+        if self.min is not None:
+            too_few = [
+                i
+                for [i, v] in enumerate(values)
+                if isinstance(v, (list, tuple)) and len(v) < self.min
+            ]
+            if len(too_few) > 0:
+                violations.append(("min", too_few))
+        if self.max is not None:
+            too_many = [
+                i
+                for [i, v] in enumerate(values)
+                if isinstance(v, (list, tuple)) and len(v) > self.max
+            ]
+            if len(too_many) > 0:
+                violations.append(("max", too_many))
+        return violations
+
+
+@lru_cache(maxsize=None)
+def load_resource_schemas(path: str = resource_schemas_path) -> Dict[str, dict]:
+    """リソース種別 -> 属性名 -> 属性のスキーマ"""
+    schemas = {}
+    with open(path, encoding="utf-8") as r:
+        for line in r:
+            schema = json.loads(line)
+            schemas[schema["name"]] = {a["name"]: a for a in schema["attributes"]}
+    return schemas
+
+
+class ViolationReport:
+    """違反を(リソース種別, 属性, 種類)ごとに数え、いくつかの例と一緒に書き出す"""
+
+    def __init__(self, max_examples: int = 5):
+        self.max_examples = max_examples
+        self.counts: Dict[Tuple[str, str, str], int] = {}
+        self.examples: Dict[Tuple[str, str, str], List[Any]] = {}
+        self.checked: Dict[str, int] = {}
+
+    def add(
+        self,
+        resource_type_name: str,
+        attr_name: str,
+        kind: str,
+        resources: List[SnowflakeResourceT],
+    ) -> None:
+        key = (resource_type_name, attr_name, kind)
+        self.counts[key] = self.counts.get(key, 0) + len(resources)
+        examples = self.examples.setdefault(key, [])
+        for resource in resources[: self.max_examples - len(examples)]:
+            examples.append(to_jsonable_row(resource))
+
+    def count(self) -> int:
+        return sum(self.counts.values())
+
+    def write_report(self, path: str) -> None:
+        """違反の集計をJSON Linesで書き出す"""
+        with open(path, mode="w", encoding="utf-8") as w:
+            for [[resource_type_name, attr_name, kind], n] in sorted(
+                self.counts.items()
+            ):
+                record = {
+                    "resource_type": resource_type_name,
+                    "attr": attr_name,
+                    "kind": kind,
+                    "count": n,
+                    "examples": self.examples[(resource_type_name, attr_name, kind)],
+                }
+                print(json.dumps(record, ensure_ascii=False, default=str), file=w)
+
+    def write_summary(self, file: TextIO = sys.stderr) -> None:
+        if len(self.counts) == 0:
+            return
+        print(f"{self.count()} schema violations were found:", file=file)
+        for [[resource_type_name, attr_name, kind], n] in sorted(self.counts.items()):
+            print(
+                f"  {resource_type_name:<28} {attr_name:<28} {kind:<10} {n:>8}",
+                file=file,
+            )
+
+
+class ResourceValidator:
+    """1つのリソース種別の検証
+
+    スキーマから属性ごとの検査を組み立てておき、リソースのリストを属性(列)ごとにまとめて検査する。
+    """
+
+    def __init__(self, resource_type_name: str, checks: List[AttributeCheck]):
+        self.resource_type_name = resource_type_name
+        self.checks = checks
+
+    @staticmethod
+    def compile(
+        resource_type_name: str, schemas: Optional[Dict[str, dict]] = None
+    ) -> "ResourceValidator":
+        if schemas is None:
+            schemas = load_resource_schemas()
+        attr_schemas = schemas.get(resource_type_name, {})
+        checks = []
+        for f in fields(get_resource_class(resource_type_name)):
+            attr_schema = attr_schemas.get(f.name)
+            if attr_schema is None:
+                continue
+            type_name = attr_schema["type"]
+            checks.append(
+                AttributeCheck(
+                    attr_name=f.name,
+                    required=attr_schema["required"],
+                    value_check=value_checks_map.get(type_name),
+                    trusted_types=trusted_types_map.get(type_name, frozenset()),
+                    trusted_element_types=trusted_element_types_map.get(type_name),
+                    min=attr_schema["min"],
+                    max=attr_schema["max"],
+                )
+            )
+        return ResourceValidator(resource_type_name, checks)
+
+    def validate(
+        self, resources: List[SnowflakeResourceT], report: ViolationReport
+    ) -> None:
+        report.checked[self.resource_type_name] = report.checked.get(
+            self.resource_type_name, 0
+        ) + len(resources)
+        for check in self.checks:
+            values = list(map(attrgetter(check.attr_name), resources))
+            for [kind, indices] in check.find_violations(values):
+                report.add(
+                    self.resource_type_name,
+                    check.attr_name,
+                    kind,
+                    [resources[i] for i in indices],
+                )
+
+
+@lru_cache(maxsize=None)
+def get_validator(resource_type_name: str) -> ResourceValidator:
+    return ResourceValidator.compile(resource_type_name)
+
+
+def validate_resources(
+    resource_type_name: str,
+    resources: List[SnowflakeResourceT],
+    report: ViolationReport,
+) -> None:
+    """リソースのリストをスキーマ(data/resources.jsonl)で検査し、違反をreportに加える"""
+    get_validator(resource_type_name).validate(resources, report)
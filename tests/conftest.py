@@ -0,0 +1,15 @@
+import os
+import pytest
+from resource_tracker import set_error_collector, set_query_tracer
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def in_repo_dir(monkeypatch):
+    """テンプレート(data/*.jinja)とスキーマ(data/resources.jsonl)は作業ディレクトリから読む"""
+    monkeypatch.chdir(repo_dir)
+    yield
+    # run_export等が設定したプロセス全体の状態を次のテストに持ち越さない
+    set_error_collector(None)
+    set_query_tracer(None)
@@ -0,0 +1,110 @@
+from resource_tracker import (
+    ExportConfig,
+    ExportDaemon,
+    QueryRecording,
+    ReplayConnection,
+    get_error_collector,
+    get_query_tracer,
+    read_snapshot,
+    stage_observers,
+)
+
+warehouse_grants_sql = (
+    "select * from snowflake.account_usage.grants_to_roles where granted_on ="
+    " 'WAREHOUSE' and granted_to = 'ROLE' and deleted_on is null"
+)
+
+
+def make_daemon(tmp_path, conn) -> ExportDaemon:
+    config = ExportConfig.from_env(
+        {
+            "RESOURCE_TRACKER_FETCH_SOURCE": "account_usage",
+            "RESOURCE_TRACKER_METRICS": str(tmp_path / "metrics.txt"),
+        }
+    )
+    config.resource_types = ["warehouse_grant"]
+    config.output_dir = str(tmp_path / "outputs")
+    return ExportDaemon(config, environ={}, conn=conn)
+
+
+def test_failed_export_does_not_leak_process_state(tmp_path):
+    # 記録がないのでfetchで失敗する
+    daemon = make_daemon(tmp_path, ReplayConnection([]))
+    response = daemon.handle({"command": "export"})
+
+    assert response["ok"] is False
+    assert "ReplayMissError" in response["error"]
+    assert stage_observers == []
+    assert get_query_tracer() is None
+    assert get_error_collector() is None
+
+
+def test_export_and_diff_reset_process_state(tmp_path):
+    rows = [["W0", "USAGE", "R0", "False"]]
+    columns = ["NAME", "PRIVILEGE", "GRANTEE_NAME", "GRANT_OPTION"]
+    conn = ReplayConnection([QueryRecording(warehouse_grants_sql, columns, rows)])
+    daemon = make_daemon(tmp_path, conn)
+    response = daemon.handle({"command": "export"})
+    assert response["ok"] is True
+    assert response["counts"] == {"warehouse_grant": 1}
+    assert stage_observers == []
+    assert get_query_tracer() is None
+    assert get_error_collector() is None
+
+    response = daemon.handle({"command": "diff"})
+    assert response["ok"] is True
+    assert response["summary"] == {}
+    assert get_error_collector() is None
+
+
+def test_subset_requests_keep_the_whole_snapshot_file(tmp_path):
+    columns = ["NAME", "PRIVILEGE", "GRANTEE_NAME", "GRANT_OPTION"]
+    conn = ReplayConnection(
+        [
+            QueryRecording(
+                "show warehouses in account",
+                ["name", "comment", "size"],
+                [["W0", None, "X-Small"]],
+            ),
+            # 2回目の取得ではW0のUSAGEにロールが増え、W0のOPERATEがなくなる
+            QueryRecording(
+                warehouse_grants_sql,
+                columns,
+                [["W0", "USAGE", "R0", "False"], ["W0", "OPERATE", "R0", "False"]],
+            ),
+            QueryRecording(
+                warehouse_grants_sql,
+                columns,
+                [["W0", "USAGE", "R0", "False"], ["W0", "USAGE", "R1", "False"]],
+            ),
+        ]
+    )
+    daemon = make_daemon(tmp_path, conn)
+    daemon.config.snapshot_path = str(tmp_path / "snapshot.jsonl")
+    response = daemon.handle(
+        {"command": "export", "types": ["warehouse", "warehouse_grant"]}
+    )
+    assert response["ok"] is True
+    [_, names] = read_snapshot(daemon.config.snapshot_path)
+    usage_name = names["warehouse_grant"][("W0", "USAGE", False, "roles")]
+
+    response = daemon.handle(
+        {"command": "diff", "types": ["warehouse_grant"], "update": True}
+    )
+    assert response["ok"] is True
+    assert response["summary"] == {"warehouse_grant": {"modified": 1, "removed": 1}}
+
+    # 要求していないwarehouseの分もファイルに残り、なくなった権限の名前は消える
+    [snapshot, names] = read_snapshot(daemon.config.snapshot_path)
+    assert [w.name for w in snapshot["warehouse"]] == ["W0"]
+    assert [g.roles for g in snapshot["warehouse_grant"]] == [["R0", "R1"]]
+    assert names["warehouse_grant"] == {("W0", "USAGE", False, "roles"): usage_name}
+    assert daemon.snapshot_names == names
+
+    response = daemon.handle(
+        {"command": "export", "types": ["warehouse_grant"], "incremental": True}
+    )
+    assert response["ok"] is True
+    [snapshot, names] = read_snapshot(daemon.config.snapshot_path)
+    assert sorted(snapshot) == ["warehouse", "warehouse_grant"]
+    assert names["warehouse_grant"][("W0", "USAGE", False, "roles")] == usage_name
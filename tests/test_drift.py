@@ -0,0 +1,74 @@
+from resource_tracker import (
+    SnowflakeWarehouseGrant,
+    diff_resources,
+    get_resource_identity,
+    get_resource_names,
+    read_snapshot,
+    to_previous_state,
+    write_snapshot,
+)
+
+
+def make_grant(warehouse_name: str, privilege: str, roles: list):
+    return SnowflakeWarehouseGrant(
+        warehouse_name=warehouse_name,
+        privilege=privilege,
+        roles=roles,
+        with_grant_option=False,
+    )
+
+
+def test_diff_resources_matches_by_identity():
+    old = [
+        make_grant("W0", "USAGE", ["R0"]),
+        make_grant("W0", "OPERATE", ["R0"]),
+        make_grant("W1", "USAGE", ["R0"]),
+    ]
+    new = [
+        # ロールの順序だけが違うものは変更ではない
+        make_grant("W1", "USAGE", ["R0"]),
+        make_grant("W0", "USAGE", ["R1", "R0"]),
+        make_grant("W2", "USAGE", ["R0"]),
+    ]
+    changes = diff_resources("warehouse_grant", old, new)
+
+    by_kind = {}
+    for change in changes:
+        by_kind.setdefault(change.kind, []).append(change)
+    assert sorted(by_kind) == ["added", "modified", "removed"]
+    [added] = by_kind["added"]
+    [removed] = by_kind["removed"]
+    [modified] = by_kind["modified"]
+    assert added.new.warehouse_name == "W2"
+    assert removed.old.privilege == "OPERATE"
+    # rolesは同一性のキーに含まれないので、ロールが増えたものは同じリソースの変更になる
+    assert modified.identity == get_resource_identity("warehouse_grant", new[1])
+    assert list(modified.changes) == ["roles"]
+
+
+def test_diff_resources_ignores_list_order():
+    old = [make_grant("W0", "USAGE", ["R0", "R1"])]
+    new = [make_grant("W0", "USAGE", ["R1", "R0"])]
+    assert diff_resources("warehouse_grant", old, new) == []
+
+
+def test_snapshot_round_trips_resource_names(tmp_path):
+    resources = [make_grant("W0", "USAGE", ["R0"]), make_grant("W1", "USAGE", ["R0"])]
+    resource_names = get_resource_names("warehouse_grant", resources)
+    path = tmp_path / "snapshot.jsonl"
+    with open(path, mode="w", encoding="utf-8") as w:
+        write_snapshot(w, "warehouse_grant", resources, resource_names)
+
+    [snapshot, names] = read_snapshot(str(path))
+    assert snapshot == {"warehouse_grant": resources}
+    assert names["warehouse_grant"] == {
+        get_resource_identity("warehouse_grant", r): n
+        for [r, n] in zip(resources, resource_names)
+    }
+
+    # ロールが変わっても前回の名前を引き継ぎ、前回になかったものは引き継がない
+    current = [make_grant("W0", "USAGE", ["R0", "R1"]), make_grant("W2", "USAGE", [])]
+    state = to_previous_state("warehouse_grant", current, names["warehouse_grant"])
+    current_names = get_resource_names("warehouse_grant", current, state)
+    assert current_names[0] == resource_names[0]
+    assert current_names[1] not in resource_names
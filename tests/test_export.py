@@ -0,0 +1,94 @@
+import re
+from resource_tracker import ExportConfig, QueryRecording, ReplayConnection, run_export
+
+warehouse_grants_sql = (
+    "select * from snowflake.account_usage.grants_to_roles where granted_on ="
+    " 'WAREHOUSE' and granted_to = 'ROLE' and deleted_on is null"
+)
+
+
+def replay_warehouse_grants(rows: list) -> ReplayConnection:
+    columns = ["NAME", "PRIVILEGE", "GRANTEE_NAME", "GRANT_OPTION"]
+    return ReplayConnection([QueryRecording(warehouse_grants_sql, columns, rows)])
+
+
+def make_config(tmp_path, incremental: bool) -> ExportConfig:
+    config = ExportConfig.from_env({"RESOURCE_TRACKER_FETCH_SOURCE": "account_usage"})
+    config.resource_types = ["warehouse_grant"]
+    config.output_dir = str(tmp_path / "outputs")
+    config.snapshot_path = str(tmp_path / "snapshot.jsonl")
+    config.incremental = incremental
+    return config
+
+
+def read_resource_names(tmp_path, path: str) -> dict:
+    """.tfのリソース名 -> (warehouse_name, privilege)"""
+    text = (tmp_path / "outputs" / path).read_text()
+    blocks = re.findall(
+        r'resource "snowflake_warehouse_grant" "(\w+)" \{(.*?)\n\}', text, re.S
+    )
+    return {
+        name: (
+            re.search(r'warehouse_name\s*=\s*"(\w+)"', body).group(1),
+            re.search(r'privilege\s*=\s*"(\w+)"', body).group(1),
+        )
+        for [name, body] in blocks
+    }
+
+
+def read_imported_names(tmp_path) -> list:
+    text = (tmp_path / "outputs" / "import.sh").read_text()
+    return re.findall(r"snowflake_warehouse_grant\.(\w+)", text)
+
+
+def test_incremental_export_keeps_full_set_and_names(tmp_path):
+    first_rows = [
+        ["W0", "USAGE", "R0", "False"],
+        ["W0", "OPERATE", "R0", "False"],
+        ["W1", "USAGE", "R0", "False"],
+    ]
+    run_export(
+        replay_warehouse_grants(first_rows), make_config(tmp_path, False), environ={}
+    )
+    first_names = {
+        v: k for [k, v] in read_resource_names(tmp_path, "warehouse_grant.tf").items()
+    }
+    assert len(first_names) == 3
+    assert len(read_imported_names(tmp_path)) == 3
+
+    # W0のUSAGEにロールが増え、W2が追加された
+    second_rows = first_rows + [
+        ["W0", "USAGE", "R1", "False"],
+        ["W2", "USAGE", "R0", "False"],
+    ]
+    result = run_export(
+        replay_warehouse_grants(second_rows), make_config(tmp_path, True), environ={}
+    )
+    assert sorted(c.kind for c in result.changes) == ["added", "modified"]
+
+    # .tfには変更のないものも含めてすべて出力し、前回からあるものは名前を変えない
+    second_names = {
+        v: k for [k, v] in read_resource_names(tmp_path, "warehouse_grant.tf").items()
+    }
+    assert set(second_names) == set(first_names) | {("W2", "USAGE")}
+    for [key, name] in first_names.items():
+        assert second_names[key] == name
+    # importは追加されたものだけ
+    assert read_imported_names(tmp_path) == [second_names[("W2", "USAGE")]]
+    # drift/には追加・変更されたものだけを同じ名前で出力する
+    drift_names = read_resource_names(tmp_path, "drift/warehouse_grant.tf")
+    assert drift_names == {
+        second_names[("W0", "USAGE")]: ("W0", "USAGE"),
+        second_names[("W2", "USAGE")]: ("W2", "USAGE"),
+    }
+
+    # 変更がなければ何もimportせず、drift/の前回のファイルは消す
+    run_export(
+        replay_warehouse_grants(second_rows), make_config(tmp_path, True), environ={}
+    )
+    third_names = {
+        v: k for [k, v] in read_resource_names(tmp_path, "warehouse_grant.tf").items()
+    }
+    assert third_names == second_names
+    assert read_imported_names(tmp_path) == []
+    assert not (tmp_path / "outputs" / "drift" / "warehouse_grant.tf").exists()
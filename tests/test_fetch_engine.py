@@ -0,0 +1,159 @@
+import json
+import random
+from resource_tracker import (
+    ColumnarResources,
+    FetchOptions,
+    QueryRecording,
+    ReplayConnection,
+    ExportConfig,
+    SnowflakeTableGrant,
+    fetch_tasks,
+    fetcher_specs,
+    iter_fetcher_batches,
+    merge_resources_by_roles,
+    render_resource,
+    run_fetcher,
+    to_aggregated_spec,
+    to_ordered_spec,
+)
+
+spec = fetcher_specs["table_grant"]
+columns = list(spec.columns.values())
+merge_column = spec.columns[spec.merge_key]
+key_columns = [c for c in columns if c != merge_column]
+
+
+def make_rows(seed: int = 0) -> list:
+    """マージ前の権限の行。ロールは名前順ではない順に届く"""
+    rng = random.Random(seed)
+    rows = []
+    for table in ["T1", "T2", "T3"]:
+        for privilege in ["SELECT", "INSERT"]:
+            roles = rng.sample(["R_C", "R_A", "R_D", "R_B", "R_E"], k=rng.randint(1, 5))
+            for role in roles:
+                record = {
+                    "TABLE_CATALOG": "DB",
+                    "TABLE_SCHEMA": "S",
+                    "NAME": table,
+                    "PRIVILEGE": privilege,
+                    "GRANTEE_NAME": role,
+                    "GRANT_OPTION": "False",
+                }
+                rows.append([record[c] for c in columns])
+    rng.shuffle(rows)
+    return rows
+
+
+def aggregate_like_snowflake(rows: list) -> QueryRecording:
+    """to_aggregated_specのクエリをSnowflakeで実行した結果(グループの順序は不定)"""
+    groups = {}
+    for row in rows:
+        record = dict(zip(columns, row))
+        key = tuple(record[c] for c in key_columns)
+        groups.setdefault(key, []).append(record[merge_column])
+    aggregated = [
+        list(key) + [json.dumps(sorted(roles))] for [key, roles] in groups.items()
+    ]
+    random.Random(1).shuffle(aggregated)
+    query = to_aggregated_spec(spec).query
+    return QueryRecording(query, key_columns + [merge_column], aggregated)
+
+
+def order_like_snowflake(rows: list) -> QueryRecording:
+    """to_ordered_specのクエリの結果。merge_key以外の列の順で、同じキーの行の順序は不定"""
+    indices = [columns.index(c) for c in key_columns]
+    ordered = sorted(rows, key=lambda row: [row[i] for i in indices])
+    return QueryRecording(to_ordered_spec(spec).query, columns, ordered)
+
+
+def sort_by_identity(resources: list) -> list:
+    return sorted(resources, key=lambda r: (r.table_name, r.privilege))
+
+
+def test_aggregated_spec_groups_by_every_column_but_the_roles():
+    aggregated = to_aggregated_spec(spec)
+    assert aggregated.merge_key is None
+    assert aggregated.query == (
+        "select TABLE_CATALOG, PRIVILEGE, TABLE_SCHEMA, NAME, GRANT_OPTION,"
+        " array_agg(GRANTEE_NAME) within group (order by GRANTEE_NAME)"
+        " as GRANTEE_NAME"
+        " from (select * from snowflake.account_usage.grants_to_roles"
+        " where granted_on = 'TABLE' and granted_to = 'ROLE' and deleted_on is null)"
+        " group by TABLE_CATALOG, PRIVILEGE, TABLE_SCHEMA, NAME, GRANT_OPTION"
+    )
+    # マージキーの無いspecはそのまま
+    assert to_aggregated_spec(fetcher_specs["warehouse"]) is fetcher_specs["warehouse"]
+
+
+def test_client_side_merge_sorts_roles():
+    conn = ReplayConnection([QueryRecording(spec.query, columns, make_rows())])
+    for resource in run_fetcher(conn, spec):
+        assert resource.roles == sorted(resource.roles)
+
+
+def test_server_side_merge_renders_the_same_resources():
+    rows = make_rows()
+    conn = ReplayConnection(
+        [QueryRecording(spec.query, columns, rows), aggregate_like_snowflake(rows)]
+    )
+    client_side = sort_by_identity(run_fetcher(conn, spec))
+    server_side = sort_by_identity(
+        run_fetcher(conn, spec, FetchOptions(server_side_merge=True))
+    )
+
+    assert client_side == server_side
+    for [r0, r1] in zip(client_side, server_side):
+        assert render_resource("snowflake_table_grant", "x", r0) == render_resource(
+            "snowflake_table_grant", "x", r1
+        )
+
+
+def test_streamed_merge_matches_client_side_merge():
+    rows = make_rows()
+    conn = ReplayConnection(
+        [QueryRecording(spec.query, columns, rows), order_like_snowflake(rows)]
+    )
+    client_side = sort_by_identity(run_fetcher(conn, spec))
+    streamed = [
+        r for batch in iter_fetcher_batches(conn, spec, batch_size=2) for r in batch
+    ]
+    assert sort_by_identity(streamed) == client_side
+
+
+def test_dataclass_and_columnar_merges_sort_roles():
+    grants = [
+        SnowflakeTableGrant(
+            database_name="DB",
+            schema_name="S",
+            table_name=row[columns.index("NAME")],
+            privilege=row[columns.index("PRIVILEGE")],
+            roles=[row[columns.index("GRANTEE_NAME")]],
+            with_grant_option=False,
+        )
+        for row in make_rows()
+    ]
+    conn = ReplayConnection([QueryRecording(spec.query, columns, make_rows())])
+    expected = sort_by_identity(run_fetcher(conn, spec))
+
+    assert sort_by_identity(merge_resources_by_roles(grants)) == expected
+    store = ColumnarResources.from_resources("table_grant", grants).merge("roles")
+    assert sort_by_identity(store.to_resources()) == expected
+
+
+def test_tasks_are_fetched_with_show_even_from_account_usage():
+    options = ExportConfig.from_env(
+        {"RESOURCE_TRACKER_FETCH_SOURCE": "account_usage"}
+    ).fetch_options
+    task_columns = list(fetcher_specs["task"].columns.values())
+    task_row = [f"{c}_value" for c in task_columns]
+    # task_versionsには削除済みのタスクも残るので、SHOWだけを再生する
+    conn = ReplayConnection(
+        [
+            QueryRecording(
+                "show tasks in account limit 10000",
+                task_columns,
+                [task_row],
+            )
+        ]
+    )
+    assert [t.name for t in fetch_tasks(conn, options)] == ["name_value"]
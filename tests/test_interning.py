@@ -0,0 +1,41 @@
+import pandas as pd
+from resource_tracker import category_min_rows, intern_column, to_values
+
+
+def make_column(n_rows: int, n_uniques: int) -> pd.Series:
+    # 同じ値でも別のオブジェクトになるよう、文字列を実行時に作る
+    return pd.Series(
+        ["".join(["ROLE_", str(i % n_uniques)]) for i in range(n_rows)], dtype=object
+    )
+
+
+def test_columns_with_few_uniques_become_categorical():
+    s = make_column(category_min_rows, category_min_rows // 2)
+    # ユニークな値がちょうど行数のmax_ratioならcategoricalにする
+    assert isinstance(intern_column(s, 0.5).dtype, pd.CategoricalDtype)
+    assert intern_column(s, 0.5).tolist() == s.tolist()
+
+    s = make_column(category_min_rows, category_min_rows // 2 + 1)
+    assert intern_column(s, 0.5).dtype == object
+
+
+def test_small_or_unlimited_columns_stay_object():
+    s = make_column(category_min_rows - 1, 1)
+    assert intern_column(s, 0.5).dtype == object
+    s = make_column(category_min_rows, 1)
+    assert intern_column(s).dtype == object
+
+
+def test_equal_strings_share_one_object_across_columns():
+    a = intern_column(make_column(10, 2))
+    b = intern_column(make_column(10, 2))
+    assert a[0] is a[2]
+    assert a[0] is b[0]
+
+
+def test_missing_values_stay_none():
+    s = pd.Series(["A", None, "A", "B"] * category_min_rows, dtype=object)
+    assert intern_column(s).tolist()[:4] == ["A", None, "A", "B"]
+    categorical = intern_column(s, 0.5)
+    assert isinstance(categorical.dtype, pd.CategoricalDtype)
+    assert to_values(categorical)[:4] == ["A", None, "A", "B"]
@@ -0,0 +1,99 @@
+import itertools
+from resource_tracker import (
+    ExportMetrics,
+    QueryTrace,
+    QueryTracer,
+    add_stage_observer,
+    observe_count,
+    remove_stage_observer,
+    stage,
+)
+from resource_tracker import metrics as metrics_module
+from resource_tracker import profiling
+
+
+def make_trace(fetcher: str, row_count: int) -> QueryTrace:
+    return QueryTrace(
+        sql="select 1",
+        fetcher=fetcher,
+        query_id=None,
+        started_at=0.0,
+        execute_seconds=0.0,
+        fetch_seconds=0.0,
+        dataframe_seconds=0.0,
+        row_count=row_count,
+        approx_bytes=0,
+    )
+
+
+def test_metrics_are_written_as_openmetrics_text(tmp_path, monkeypatch):
+    # 時刻と経過時間を固定する。stageの経過時間は0.25秒ずつになる
+    monkeypatch.setattr(metrics_module.time, "time", lambda: 1700000000.0)
+    clock = itertools.count(step=0.25)
+    monkeypatch.setattr(profiling.time, "perf_counter", lambda: next(clock))
+
+    metrics = ExportMetrics(labels={"account": 'ACME "prod"'})
+    metrics.set_fetcher("warehouse", "fetch_warehouses")
+    add_stage_observer(metrics)
+    try:
+        with stage("fetch", "warehouse"):
+            pass
+        with stage("output", "warehouse"):
+            observe_count("bytes_written", 100)
+            observe_count("bytes_written", 20)
+        # 種別の外のstageは集計しない
+        with stage("report"):
+            pass
+    finally:
+        remove_stage_observer(metrics)
+    metrics.observe_resources("warehouse", 3)
+    tracer = QueryTracer()
+    for trace in [
+        make_trace("fetch_warehouses", 2),
+        make_trace("fetch_warehouses", 1),
+        make_trace("fetch_roles", 10),
+    ]:
+        tracer.record(trace)
+    metrics.observe_queries(tracer)
+
+    path = tmp_path / "resource_tracker.prom"
+    metrics.write(str(path))
+
+    labels = (
+        'account="ACME \\"prod\\"",resource_type="warehouse",fetcher="fetch_warehouses"'
+    )
+    prefix = "resource_tracker_export"
+    assert path.read_text(encoding="utf-8") == "\n".join(
+        [
+            f"# TYPE {prefix}_stage_duration_seconds gauge",
+            f"# HELP {prefix}_stage_duration_seconds"
+            " Wall time spent in each stage (fetch includes merge)",
+            f'{prefix}_stage_duration_seconds{{{labels},stage="fetch"}} 0.25',
+            f'{prefix}_stage_duration_seconds{{{labels},stage="output"}} 0.25',
+            f"# TYPE {prefix}_bytes_written gauge",
+            f"# HELP {prefix}_bytes_written Bytes of Terraform code written",
+            f"{prefix}_bytes_written{{{labels}}} 120.0",
+            f"# TYPE {prefix}_resources gauge",
+            f"# HELP {prefix}_resources Resources after merge",
+            f"{prefix}_resources{{{labels}}} 3",
+            f"# TYPE {prefix}_queries gauge",
+            f"# HELP {prefix}_queries Queries issued by the fetcher",
+            f"{prefix}_queries{{{labels}}} 2.0",
+            f"# TYPE {prefix}_rows_fetched gauge",
+            f"# HELP {prefix}_rows_fetched"
+            " Rows returned by the queries issued by the fetcher",
+            f"{prefix}_rows_fetched{{{labels}}} 3.0",
+            f"# TYPE {prefix}_run_duration_seconds gauge",
+            f"# HELP {prefix}_run_duration_seconds Wall time of the whole export run",
+            f'{prefix}_run_duration_seconds{{account="ACME \\"prod\\""}} 0.0',
+            f"# TYPE {prefix}_last_run_timestamp_seconds gauge",
+            f"# HELP {prefix}_last_run_timestamp_seconds"
+            " Unix time when the export run finished",
+            f'{prefix}_last_run_timestamp_seconds{{account="ACME \\"prod\\""}}'
+            " 1700000000.0",
+            "# EOF",
+            "",
+        ]
+    )
+    # 一時ファイルは残さない
+    assert [p.name for p in tmp_path.iterdir()] == ["resource_tracker.prom"]
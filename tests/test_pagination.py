@@ -0,0 +1,130 @@
+import re
+import pandas as pd
+import pytest
+from resource_tracker import (
+    ExportConfig,
+    QueryRecording,
+    ReplayConnection,
+    fetch_databases,
+    fetch_roles,
+    fetch_warehouses,
+    iter_show_pages,
+)
+
+show_pattern = re.compile(
+    r"show (?P<kind>\w+) in (account|database (?P<database>\w+)"
+    r"|schema (?P<schema_database>\w+)\.(?P<schema>\w+))"
+    r" limit (?P<limit>\d+)(?: from '(?P<start>\w*)')?"
+)
+
+
+class SimulatedAccount:
+    """SHOWの上限(LIMIT)とFROMを、アカウント内のオブジェクトの一覧に対して再現する
+
+    FROMは名前がその値以上の行から返す(その値の行も含む)。
+    """
+
+    def __init__(self, n_databases: int, n_schemas: int, n_stages: int):
+        self.databases = [f"DB_{i}" for i in range(n_databases)]
+        self.schemas = [
+            (database_name, f"SCHEMA_{j}")
+            for database_name in self.databases
+            for j in range(n_schemas)
+        ]
+        # ステージの名前はスキーマの中でだけ一意
+        self.stages = [
+            (database_name, schema_name, f"STAGE_{k}")
+            for [database_name, schema_name] in self.schemas
+            for k in range(n_stages)
+        ]
+        self.queries = []
+
+    def execute(self, sql: str) -> pd.DataFrame:
+        self.queries.append(sql)
+        match = show_pattern.fullmatch(sql)
+        assert match is not None, sql
+        [kind, database_name, limit, start] = match.group(
+            "kind", "database", "limit", "start"
+        )
+        schema_key = match.group("schema_database", "schema")
+        rows = {
+            "databases": [(None, None, name) for name in self.databases],
+            "schemas": [(d, None, s) for [d, s] in self.schemas],
+            "stages": self.stages,
+        }[kind]
+        if database_name is not None:
+            rows = [r for r in rows if r[0] == database_name]
+        elif schema_key[1] is not None:
+            rows = [r for r in rows if r[:2] == schema_key]
+        if start is not None:
+            rows = [r for r in rows if r[2] >= start]
+        rows = sorted(rows)[: int(limit)]
+        return pd.DataFrame(
+            [{"database_name": d, "schema_name": s, "name": n} for [d, s, n] in rows],
+            columns=["database_name", "schema_name", "name"],
+        )
+
+
+def collect_rows(account, prefix: str, object_level: str, page_size: int) -> list:
+    pages = iter_show_pages(account.execute, prefix, "account", object_level, page_size)
+    frame = pd.concat(list(pages))
+    return list(zip(frame["database_name"], frame["schema_name"], frame["name"]))
+
+
+@pytest.mark.parametrize("page_size", [2, 3, 4, 5, 100])
+def test_show_pages_return_every_schema_level_object_once(page_size):
+    account = SimulatedAccount(n_databases=3, n_schemas=3, n_stages=4)
+    rows = collect_rows(account, "show stages", "schema", page_size)
+
+    assert sorted(rows) == account.stages
+    assert len(rows) == len(set(rows))
+
+
+@pytest.mark.parametrize("page_size", [2, 3, 6, 7])
+def test_show_pages_advance_with_from_when_names_are_unique(page_size):
+    account = SimulatedAccount(n_databases=6, n_schemas=1, n_stages=0)
+    rows = collect_rows(account, "show databases", "account", page_size)
+
+    assert [name for [_, _, name] in rows] == account.databases
+    # 名前がアカウントで一意なので、下の階層には分けない
+    assert all(sql.startswith("show databases in account") for sql in account.queries)
+
+
+def test_show_pages_fan_out_only_where_the_cap_is_reached():
+    account = SimulatedAccount(n_databases=2, n_schemas=2, n_stages=1)
+    rows = collect_rows(account, "show stages", "schema", page_size=3)
+
+    assert sorted(rows) == account.stages
+    # アカウント全体(4件)は上限に達するが、データベースごと(2件)は達しないのでスキーマには分けない
+    assert not any(sql.startswith("show stages in schema") for sql in account.queries)
+
+
+def test_show_pages_reject_page_size_below_two():
+    account = SimulatedAccount(n_databases=1, n_schemas=1, n_stages=1)
+    with pytest.raises(ValueError):
+        list(iter_show_pages(account.execute, "show stages", "account", "schema", 1))
+
+
+def test_only_specs_accepting_limit_from_are_paginated():
+    options = ExportConfig.from_env({}).fetch_options
+    conn = ReplayConnection(
+        [
+            # WAREHOUSES/ROLES/RESOURCE MONITORSはLIMIT ... FROMを受け付けないので元のまま
+            QueryRecording(
+                "show warehouses in account",
+                ["name", "comment", "size"],
+                [["W0", None, "X-Small"]],
+            ),
+            QueryRecording(
+                "show roles in account", ["name", "comment"], [["R0", None]]
+            ),
+            QueryRecording(
+                "show databases in account limit 10000",
+                ["name", "comment"],
+                [["D", None]],
+            ),
+        ]
+    )
+    assert [w.name for w in fetch_warehouses(conn, options)] == ["W0"]
+    assert [r.name for r in fetch_roles(conn, options)] == ["R0"]
+    assert [d.name for d in fetch_databases(conn, options)] == ["D"]
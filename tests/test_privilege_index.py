@@ -0,0 +1,91 @@
+import random
+import pytest
+from resource_tracker import (
+    PrivilegeIndex,
+    RoleGraph,
+    SnowflakeRoleGrants,
+    SnowflakeTableGrant,
+)
+
+databases = ["DB_A", "DB_B"]
+schemas = ["PUBLIC", "RAW"]
+tables = ["ORDERS", "USERS"]
+roles = [f"R{i}" for i in range(6)]
+
+
+def make_grants(seed: int, n: int) -> list:
+    """個別のテーブル・スキーマ単位・データベース単位のon_all/on_futureを混ぜたgrant"""
+    rng = random.Random(seed)
+    grants = []
+    for _ in range(n):
+        scope = rng.choice(["object", "all", "future"])
+        schema_name = rng.choice(schemas + [None]) if scope != "object" else None
+        grants.append(
+            SnowflakeTableGrant(
+                database_name=rng.choice(databases),
+                schema_name=rng.choice(schemas) if scope == "object" else schema_name,
+                table_name=rng.choice(tables) if scope == "object" else None,
+                privilege=rng.choice(["SELECT", "INSERT"]),
+                roles=rng.sample(roles, rng.randint(1, 2)),
+                on_all=True if scope == "all" else None,
+                on_future=True if scope == "future" else None,
+            )
+        )
+    return grants
+
+
+def grant_covers(grant, database_name, schema_name, table_name, include_future):
+    if grant.database_name != database_name:
+        return False
+    if grant.on_future or grant.on_all:
+        if grant.on_future and not include_future:
+            return False
+        return grant.schema_name in (None, schema_name)
+    return (grant.schema_name, grant.table_name) == (schema_name, table_name)
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("include_future", [True, False])
+def test_roles_match_brute_force(seed, include_future):
+    grants = make_grants(seed, 30)
+    rng = random.Random(seed)
+    role_graph = RoleGraph.from_role_grants(
+        [
+            SnowflakeRoleGrants(role_name=role_name, roles=[rng.choice(roles)])
+            for role_name in roles
+        ]
+    )
+    index = PrivilegeIndex.from_resources({"table_grant": grants})
+
+    for database_name in databases:
+        for schema_name in schemas:
+            for table_name in tables:
+                for privilege in ["SELECT", "INSERT"]:
+                    expected = {
+                        role_name
+                        for grant in grants
+                        if grant.privilege == privilege
+                        and grant_covers(
+                            grant,
+                            database_name,
+                            schema_name,
+                            table_name,
+                            include_future,
+                        )
+                        for role_name in grant.roles
+                    }
+                    object_name = f"{database_name}.{schema_name}.{table_name}"
+                    assert index.get_roles(
+                        "table", object_name, privilege, include_future
+                    ) == sorted(expected)
+
+                    inherited = set(expected)
+                    for role_name in expected:
+                        inherited.update(role_graph.get_inheritors(role_name))
+                    assert index.get_roles(
+                        "table",
+                        object_name,
+                        privilege,
+                        include_future,
+                        role_graph=role_graph,
+                    ) == sorted(inherited)
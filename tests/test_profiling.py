@@ -0,0 +1,70 @@
+import io
+import threading
+import tracemalloc
+import pytest
+from resource_tracker import (
+    MemoryProfiler,
+    SnowflakeWarehouse,
+    stage,
+    write_streamed_resources,
+)
+from resource_tracker import profiling
+
+
+@pytest.fixture
+def profiler(monkeypatch):
+    """take_snapshotの呼び出しを数えるプロファイラ"""
+    snapshots = []
+    take_snapshot = tracemalloc.take_snapshot
+
+    def counting_take_snapshot():
+        snapshots.append(threading.get_ident())
+        return take_snapshot()
+
+    monkeypatch.setattr(profiling.tracemalloc, "take_snapshot", counting_take_snapshot)
+    p = MemoryProfiler(top_n=3, rss_interval=1.0)
+    p.start()
+    try:
+        yield [p, snapshots]
+    finally:
+        p.stop()
+
+
+def test_streamed_batches_share_one_top_level_stage(profiler):
+    [p, snapshots] = profiler
+    batches = iter([[SnowflakeWarehouse(name=f"W{i}")] for i in range(5)])
+    n = write_streamed_resources(io.StringIO(), "warehouse", batches)
+
+    assert n == 5
+    # 種別全体のstageの開始時と終了時の2回だけ
+    assert len(snapshots) == 2
+    assert p.stats[("warehouse", "stream")].calls == 1
+    assert p.stats[("warehouse", "output")].calls == 5
+
+
+def test_worker_thread_stages_do_not_share_the_stack(profiler):
+    [p, snapshots] = profiler
+    entered = threading.Event()
+    release = threading.Event()
+    worker_stack_sizes = []
+
+    def fetch():
+        with stage("fetch", "warehouse"):
+            worker_stack_sizes.append(len(p._stack))
+            entered.set()
+            release.wait()
+
+    with stage("output", "database"):
+        thread = threading.Thread(target=fetch)
+        thread.start()
+        entered.wait()
+        # ワーカーのstageはメインスレッドの入れ子にならない
+        assert len(p._stack) == 1
+        release.set()
+        thread.join()
+
+    assert worker_stack_sizes == [1]
+    # スナップショットはstart()を呼んだスレッドの最上位のstageでだけ取る
+    assert snapshots == [threading.get_ident()] * 2
+    assert p.stats[("warehouse", "fetch")].calls == 1
+    assert p.stats[("database", "output")].calls == 1
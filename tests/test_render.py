@@ -0,0 +1,78 @@
+import io
+from concurrent.futures import ProcessPoolExecutor
+from resource_tracker import (
+    SnowflakeSchemaGrant,
+    TerraformStateIndex,
+    get_resource_id,
+    iter_rendered_chunks,
+    write_resources,
+)
+
+grants = [
+    SnowflakeSchemaGrant(
+        database_name=f"DB_{i % 7}",
+        schema_name=f"S_{i}",
+        privilege=["USAGE", "MONITOR"][i % 2],
+        roles=[f"R_{j}" for j in range(i % 4)],
+    )
+    for i in range(50)
+]
+names = [f"grant_{i}" for i in range(len(grants))]
+
+
+def make_state() -> TerraformStateIndex:
+    """3件に1件はimport済みのstate"""
+    state = TerraformStateIndex()
+    for [name, grant] in list(zip(names, grants))[::3]:
+        state.add(
+            f"snowflake_schema_grant.{name}",
+            "snowflake_schema_grant",
+            get_resource_id("schema_grant", grant),
+        )
+    return state
+
+
+def render(**kwargs) -> str:
+    w = io.StringIO()
+    write_resources(
+        w,
+        "schema_grant",
+        names,
+        grants,
+        with_import_blocks=True,
+        state=make_state(),
+        chunk_size=7,
+        **kwargs,
+    )
+    return w.getvalue()
+
+
+def test_process_pool_renders_the_same_bytes_as_serial():
+    serial = render()
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        parallel = render(executor=executor)
+
+    assert parallel == serial
+    assert serial.count('resource "snowflake_schema_grant"') == len(grants)
+    assert serial.count("import {") == len(grants) - len(grants[::3])
+
+
+def test_chunks_keep_input_order_with_few_pending_chunks():
+    import_ids = [None] * len(grants)
+    serial = list(
+        iter_rendered_chunks("schema_grant", names, grants, import_ids, chunk_size=4)
+    )
+    with ProcessPoolExecutor(max_workers=3) as executor:
+        parallel = list(
+            iter_rendered_chunks(
+                "schema_grant",
+                names,
+                grants,
+                import_ids,
+                executor=executor,
+                chunk_size=4,
+                max_pending_chunks=2,
+            )
+        )
+    assert parallel == serial
+    assert len(serial) == 13
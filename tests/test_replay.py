@@ -0,0 +1,61 @@
+import json
+from resource_tracker import (
+    QueryRecording,
+    RecordingConnection,
+    ReplayConnection,
+    fetch_warehouses,
+    iter_execute,
+    load_recordings,
+)
+
+warehouses_sql = "show warehouses in account"
+warehouse_columns = ["name", "comment", "size"]
+warehouse_rows = [["W0", None, "X-Small"], ["W1", "etl", "Large"]]
+users_sql = "select name from snowflake.account_usage.users"
+
+
+def make_source() -> ReplayConnection:
+    """記録対象のSnowflakeConnectionの代わり"""
+    return ReplayConnection(
+        [
+            QueryRecording(warehouses_sql, warehouse_columns, warehouse_rows),
+            QueryRecording(users_sql, ["NAME"], [["U0"], ["U1"], ["U2"]]),
+        ]
+    )
+
+
+def test_recorded_queries_replay_to_the_same_resources(tmp_path):
+    path = str(tmp_path / "recording.jsonl")
+    conn = RecordingConnection(make_source(), path)
+    expected = fetch_warehouses(conn)
+    conn.close()
+
+    assert fetch_warehouses(ReplayConnection(path)) == expected
+    assert [w.name for w in expected] == ["W0", "W1"]
+
+
+def test_recording_overwrites_previous_runs(tmp_path):
+    path = tmp_path / "recording.jsonl"
+    stale = {"sql": warehouses_sql, "columns": warehouse_columns, "rows": []}
+    path.write_text(json.dumps(stale) + "\n", encoding="utf-8")
+
+    conn = RecordingConnection(make_source(), str(path))
+    fetch_warehouses(conn)
+    conn.close()
+
+    recordings = load_recordings(str(path))
+    assert [r.rows for r in recordings] == [warehouse_rows]
+
+
+def test_partially_read_results_are_recorded_on_close(tmp_path):
+    path = str(tmp_path / "recording.jsonl")
+    conn = RecordingConnection(make_source(), path)
+    # 最初のバッチだけ読んでジェネレータを閉じる
+    batches = iter_execute(conn, users_sql, batch_size=2)
+    first = next(batches)
+    batches.close()
+    conn.close()
+
+    [recording] = load_recordings(path)
+    assert recording.rows == [["U0"], ["U1"]]
+    assert list(first["NAME"]) == ["U0", "U1"]
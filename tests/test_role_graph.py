@@ -0,0 +1,103 @@
+import random
+import pytest
+from resource_tracker import RoleGraph, SnowflakeRoleGrants
+
+
+def make_edges(seed: int, n_roles: int, n_edges: int) -> list:
+    """(付与するロール, 付与先のロール)の組。循環や自己ループも含む"""
+    rng = random.Random(seed)
+    return [
+        (f"R{rng.randrange(n_roles)}", f"R{rng.randrange(n_roles)}")
+        for _ in range(n_edges)
+    ]
+
+
+def reachable(edges: list, role_name: str) -> set:
+    """role_nameから1本以上の辺で辿れるロール(幅優先探索)"""
+    found = set()
+    frontier = [role_name]
+    while frontier:
+        current = frontier.pop()
+        for [role, grantee] in edges:
+            if role == current and grantee not in found:
+                found.add(grantee)
+                frontier.append(grantee)
+    return found
+
+
+def to_role_grants(edges: list, n_roles: int) -> list:
+    return [
+        SnowflakeRoleGrants(
+            role_name=f"R{i}",
+            roles=sorted({g for [r, g] in edges if r == f"R{i}"}),
+        )
+        for i in range(n_roles)
+    ]
+
+
+def assert_closure(graph: RoleGraph, edges: list, n_roles: int) -> None:
+    for i in range(n_roles):
+        role_name = f"R{i}"
+        inheritors = reachable(edges, role_name)
+        assert set(graph.get_inheritors(role_name)) == inheritors
+        assert set(graph.get_inherited_roles(role_name)) == {
+            f"R{j}" for j in range(n_roles) if role_name in reachable(edges, f"R{j}")
+        }
+        for j in range(n_roles):
+            expected = i == j or role_name in reachable(edges, f"R{j}")
+            assert graph.inherits(role_name, f"R{j}") == expected
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_closure_matches_brute_force(seed):
+    n_roles = 12
+    edges = make_edges(seed, n_roles, n_edges=seed + 5)
+    graph = RoleGraph.from_role_grants(to_role_grants(edges, n_roles))
+    assert_closure(graph, edges, n_roles)
+
+    # 循環は互いに辿れるロールの組
+    cycles = {frozenset(c) for c in graph.get_cycles()}
+    expected = {
+        frozenset(
+            {f"R{i}"}
+            | {r for r in reachable(edges, f"R{i}") if f"R{i}" in reachable(edges, r)}
+        )
+        for i in range(n_roles)
+        if f"R{i}" in reachable(edges, f"R{i}")
+    }
+    assert cycles == expected
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_incremental_updates_match_brute_force(seed):
+    n_roles = 10
+    rng = random.Random(seed)
+    graph = RoleGraph()
+    for i in range(n_roles):
+        graph.get_role_id(f"R{i}")
+    edges = []
+    for [role_name, grantee_role_name] in make_edges(seed, n_roles, n_edges=30):
+        if edges and rng.random() < 0.3:
+            [removed_role, removed_grantee] = edges.pop(rng.randrange(len(edges)))
+            graph.remove_grant(removed_role, removed_grantee)
+        graph.add_grant(role_name, grantee_role_name)
+        if (role_name, grantee_role_name) not in edges:
+            edges.append((role_name, grantee_role_name))
+        assert_closure(graph, edges, n_roles)
+
+
+def test_users_inherit_through_roles():
+    graph = RoleGraph.from_role_grants(
+        [
+            SnowflakeRoleGrants(role_name="READER", roles=["WRITER"], users=["U1"]),
+            SnowflakeRoleGrants(role_name="WRITER", roles=["ADMIN"]),
+            SnowflakeRoleGrants(role_name="ADMIN", users=["U2"]),
+        ]
+    )
+    assert sorted(graph.get_users_inheriting("READER")) == ["U1", "U2"]
+    assert sorted(graph.get_user_roles("U2")) == ["ADMIN", "READER", "WRITER"]
+    assert graph.get_user_roles("U1") == ["READER"]
+
+    graph.remove_grant("WRITER", "ADMIN")
+    assert graph.get_users_inheriting("READER") == ["U1"]
+    assert graph.get_user_roles("U2") == ["ADMIN"]
@@ -0,0 +1,129 @@
+import random
+import re
+import pandas as pd
+import pytest
+from resource_tracker import (
+    ExportConfig,
+    ExportScope,
+    QueryRecording,
+    ReplayConnection,
+    fetch_file_formats,
+    filter_by_scope,
+    to_like,
+    to_scoped_shows,
+)
+
+
+def ilike(value, like_pattern: str) -> bool:
+    """Snowflakeの ilike ... escape '!' を再現する。NULLはFalse"""
+    if value is None:
+        return False
+    regex = ""
+    i = 0
+    while i < len(like_pattern):
+        c = like_pattern[i]
+        if c == "!":
+            i += 1
+            regex += re.escape(like_pattern[i])
+        elif c == "%":
+            regex += ".*"
+        elif c == "_":
+            regex += "."
+        else:
+            regex += re.escape(c)
+        i += 1
+    return re.fullmatch(regex, value, re.IGNORECASE | re.DOTALL) is not None
+
+
+def where_clause_keeps(value, includes: list, excludes: list) -> bool:
+    """to_where_clauseが作る条件を、1つの値について評価する"""
+    if len(includes) > 0 and not any(ilike(value, to_like(p)) for p in includes):
+        return False
+    return not any(ilike(value, to_like(p)) for p in excludes)
+
+
+alphabet = ["a", "B", "_", "%", "!", "*", "x"]
+
+
+def random_text(rng: random.Random) -> str:
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 4)))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_filter_matches_where_clause(seed):
+    rng = random.Random(seed)
+    values = [random_text(rng) for _ in range(50)] + [None]
+    includes = [random_text(rng) for _ in range(rng.randint(0, 2))]
+    excludes = [random_text(rng) for _ in range(rng.randint(0, 2))]
+    scope = ExportScope(names=includes, exclude_names=excludes)
+
+    df = pd.DataFrame({"name": values})
+    kept = list(filter_by_scope(df, scope, {"name": "name"})["name"])
+    assert kept == [v for v in values if where_clause_keeps(v, includes, excludes)]
+
+
+def test_scoped_shows_push_down_only_what_they_can():
+    scope = ExportScope(databases=["DB_A", "db-b"], names=["ORDERS_*"])
+    assert to_scoped_shows(
+        "show tables in account", scope, {"database": "database_name"}, True
+    ) == ["show tables in database DB_A", 'show tables in database "db-b"']
+    assert to_scoped_shows(
+        "show tables in account",
+        scope,
+        {"database": "database_name", "name": "name"},
+        True,
+    ) == [
+        "show tables like 'ORDERS_%' in database DB_A",
+        "show tables like 'ORDERS_%' in database \"db-b\"",
+    ]
+
+    # パターンのデータベースはIN DATABASEにできないので、アカウント全体を取る
+    scope = ExportScope(databases=["DB_*"])
+    assert to_scoped_shows(
+        "show tables in account", scope, {"database": "database_name"}, True
+    ) == ["show tables in account"]
+
+
+def replay_file_formats() -> ReplayConnection:
+    recordings = [
+        QueryRecording(
+            "show file formats in account",
+            ["database_name", "schema_name", "name", "type"],
+            [
+                ["DB", "PUBLIC", "MYCSV", "CSV"],
+                ["DB", "PUBLIC", "MYPARQUET", "PARQUET"],
+            ],
+        )
+    ]
+    for [name, null_if] in [("MYCSV", "NULL,"), ("MYPARQUET", None)]:
+        rows = [["COMPRESSION", "AUTO"]]
+        if null_if is not None:
+            rows.append(["NULL_IF", null_if])
+        recordings.append(
+            QueryRecording(
+                f"desc file format {name}", ["property", "property_value"], rows
+            )
+        )
+    return ReplayConnection(recordings)
+
+
+@pytest.mark.parametrize(
+    ["environ", "expected"],
+    [
+        ({}, ["MYCSV"]),
+        ({"RESOURCE_TRACKER_EXCLUDE_FILE_FORMATS": ""}, ["MYCSV", "MYPARQUET"]),
+        ({"RESOURCE_TRACKER_FILE_FORMATS": "*PARQUET"}, []),
+        (
+            {
+                "RESOURCE_TRACKER_FILE_FORMATS": "*PARQUET",
+                "RESOURCE_TRACKER_EXCLUDE_FILE_FORMATS": "",
+            },
+            ["MYPARQUET"],
+        ),
+    ],
+)
+def test_file_formats_are_excluded_by_scope(environ, expected):
+    options = ExportConfig.from_env(environ).fetch_options
+    file_formats = fetch_file_formats(replay_file_formats(), options)
+    assert [f.name for f in file_formats] == expected
+    assert all(f.null_if == ["NULL", ""] for f in file_formats if f.name == "MYCSV")
@@ -0,0 +1,104 @@
+import re
+import pytest
+from resource_tracker import (
+    ExportConfig,
+    QueryRecording,
+    ReplayConnection,
+    read_snapshot,
+    run_export,
+)
+
+warehouses_sql = "show warehouses in account"
+warehouse_grants_sql = (
+    "select * from snowflake.account_usage.grants_to_roles where"
+    " granted_on = 'WAREHOUSE' and granted_to = 'ROLE' and deleted_on is null"
+)
+# ストリーミングではマージするキーの順に読む
+ordered_warehouse_grants_sql = (
+    f"select * from ({warehouse_grants_sql}) order by NAME, PRIVILEGE, GRANT_OPTION"
+)
+warehouse_grant_rows = [
+    [f"W{i // 4}", ["USAGE", "OPERATE"][i % 2], f"R{i % 3}", "False"] for i in range(20)
+]
+
+
+def make_conn() -> ReplayConnection:
+    return ReplayConnection(
+        [
+            QueryRecording(
+                warehouses_sql,
+                ["name", "comment", "size", "auto_suspend"],
+                [[f"W{i}", f"warehouse {i}", "X-Small", 60] for i in range(5)],
+            ),
+            QueryRecording(
+                warehouse_grants_sql,
+                ["NAME", "PRIVILEGE", "GRANTEE_NAME", "GRANT_OPTION"],
+                warehouse_grant_rows,
+            ),
+            QueryRecording(
+                ordered_warehouse_grants_sql,
+                ["NAME", "PRIVILEGE", "GRANTEE_NAME", "GRANT_OPTION"],
+                sorted(warehouse_grant_rows),
+            ),
+        ]
+    )
+
+
+def export(tmp_path, name: str, streaming: bool, output_format: str):
+    config = ExportConfig.from_env(
+        {
+            "RESOURCE_TRACKER_FETCH_SOURCE": "account_usage",
+            "RESOURCE_TRACKER_STREAMING": "true" if streaming else "false",
+            "RESOURCE_TRACKER_STREAM_BATCH_SIZE": "3",
+            "RESOURCE_TRACKER_OUTPUT_FORMAT": output_format,
+        }
+    )
+    config.resource_types = ["warehouse", "warehouse_grant"]
+    config.output_dir = str(tmp_path / name)
+    config.snapshot_path = str(tmp_path / name / "snapshot.jsonl")
+    run_export(make_conn(), config, environ={})
+    return tmp_path / name
+
+
+def strip_names(text: str, separator: str = "\n\n") -> list:
+    """ランダムなリソース名(a_<uuid>)を除き、separatorで区切ったものを並べ替える"""
+    return sorted(re.sub(r"a_[0-9a-f_]{36}", "NAME", text).split(separator))
+
+
+@pytest.mark.parametrize("output_format", ["hcl", "json"])
+def test_streamed_export_matches_batch_export(tmp_path, output_format):
+    streamed_dir = export(tmp_path, "streamed", True, output_format)
+    batch_dir = export(tmp_path, "batch", False, output_format)
+    extension = ".tf" if output_format == "hcl" else ".tf.json"
+
+    # 名前が決まっている種別はバイト単位で同じ
+    path = f"warehouse{extension}"
+    assert (streamed_dir / path).read_text() == (batch_dir / path).read_text()
+
+    # バッチの境界をまたいでロールをまとめても、結果は全件をまとめた場合と同じ
+    path = f"warehouse_grant{extension}"
+    streamed = (streamed_dir / path).read_text()
+    batch = (batch_dir / path).read_text()
+    if output_format == "hcl":
+        assert strip_names(streamed) == strip_names(batch)
+    assert streamed.count('"R0"') == batch.count('"R0"')
+    assert len(re.findall(r"a_[0-9a-f_]{36}", streamed)) == 10
+    [streamed_imports, batch_imports] = [
+        (d / "import.sh").read_text() for d in [streamed_dir, batch_dir]
+    ]
+    assert strip_names(streamed_imports, "\n") == strip_names(batch_imports, "\n")
+
+
+def test_streamed_snapshot_records_resource_names(tmp_path):
+    streamed_dir = export(tmp_path, "streamed", True, "hcl")
+    [snapshot, names] = read_snapshot(str(streamed_dir / "snapshot.jsonl"))
+    assert {t: len(rs) for [t, rs] in snapshot.items()} == {
+        "warehouse": 5,
+        "warehouse_grant": 10,
+    }
+    assert sorted(names["warehouse"].values()) == [f"W{i}" for i in range(5)]
+    # .tfに書いた名前と同じ
+    text = (streamed_dir / "warehouse_grant.tf").read_text()
+    assert set(names["warehouse_grant"].values()) == set(
+        re.findall(r"a_[0-9a-f_]{36}", text)
+    )
@@ -0,0 +1,75 @@
+import io
+from resource_tracker import (
+    SnowflakeSchemaGrant,
+    get_resource_names,
+    shard_resources,
+    write_resources,
+    write_sharded_resources,
+)
+
+
+def make_schema_grants() -> list:
+    return [
+        SnowflakeSchemaGrant(
+            database_name=database_name,
+            schema_name=f"SCHEMA_{i}",
+            privilege="USAGE",
+            roles=["R0"],
+        )
+        for database_name in ["DB-A", "db_b", "DB_A"]
+        for i in range(5)
+    ]
+
+
+def split_blocks(text: str) -> list:
+    return [block for block in text.split("\n\n") if block.strip() != ""]
+
+
+def test_shards_keep_input_order_and_split_by_max_resources():
+    resources = make_schema_grants()
+    resource_names = get_resource_names("schema_grant", resources)
+    shards = shard_resources(
+        resource_names, resources, ["database"], max_resources_per_shard=4
+    )
+
+    # "DB-A"と"DB_A"は同じシャード名になり、1つのシャードにまとまってから分割される
+    assert {n: len(items) for [n, items] in shards.items()} == {
+        "db_a__0001": 4,
+        "db_a__0002": 4,
+        "db_a__0003": 2,
+        "db_b__0001": 4,
+        "db_b__0002": 1,
+    }
+    merged = [item for items in shards.values() for item in items]
+    assert sorted(merged, key=lambda item: resource_names.index(item[0])) == list(
+        zip(resource_names, resources)
+    )
+    assert [n for [n, _] in shards["db_a__0001"]] == resource_names[:4]
+
+
+def test_sharded_files_contain_every_resource_once(tmp_path):
+    resources = make_schema_grants()
+    resource_names = get_resource_names("schema_grant", resources)
+    w = io.StringIO()
+    write_resources(w, "schema_grant", resource_names, resources)
+    expected = split_blocks(w.getvalue())
+
+    for as_modules in [False, True]:
+        output_dir = tmp_path / f"modules_{as_modules}"
+        shards = write_sharded_resources(
+            str(output_dir),
+            "schema_grant",
+            resource_names,
+            resources,
+            ["database", "schema"],
+            as_modules=as_modules,
+        )
+        pattern = "schema_grant/*/main.tf" if as_modules else "schema_grant__*.tf"
+        paths = sorted(output_dir.glob(pattern))
+        # "DB-A"と"DB_A"は同じシャードになる
+        assert len(paths) == 10
+        blocks = [b for p in paths for b in split_blocks(p.read_text())]
+        assert sorted(blocks) == sorted(expected)
+        assert sum(len(names) for [names, _] in shards.values()) == len(resources)
+        if as_modules:
+            assert all((p.parent / "providers.tf").exists() for p in paths)
@@ -0,0 +1,111 @@
+import io
+import json
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+import resource_tracker.terraform
+from resource_tracker import (
+    SnowflakeTableGrant,
+    TerraformStateIndex,
+    TfJsonWriter,
+    get_import_ids,
+    get_resource_names,
+    to_tf_json_body,
+    write_tf_json_resources,
+)
+
+
+def make_table_grants(n: int) -> list:
+    return [
+        SnowflakeTableGrant(
+            database_name="DB",
+            schema_name="売上" if i % 3 == 0 else "PUBLIC",
+            table_name=f'T"{i}\\',
+            privilege="SELECT",
+            roles=["R_A", "R_B"] if i % 2 == 0 else ["R_A"],
+            on_future=True if i % 5 == 0 else None,
+            with_grant_option=False,
+        )
+        for i in range(n)
+    ]
+
+
+def render(resource_names, resources, **kwargs) -> str:
+    w = io.StringIO()
+    write_tf_json_resources(w, "table_grant", resource_names, resources, **kwargs)
+    return w.getvalue()
+
+
+@pytest.fixture
+def grants():
+    resources = make_table_grants(25)
+    return [get_resource_names("table_grant", resources), resources]
+
+
+def test_document_is_valid_terraform_json(grants):
+    [resource_names, resources] = grants
+    # 先頭のリソースはstateにあるのでimportしない
+    state = TerraformStateIndex()
+    [first_import_id] = get_import_ids(
+        "table_grant", resource_names[:1], resources[:1], True, None
+    )
+    state.add(
+        f"snowflake_table_grant.{resource_names[0]}",
+        "snowflake_table_grant",
+        first_import_id,
+    )
+    document = json.loads(
+        render(resource_names, resources, with_import_blocks=True, state=state)
+    )
+
+    bodies = document["resource"]["snowflake_table_grant"]
+    assert list(bodies) == resource_names
+    assert [bodies[n] for n in resource_names] == [
+        json.loads(json.dumps(to_tf_json_body(r))) for r in resources
+    ]
+    import_ids = get_import_ids("table_grant", resource_names, resources, True, state)
+    assert document["import"] == [
+        {"to": f"snowflake_table_grant.{n}", "id": i}
+        for [n, i] in zip(resource_names, import_ids)
+        if i is not None
+    ]
+    assert len(document["import"]) == len(resources) - 1
+
+
+def test_empty_document():
+    assert json.loads(render([], [])) == {}
+    assert json.loads(render([], [], with_import_blocks=True)) == {}
+
+
+def test_batches_and_process_pool_write_the_same_bytes(grants):
+    [resource_names, resources] = grants
+    expected = render(resource_names, resources, with_import_blocks=True)
+
+    # ストリーミングのように何回かに分けて書いても1つのドキュメントになる
+    w = io.StringIO()
+    writer = TfJsonWriter(w, "table_grant")
+    for start in range(0, len(resources), 10):
+        writer.write(
+            resource_names[start : start + 10],
+            resources[start : start + 10],
+            with_import_blocks=True,
+            chunk_size=3,
+        )
+    writer.close()
+    assert w.getvalue() == expected
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        actual = render(
+            resource_names,
+            resources,
+            with_import_blocks=True,
+            executor=executor,
+            chunk_size=4,
+        )
+    assert actual == expected
+
+
+def test_json_fallback_writes_the_same_bytes(grants, monkeypatch):
+    [resource_names, resources] = grants
+    expected = render(resource_names, resources, with_import_blocks=True)
+    monkeypatch.setattr(resource_tracker.terraform, "orjson", None)
+    assert render(resource_names, resources, with_import_blocks=True) == expected
@@ -0,0 +1,155 @@
+import io
+import json
+from dataclasses import replace
+from resource_tracker import (
+    SnowflakeDatabase,
+    SnowflakeSchemaGrant,
+    get_resource_id,
+    get_resource_names,
+    load_terraform_states,
+    write_import_commands,
+)
+
+grant = SnowflakeSchemaGrant(
+    database_name="DB", schema_name="RAW", privilege="USAGE", roles=["R0"]
+)
+grant_id = get_resource_id("schema_grant", grant)
+
+
+def write_states(tmp_path) -> list:
+    # terraform.tfstate(version 4)。count/for_eachとdataソースを含む
+    tfstate = {
+        "version": 4,
+        "resources": [
+            {
+                "mode": "managed",
+                "type": "snowflake_database",
+                "name": "DB",
+                "instances": [{"attributes": {"id": "DB"}}],
+            },
+            {
+                "mode": "managed",
+                "type": "snowflake_schema_grant",
+                "name": "raw_usage",
+                "instances": [{"index_key": 0, "attributes": {"id": grant_id}}],
+            },
+            {
+                "mode": "data",
+                "type": "snowflake_database",
+                "name": "OTHER",
+                "instances": [{"attributes": {"id": "OTHER"}}],
+            },
+        ],
+    }
+    # terraform show -jsonの出力(シャードごとのモジュール)
+    show_json = {
+        "values": {
+            "root_module": {
+                "child_modules": [
+                    {
+                        "resources": [
+                            {
+                                "address": "snowflake_database.LEGACY_NAME",
+                                "mode": "managed",
+                                "type": "snowflake_database",
+                                "values": {"id": "LEGACY"},
+                            }
+                        ]
+                    }
+                ]
+            }
+        }
+    }
+    paths = [tmp_path / "terraform.tfstate", tmp_path / "show.json"]
+    for [path, state] in zip(paths, [tfstate, show_json]):
+        path.write_text(json.dumps(state))
+    return [str(p) for p in paths]
+
+
+def test_state_reuses_names_and_skips_imports(tmp_path):
+    state = load_terraform_states(write_states(tmp_path))
+    databases = [
+        SnowflakeDatabase(name="DB"),
+        SnowflakeDatabase(name="LEGACY"),
+        SnowflakeDatabase(name="OTHER"),
+    ]
+    # IDが一致すればstate上の名前を使う
+    assert get_resource_names("database", databases, state) == [
+        "DB",
+        "LEGACY_NAME",
+        "OTHER",
+    ]
+
+    w = io.StringIO()
+    write_import_commands(
+        w,
+        "database",
+        get_resource_names("database", databases, state),
+        databases,
+        state=state,
+    )
+    # dataソースはstateにあるものとして扱わない
+    assert w.getvalue() == "terraform import 'snowflake_database.OTHER' 'OTHER'\n"
+
+    # count/for_eachで作られたものは名前を再利用しないが、importもしない
+    [grant_name] = get_resource_names("schema_grant", [grant], state)
+    assert grant_name != "raw_usage"
+    w = io.StringIO()
+    write_import_commands(w, "schema_grant", [grant_name], [grant], state=state)
+    assert w.getvalue() == ""
+
+
+def write_grant_state(tmp_path, grants: dict) -> str:
+    """リソース名 -> 権限 のstate"""
+    tfstate = {
+        "version": 4,
+        "resources": [
+            {
+                "mode": "managed",
+                "type": "snowflake_schema_grant",
+                "name": name,
+                "instances": [
+                    {"attributes": {"id": get_resource_id("schema_grant", g)}}
+                ],
+            }
+            for [name, g] in grants.items()
+        ],
+    }
+    path = tmp_path / "terraform.tfstate"
+    path.write_text(json.dumps(tfstate))
+    return str(path)
+
+
+def test_state_matches_grants_whose_roles_changed(tmp_path):
+    state = load_terraform_states([write_grant_state(tmp_path, {"raw_usage": grant})])
+    # stateの後にロールが増えたのでIDは一致しない
+    regranted = replace(grant, roles=["R0", "R1"])
+    assert get_resource_id("schema_grant", regranted) != grant_id
+
+    # ロール以外が同じなら同じリソースとして名前を再利用し、importもしない
+    [name] = get_resource_names("schema_grant", [regranted], state)
+    assert name == "raw_usage"
+    w = io.StringIO()
+    write_import_commands(w, "schema_grant", [name], [regranted], state=state)
+    assert w.getvalue() == ""
+
+    # 別の権限はロールが同じでも一致しない
+    select = replace(grant, privilege="SELECT")
+    [name] = get_resource_names("schema_grant", [select], state)
+    assert name != "raw_usage"
+
+
+def test_state_does_not_guess_between_grants_split_by_roles(tmp_path):
+    # ロールごとに別のリソースになっている場合は、どれを使うべきか決められない
+    path = write_grant_state(
+        tmp_path,
+        {"usage_r0": grant, "usage_r1": replace(grant, roles=["R1"])},
+    )
+    state = load_terraform_states([path])
+    regranted = replace(grant, roles=["R0", "R1"])
+
+    [name] = get_resource_names("schema_grant", [regranted], state)
+    assert name not in ["usage_r0", "usage_r1"]
+    w = io.StringIO()
+    write_import_commands(w, "schema_grant", [name], [regranted], state=state)
+    assert w.getvalue().startswith(f"terraform import 'snowflake_schema_grant.{name}'")
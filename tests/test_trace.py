@@ -0,0 +1,85 @@
+import json
+from resource_tracker import (
+    QueryRecording,
+    QueryTrace,
+    QueryTracer,
+    ReplayConnection,
+    query_history_sql,
+)
+
+
+def make_trace(i: int) -> QueryTrace:
+    return QueryTrace(
+        sql=f"select {i}",
+        fetcher="fetch_x",
+        query_id=f"q{i}",
+        started_at=1000.0 + i,
+        execute_seconds=0.1,
+        fetch_seconds=0.1,
+        dataframe_seconds=0.1,
+        row_count=i,
+        approx_bytes=0,
+    )
+
+
+def to_history_row(i: int) -> list:
+    # [query_id, キュー待ち, 実行時間, 終了時刻(エポックミリ秒)]
+    return [f"q{i}", i, 10 * i, 1_000_000 + 1000 * i + 500]
+
+
+def history_pages(page_size: int, ids: list) -> list:
+    """query_history_by_sessionを終了時刻の新しい順にpage_size件ずつ読んだときの結果"""
+    rows = [to_history_row(i) for i in sorted(ids, reverse=True)]
+    recordings = []
+    end_ms = None
+    while True:
+        # 終了時刻がend_ms以下のものをpage_size件
+        page = [r for r in rows if end_ms is None or r[3] <= end_ms][:page_size]
+        recordings.append(
+            QueryRecording(
+                query_history_sql(end_ms, page_size), ["a", "b", "c", "d"], page
+            )
+        )
+        if len(page) < page_size:
+            return recordings
+        end_ms = min(r[3] for r in page)
+
+
+def test_traces_are_written_as_they_are_recorded(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    tracer = QueryTracer(str(path))
+    tracer.record(make_trace(0))
+    tracer.record(make_trace(1))
+
+    # closeせずに終わっても、記録済みの行は残る
+    lines = path.read_text().splitlines()
+    assert [json.loads(line)["query_id"] for line in lines] == ["q0", "q1"]
+    tracer.close()
+
+
+def test_server_timings_are_resolved_across_pages(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    tracer = QueryTracer(str(path))
+    ids = list(range(7))
+    for i in ids:
+        tracer.record(make_trace(i))
+
+    conn = ReplayConnection(history_pages(2, ids))
+    tracer.resolve_server_timings(conn, page_size=2)
+    tracer.close()
+
+    traces = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [t["queued_ms"] for t in traces] == ids
+    assert [t["execution_ms"] for t in traces] == [10 * i for i in ids]
+
+
+def test_paging_stops_at_history_older_than_the_traces():
+    tracer = QueryTracer()
+    tracer.record(make_trace(5))
+    # q5は見つからないが、トレースより前に終わったクエリに達したら打ち切る
+    older = [[f"other{i}", 0, 0, 900_000 - i] for i in range(2)]
+    conn = ReplayConnection(
+        [QueryRecording(query_history_sql(None, 2), list("abcd"), older)]
+    )
+    tracer.resolve_server_timings(conn, page_size=2)
+    assert tracer.traces[0].queued_ms is None